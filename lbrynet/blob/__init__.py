@@ -2,3 +2,4 @@ from blob_file import BlobFile
 from creator import BlobFileCreator
 from writer import HashBlobWriter
 from reader import HashBlobReader
+from cache import BlobCache
@@ -1,7 +1,6 @@
 import logging
 import os
 from twisted.internet import defer, threads
-from twisted.web.client import FileBodyProducer
 from twisted.python.failure import Failure
 from lbrynet.core.Error import DownloadCanceledError, InvalidDataError, InvalidBlobHashError
 from lbrynet.core.utils import is_valid_blobhash
@@ -40,6 +39,8 @@ class BlobFile(object):
         self.file_path = os.path.join(blob_dir, self.blob_hash)
         self.blob_write_lock = defer.DeferredLock()
         self.saved_verified_blob = False
+        # called with the blob once a download of it has been verified and saved
+        self._verified_callbacks = []
         if os.path.isfile(self.file_path):
             self.set_length(os.path.getsize(self.file_path))
             # This assumes that the hash of the blob has already been
@@ -63,7 +64,7 @@ class BlobFile(object):
         if not peer in self.writers:
             log.debug("Opening %s to be written by %s", str(self), str(peer))
             finished_deferred = defer.Deferred()
-            writer = HashBlobWriter(self.get_length, self.writer_finished)
+            writer = HashBlobWriter(self.blob_dir, self.get_length, self.writer_finished)
             self.writers[peer] = (writer, finished_deferred)
             return (writer, finished_deferred)
         log.warning("Tried to download the same file twice simultaneously from the same peer")
@@ -134,6 +135,13 @@ class BlobFile(object):
     def get_length(self):
         return self.length
 
+    def add_verified_callback(self, callback):
+        self._verified_callbacks.append(callback)
+
+    def remove_verified_callback(self, callback):
+        if callback in self._verified_callbacks:
+            self._verified_callbacks.remove(callback)
+
     def get_is_verified(self):
         return self.verified
 
@@ -153,12 +161,20 @@ class BlobFile(object):
                 if w == writer:
                     del self.writers[p]
                     finished_deferred.callback(self)
+                    fire_verified_callbacks()
                     return True
             log.warning(
                 "Somehow, the writer that was accepted as being valid was already removed: %s",
                 writer)
             return False
 
+        def fire_verified_callbacks():
+            for callback in list(self._verified_callbacks):
+                try:
+                    callback(self)
+                except Exception as err:
+                    log.exception("Error in verified callback for %s: %s", self, err)
+
         def errback_finished_deferred(err):
             for p, (w, finished_deferred) in self.writers.items():
                 if w == writer:
@@ -195,14 +211,10 @@ class BlobFile(object):
         # each other, can happen since startProducing is a deferred
         return self.blob_write_lock.run(self._save_verified_blob, writer)
 
-    @defer.inlineCallbacks
     def _save_verified_blob(self, writer):
         if self.saved_verified_blob is False:
-            writer.write_handle.seek(0)
-            out_path = os.path.join(self.blob_dir, self.blob_hash)
-            producer = FileBodyProducer(writer.write_handle)
-            yield producer.startProducing(open(out_path, 'wb'))
+            writer.commit(self.file_path)
             self.saved_verified_blob = True
-            defer.returnValue(True)
+            return defer.succeed(True)
         else:
-            raise DownloadCanceledError()
+            return defer.fail(Failure(DownloadCanceledError()))
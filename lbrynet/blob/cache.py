@@ -0,0 +1,111 @@
+import weakref
+from collections import OrderedDict
+
+
+class BlobCache(object):
+    """
+    A bounded mapping of blob hash to BlobFile that evicts the least recently used blobs
+
+    Blobs that are open for reading or writing are never evicted. Evicted blobs that are
+    still referenced elsewhere (for instance by a DownloadManager) are tracked weakly, so
+    that there is never more than one BlobFile instance for a blob hash alive at a time.
+    """
+
+    def __init__(self, max_size):
+        if max_size < 1:
+            raise ValueError("invalid blob cache size: %i" % max_size)
+        self.max_size = max_size
+        self._blobs = OrderedDict()
+        self._evicted = weakref.WeakValueDictionary()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._blobs)
+
+    def __iter__(self):
+        return iter(self._blobs)
+
+    def __contains__(self, blob_hash):
+        return blob_hash in self._blobs or blob_hash in self._evicted
+
+    def __getitem__(self, blob_hash):
+        blob = self._touch(blob_hash)
+        if blob is None:
+            raise KeyError(blob_hash)
+        return blob
+
+    def __setitem__(self, blob_hash, blob):
+        self._blobs.pop(blob_hash, None)
+        self._evicted.pop(blob_hash, None)
+        self._blobs[blob_hash] = blob
+        self._evict()
+
+    def __delitem__(self, blob_hash):
+        if self.pop(blob_hash, None) is None:
+            raise KeyError(blob_hash)
+
+    def get(self, blob_hash, default=None):
+        """
+        Look up a blob, marking it as the most recently used one. Lookups are
+        counted as cache hits or misses.
+        """
+        blob = self._touch(blob_hash)
+        if blob is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return blob
+
+    def pop(self, blob_hash, default=None):
+        blob = self._blobs.pop(blob_hash, None)
+        evicted = self._evicted.pop(blob_hash, None)
+        if blob is None:
+            blob = evicted
+        if blob is None:
+            return default
+        return blob
+
+    def keys(self):
+        return self._blobs.keys()
+
+    def values(self):
+        return self._blobs.values()
+
+    def itervalues(self):
+        return self._blobs.itervalues()
+
+    def get_stats(self):
+        return {
+            'cached_blobs': len(self._blobs),
+            'max_cached_blobs': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+    def _touch(self, blob_hash):
+        blob = self._blobs.pop(blob_hash, None)
+        if blob is None:
+            blob = self._evicted.pop(blob_hash, None)
+            if blob is None:
+                return None
+            self._blobs[blob_hash] = blob
+            self._evict()
+        else:
+            self._blobs[blob_hash] = blob
+        return blob
+
+    def _evict(self):
+        # blobs with open readers or writers are moved to the most recently used end
+        # instead of being evicted, stop once every blob has been looked at
+        to_check = len(self._blobs)
+        while len(self._blobs) > self.max_size and to_check:
+            to_check -= 1
+            blob_hash, blob = self._blobs.popitem(last=False)
+            if blob.readers or blob.is_downloading():
+                self._blobs[blob_hash] = blob
+                continue
+            self._evicted[blob_hash] = blob
+            self.evictions += 1
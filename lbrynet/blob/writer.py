@@ -1,5 +1,6 @@
+import os
 import logging
-from io import BytesIO
+import tempfile
 from twisted.python.failure import Failure
 from lbrynet.core.Error import DownloadCanceledError, InvalidDataError
 from lbrynet.core.cryptoutils import get_lbry_hash_obj
@@ -7,9 +8,19 @@ from lbrynet.core.cryptoutils import get_lbry_hash_obj
 log = logging.getLogger(__name__)
 
 
+TEMP_BLOB_PREFIX = "lbry-blob-"
+TEMP_BLOB_SUFFIX = ".tmp"
+
+
 class HashBlobWriter(object):
-    def __init__(self, length_getter, finished_cb):
-        self.write_handle = BytesIO()
+    """
+    Hashes data as it is written to a temporary file in the blob directory, once the
+    blob has been verified commit() moves the temporary file into place
+    """
+
+    def __init__(self, blob_dir, length_getter, finished_cb):
+        fd, self.temp_path = tempfile.mkstemp(TEMP_BLOB_SUFFIX, TEMP_BLOB_PREFIX, blob_dir)
+        self.write_handle = os.fdopen(fd, 'wb')
         self.length_getter = length_getter
         self.finished_cb = finished_cb
         self.finished_cb_d = None
@@ -43,10 +54,30 @@ class HashBlobWriter(object):
             if self.len_so_far == self.length_getter():
                 self.finished_cb_d = self.finished_cb(self)
 
+    def commit(self, file_path):
+        """
+        Atomically move the written data to file_path
+        """
+        if self.write_handle is None:
+            raise IOError('I/O operation on closed file')
+        self.write_handle.close()
+        self.write_handle = None
+        if os.name == 'nt' and os.path.isfile(file_path):
+            # os.rename can't replace an existing file on windows
+            os.remove(file_path)
+        os.rename(self.temp_path, file_path)
+        self.temp_path = None
+
     def close_handle(self):
         if self.write_handle is not None:
             self.write_handle.close()
             self.write_handle = None
+        if self.temp_path is not None:
+            try:
+                os.remove(self.temp_path)
+            except OSError as err:
+                log.warning("Failed to remove temporary blob file %s: %s", self.temp_path, err)
+            self.temp_path = None
 
     def close(self, reason=None):
         # if we've already called finished_cb because we either finished writing
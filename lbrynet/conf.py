@@ -254,6 +254,9 @@ ADJUSTABLE_SETTINGS = {
     # automatically renewed after startup (if set to 0, renews
     # will not be made automatically)
     'auto_renew_claim_height_delta': (int, 0),
+    # maximum number of blob objects kept in memory by the blob manager, blobs
+    # that are being read or written are kept regardless of this limit
+    'blob_cache_size': (int, 10000),
     'cache_time': (int, 150),
     'data_dir': (str, default_data_dir),
     'data_rate': (float, .0001),  # points/megabyte
@@ -274,7 +277,11 @@ ADJUSTABLE_SETTINGS = {
     'min_info_rate': (float, .02),  # points/1000 infos
     'min_valuable_hash_rate': (float, .05),  # points/1000 infos
     'min_valuable_info_rate': (float, .05),  # points/1000 infos
+    # upload blobs from a read only memory map of the blob file
+    'mmap_blob_uploads': (bool, True),
     'peer_port': (int, 3333),
+    # number of blobs to read and encrypt at a time when publishing, 0 for one per cpu
+    'publish_workers': (int, 0),
     'pointtrader_server': (str, 'http://127.0.0.1:2424'),
     'reflector_port': (int, 5566),
     # if reflect_uploads is True, send files to reflector (after publishing as well as a
@@ -4,7 +4,9 @@ from sqlite3 import IntegrityError
 from twisted.internet import threads, defer, reactor
 from lbrynet import conf
 from lbrynet.blob.blob_file import BlobFile
+from lbrynet.blob.cache import BlobCache
 from lbrynet.blob.creator import BlobFileCreator
+from lbrynet.blob.writer import TEMP_BLOB_PREFIX, TEMP_BLOB_SUFFIX
 from lbrynet.core.server.DHTHashAnnouncer import DHTHashSupplier
 
 log = logging.getLogger(__name__)
@@ -24,13 +26,20 @@ class DiskBlobManager(DHTHashSupplier):
         self.announce_head_blobs_only = conf.settings['announce_head_blobs_only']
         self.blob_dir = blob_dir
         self.blob_creator_type = BlobFileCreator
-        # TODO: consider using an LRU for blobs as there could potentially
-        #       be thousands of blobs loaded up, many stale
-        self.blobs = {}
+        self.blobs = BlobCache(conf.settings['blob_cache_size'])
+        # hashes of the finished blobs in storage, used to answer availability queries
+        # without touching the disk
+        self.verified_blob_hashes = set()
         self.blob_hashes_to_delete = {}  # {blob_hash: being_deleted (True/False)}
+        self._blob_waiters = {}  # {blob_hash: [Deferred]}
 
+    @defer.inlineCallbacks
     def setup(self):
-        return defer.succeed(True)
+        yield threads.deferToThread(self._remove_temp_blob_files)
+        blob_hashes = yield self.storage.get_all_finished_blobs()
+        self.verified_blob_hashes.update(blob_hashes)
+        log.info("Loaded %i finished blobs", len(self.verified_blob_hashes))
+        defer.returnValue(True)
 
     def stop(self):
         return defer.succeed(True)
@@ -41,9 +50,21 @@ class DiskBlobManager(DHTHashSupplier):
         """
         if length is not None and not isinstance(length, int):
             raise Exception("invalid length type: %s (%s)" % (length, str(type(length))))
+        blob = self.blobs.get(blob_hash)
+        if blob is not None:
+            return defer.succeed(blob)
+        return self._make_new_blob(blob_hash, length)
+
+    def get_known_blob(self, blob_hash):
+        """Return a blob that is cached or finished, or None for an unknown blob_hash
+
+        Unlike get_blob this doesn't cache a new blob without a length for an unknown hash
+        """
         if blob_hash in self.blobs:
             return defer.succeed(self.blobs[blob_hash])
-        return self._make_new_blob(blob_hash, length)
+        if blob_hash in self.verified_blob_hashes:
+            return self.get_blob(blob_hash)
+        return defer.succeed(None)
 
     def get_blob_creator(self):
         return self.blob_creator_type(self.blob_dir)
@@ -66,13 +87,49 @@ class DiskBlobManager(DHTHashSupplier):
         yield self.storage.add_completed_blob(
             blob.blob_hash, blob.length, next_announce_time, should_announce
         )
+        self.verified_blob_hashes.add(blob.blob_hash)
+        self._fire_blob_waiters([blob.blob_hash])
         # we announce all blobs immediately, if announce_head_blob_only is False
         # otherwise, announce only if marked as should_announce
         if not self.announce_head_blobs_only or should_announce:
             reactor.callLater(0, self._immediate_announce, [blob.blob_hash])
 
+    def wait_for_blob(self, blob_hash):
+        """
+        Wait for a blob to be completed
+
+        Returns a Deferred which fires with True once the blob is in storage, right away if it
+        already is. Cancelling the Deferred stops waiting.
+        """
+        if blob_hash in self.verified_blob_hashes:
+            return defer.succeed(True)
+
+        def cancel(d):
+            waiters = self._blob_waiters.get(blob_hash, [])
+            if d in waiters:
+                waiters.remove(d)
+                if not waiters:
+                    del self._blob_waiters[blob_hash]
+
+        d = defer.Deferred(cancel)
+        self._blob_waiters.setdefault(blob_hash, []).append(d)
+        return d
+
+    def _fire_blob_waiters(self, blob_hashes):
+        for blob_hash in blob_hashes:
+            for d in self._blob_waiters.pop(blob_hash, []):
+                d.callback(True)
+
     def completed_blobs(self, blobhashes_to_check):
-        return self._completed_blobs(blobhashes_to_check)
+        """Returns of the blobhashes_to_check, which are valid"""
+        return defer.succeed(self.get_completed_blob_hashes(blobhashes_to_check))
+
+    def get_completed_blob_hashes(self, blobhashes_to_check):
+        return [blob_hash for blob_hash in blobhashes_to_check
+                if blob_hash in self.verified_blob_hashes]
+
+    def get_cache_stats(self):
+        return self.blobs.get_stats()
 
     def hashes_to_announce(self):
         return self.storage.get_blobs_to_announce(self.hash_announcer)
@@ -80,14 +137,15 @@ class DiskBlobManager(DHTHashSupplier):
     def count_should_announce_blobs(self):
         return self.storage.count_should_announce_blobs()
 
+    @defer.inlineCallbacks
     def set_should_announce(self, blob_hash, should_announce):
-        if blob_hash in self.blobs:
-            blob = self.blobs[blob_hash]
-            if blob.get_is_verified():
-                return self.storage.set_should_announce(
-                    blob_hash, self.get_next_announce_time(), should_announce
-                )
-        return defer.succeed(False)
+        blob = yield self.get_known_blob(blob_hash)
+        if blob is not None and blob.get_is_verified():
+            result = yield self.storage.set_should_announce(
+                blob_hash, self.get_next_announce_time(), should_announce
+            )
+            defer.returnValue(result)
+        defer.returnValue(False)
 
     def get_should_announce(self, blob_hash):
         return self.storage.should_announce(blob_hash)
@@ -105,6 +163,24 @@ class DiskBlobManager(DHTHashSupplier):
         next_announce_time = self.get_next_announce_time()
         return self.blob_completed(new_blob, next_announce_time, should_announce)
 
+    @defer.inlineCallbacks
+    def blobs_created(self, blob_infos):
+        """
+        Register the blobs of a new stream that were written straight to the blob directory
+
+        The first of the blobs is the head blob of the stream, it should be announced.
+        """
+        next_announce_time = self.get_next_announce_time(len(blob_infos))
+        completed = [(blob_info.blob_hash, blob_info.length, next_announce_time, i == 0)
+                     for i, blob_info in enumerate(blob_infos)]
+        yield self.storage.add_completed_blobs(completed)
+        self.verified_blob_hashes.update(blob_info.blob_hash for blob_info in blob_infos)
+        self._fire_blob_waiters([blob_info.blob_hash for blob_info in blob_infos])
+        to_announce = [blob_hash for blob_hash, _, _, should_announce in completed
+                       if not self.announce_head_blobs_only or should_announce]
+        if to_announce:
+            reactor.callLater(0, self._immediate_announce, to_announce)
+
     def immediate_announce_all_blobs(self):
         d = self._get_all_verified_blob_hashes()
         d.addCallback(self._immediate_announce)
@@ -123,7 +199,8 @@ class DiskBlobManager(DHTHashSupplier):
                 blob = yield self.get_blob(blob_hash)
                 yield blob.delete()
                 bh_to_delete_from_db.append(blob_hash)
-                del self.blobs[blob_hash]
+                self.blobs.pop(blob_hash)
+                self.verified_blob_hashes.discard(blob_hash)
             except Exception as e:
                 log.warning("Failed to delete blob file. Reason: %s", e)
         try:
@@ -132,12 +209,17 @@ class DiskBlobManager(DHTHashSupplier):
             if err.message != "FOREIGN KEY constraint failed":
                 raise err
 
-    @defer.inlineCallbacks
-    def _completed_blobs(self, blobhashes_to_check):
-        """Returns of the blobhashes_to_check, which are valid"""
-        blobs = yield defer.DeferredList([self.get_blob(b) for b in blobhashes_to_check])
-        blob_hashes = [b.blob_hash for success, b in blobs if success and b.verified]
-        defer.returnValue(blob_hashes)
+    def _remove_temp_blob_files(self):
+        # remove partially written blobs left behind by a previous run
+        if not os.path.isdir(self.blob_dir):
+            return True
+        for file_name in os.listdir(self.blob_dir):
+            if file_name.startswith(TEMP_BLOB_PREFIX) and file_name.endswith(TEMP_BLOB_SUFFIX):
+                try:
+                    os.remove(os.path.join(self.blob_dir, file_name))
+                except OSError as err:
+                    log.warning("Failed to remove temporary blob file %s: %s", file_name, err)
+        return True
 
     def _get_all_verified_blob_hashes(self):
         d = self.storage.get_all_blob_hashes()
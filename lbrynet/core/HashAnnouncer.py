@@ -14,5 +14,8 @@ class DummyHashAnnouncer(object):
     def hash_queue_size(self):
         return 0
 
+    def announces_per_minute(self):
+        return 0
+
     def immediate_announce(self, *args):
         pass
@@ -4,6 +4,9 @@ from lbrynet.core import utils
 
 # Do not create this object except through PeerManager
 class Peer(object):
+    # weight of the newest measurement in the smoothed download rate and latency
+    MEASUREMENT_WEIGHT = 0.3
+
     def __init__(self, host, port):
         self.host = host
         self.port = port
@@ -15,6 +18,10 @@ class Peer(object):
         self.success_count = 0
         self.score = 0
         self.stats = defaultdict(float)  # {string stat_type, float count}
+        # smoothed bytes/sec this peer sends blob data at, None until a blob has been downloaded
+        self.download_rate = None
+        # smoothed seconds from sending this peer a request to getting the response
+        self.latency = None
 
     def is_available(self):
         if self.attempt_connection_at is None or utils.today() > self.attempt_connection_at:
@@ -39,6 +46,27 @@ class Peer(object):
     def update_stats(self, stat_type, count):
         self.stats[stat_type] += count
 
+    def report_latency(self, seconds):
+        self.latency = self._smooth(self.latency, seconds)
+
+    def report_blob_downloaded(self, num_bytes, seconds):
+        if num_bytes and seconds > 0:
+            self.download_rate = self._smooth(self.download_rate, float(num_bytes) / seconds)
+
+    def expected_download_rate(self, num_bytes):
+        """
+        Bytes/sec this peer is expected to provide when requesting num_bytes from it,
+        including the time to get the response, or None if nothing has been downloaded from it
+        """
+        if self.download_rate is None:
+            return None
+        return num_bytes / ((self.latency or 0.0) + float(num_bytes) / self.download_rate)
+
+    def _smooth(self, average, measurement):
+        if average is None:
+            return float(measurement)
+        return average + self.MEASUREMENT_WEIGHT * (measurement - average)
+
     def __str__(self):
         return '{}:{}'.format(self.host, self.port)
 
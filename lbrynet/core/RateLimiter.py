@@ -1,3 +1,4 @@
+import heapq
 import logging
 
 from zope.interface import implements
@@ -37,120 +38,247 @@ class DummyRateLimiter(object):
     def set_ul_limit(self, limit):
         pass
 
-    def report_dl_bytes(self, num_bytes):
+    def report_dl_bytes(self, num_bytes, protocol=None):
         self.dl_bytes_this_second += num_bytes
         self.total_dl_bytes += num_bytes
 
-    def report_ul_bytes(self, num_bytes):
+    def report_ul_bytes(self, num_bytes, protocol=None):
         self.ul_bytes_this_second += num_bytes
         self.total_ul_bytes += num_bytes
 
+    def register_protocol(self, protocol, stream=None):
+        pass
+
+    def unregister_protocol(self, protocol):
+        pass
+
+
+class BandwidthThrottle(object):
+    """
+    Limits one direction of traffic with a token bucket and splits it fairly between protocols
+
+    The bucket is refilled at the maximum rate and every reported byte is taken from it. While
+    it has tokens protocols aren't held back, so the bandwidth one of them doesn't use is free
+    for the others. Once it is overdrawn, the protocols that report bytes are paused, and as
+    tokens are refilled they are resumed individually, the one that has been served the fewest
+    bytes for its share first. While protocols are waiting, the ones that have been served more
+    than them are paused too. The shares are weights: the streams with registered protocols get
+    equal shares, split equally between the protocols of each stream.
+    """
+
+    MIN_WAKE_DELAY = 0.001
+
+    def __init__(self, rate_limiter, max_bytes, throttle_method, unthrottle_method):
+        self.rate_limiter = rate_limiter
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._throttle_method = throttle_method
+        self._unthrottle_method = unthrottle_method
+        self._tokens = None
+        self._refilled_at = None
+        self._wake_call = None
+        # bytes served to each protocol divided by its share
+        self._served = {}
+        # the served value of the least served paused protocol when protocols were last resumed,
+        # idle protocols start from here instead of catching up on the bandwidth they didn't use
+        self._served_floor = 0.0
+        self._last_report = {}
+        # heap of (served, order, protocol) of the paused protocols
+        self._paused = []
+        self._paused_protocols = set()
+        self._order = 0
+
+    def set_limit(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._tokens = None
+        self._cancel_wake()
+        self.resume_all()
+
+    def add_protocol(self, protocol):
+        self._served[protocol] = self._served_floor
+        self._last_report[protocol] = 0
+
+    def remove_protocol(self, protocol):
+        # a paused protocol that is removed is skipped when it comes up in the heap
+        del self._served[protocol]
+        del self._last_report[protocol]
+        self._paused_protocols.discard(protocol)
+        if not self._served:
+            self._paused = []
+            self._cancel_wake()
+
+    def resume_all(self):
+        paused, self._paused_protocols = self._paused_protocols, set()
+        self._paused = []
+        for protocol in paused:
+            getattr(protocol, self._unthrottle_method)()
+
+    def stop(self):
+        self._cancel_wake()
+        self.resume_all()
+
+    def report_bytes(self, num_bytes, protocol):
+        self.total_bytes += num_bytes
+        if self.max_bytes is None:
+            return
+        self._refill()
+        self._tokens -= num_bytes
+        if protocol not in self._served:
+            return
+        served = max(self._served[protocol], self._served_floor)
+        self._served[protocol] = served + num_bytes / self.rate_limiter.get_share(protocol)
+        self._last_report[protocol] = num_bytes
+        if self._paused:
+            # protocols are waiting for tokens, only the ones that have been served less than
+            # them (or less than a burst more if there are tokens) may carry on
+            ahead = self._served[protocol] - self._paused[0][0]
+            if self._tokens >= 0:
+                ahead -= self.max_bytes * self.rate_limiter.BURST_SECONDS
+            pause = ahead > 0
+        else:
+            pause = self._tokens < 0
+        if pause:
+            if protocol not in self._paused_protocols:
+                self._paused_protocols.add(protocol)
+                getattr(protocol, self._throttle_method)()
+                self._pause(protocol)
+            if self._wake_call is None:
+                self._schedule_wake(-self._tokens / self.max_bytes)
+
+    def _refill(self):
+        now = self.rate_limiter.clock.seconds()
+        capacity = self.max_bytes * self.rate_limiter.BURST_SECONDS
+        if self._tokens is None:
+            self._tokens = capacity
+        else:
+            self._tokens = min(capacity, self._tokens + (now - self._refilled_at) * self.max_bytes)
+        self._refilled_at = now
+
+    def _pause(self, protocol):
+        self._order += 1
+        heapq.heappush(self._paused, (self._served[protocol], self._order, protocol))
+
+    def _pop_least_served(self):
+        while self._paused:
+            served, _, protocol = heapq.heappop(self._paused)
+            if protocol not in self._paused_protocols:
+                continue
+            if served != self._served[protocol]:
+                # it reported more bytes while it was paused
+                self._pause(protocol)
+                continue
+            self._paused_protocols.remove(protocol)
+            return protocol
+        return None
+
+    def _schedule_wake(self, delay):
+        # a floor on the delay so rounding errors can't have it woken again at the same time
+        self._wake_call = self.rate_limiter.clock.callLater(max(delay, self.MIN_WAKE_DELAY),
+                                                            self._wake)
+
+    def _cancel_wake(self):
+        if self._wake_call is not None and self._wake_call.active():
+            self._wake_call.cancel()
+        self._wake_call = None
+
+    def _wake(self):
+        self._wake_call = None
+        self._refill()
+        # resume as many protocols as the tokens are expected to last for, going by how many
+        # bytes each of them reported last time
+        tokens = self._tokens
+        if tokens >= 0 and self._paused:
+            self._served_floor = max(self._served_floor, self._paused[0][0])
+        while tokens >= 0:
+            protocol = self._pop_least_served()
+            if protocol is None:
+                return
+            tokens -= self._last_report[protocol]
+            getattr(protocol, self._unthrottle_method)()
+        if self._paused:
+            self._schedule_wake(-tokens / self.max_bytes)
+
 
 class RateLimiter(object):
-    """This class ensures that upload and download rates don't exceed specified maximums"""
+    """
+    Keeps upload and download rates under the given maximums, see BandwidthThrottle
+
+    Protocols are registered with the stream they belong to, so that each stream gets an equal
+    share of the bandwidth no matter how many connections it has.
+    """
 
     implements(IRateLimiter)
+    # seconds of traffic at the full rate that the token bucket can hold
+    BURST_SECONDS = 0.2
 
     #called by main application
 
-    def __init__(self, max_dl_bytes=None, max_ul_bytes=None):
-        self.max_dl_bytes = max_dl_bytes
-        self.max_ul_bytes = max_ul_bytes
-        self.dl_bytes_this_interval = 0
-        self.ul_bytes_this_interval = 0
-        self.total_dl_bytes = 0
-        self.total_ul_bytes = 0
-        self.tick_call = None
-        self.tick_interval = 0.1
-
-        self.dl_throttled = False
-        self.ul_throttled = False
-
-        self.protocols = []
+    def __init__(self, max_dl_bytes=None, max_ul_bytes=None, clock=None):
+        if clock is None:
+            from twisted.internet import reactor
+            clock = reactor
+        self.clock = clock
+        self.dl_throttle = BandwidthThrottle(self, max_dl_bytes, 'throttle_download',
+                                             'unthrottle_download')
+        self.ul_throttle = BandwidthThrottle(self, max_ul_bytes, 'throttle_upload',
+                                             'unthrottle_upload')
+        self.protocols = {}  # {protocol: stream}
+        self._stream_sizes = {}  # {stream: number of registered protocols}
+
+    @property
+    def max_dl_bytes(self):
+        return self.dl_throttle.max_bytes
+
+    @property
+    def max_ul_bytes(self):
+        return self.ul_throttle.max_bytes
+
+    @property
+    def total_dl_bytes(self):
+        return self.dl_throttle.total_bytes
+
+    @property
+    def total_ul_bytes(self):
+        return self.ul_throttle.total_bytes
 
     def start(self):
         log.info("Starting rate limiter.")
-        self.tick_call = task.LoopingCall(self.tick)
-        self.tick_call.start(self.tick_interval)
-
-    def tick(self):
-        self.dl_bytes_this_interval = 0
-        self.ul_bytes_this_interval = 0
-        self.unthrottle_dl()
-        self.unthrottle_ul()
 
     def stop(self):
         log.info("Stopping rate limiter.")
-        if self.tick_call is not None:
-            self.tick_call.stop()
-            self.tick_call = None
+        self.dl_throttle.stop()
+        self.ul_throttle.stop()
 
     def set_dl_limit(self, limit):
-        self.max_dl_bytes = limit
+        self.dl_throttle.set_limit(limit)
 
     def set_ul_limit(self, limit):
-        self.max_ul_bytes = limit
-
-    #throttling
+        self.ul_throttle.set_limit(limit)
 
-    def check_dl(self):
-        need_throttle = (self.max_dl_bytes is not None and
-                         self.dl_bytes_this_interval > self.max_dl_bytes * self.tick_interval)
-        if need_throttle:
-            from twisted.internet import reactor
-            reactor.callLater(0, self.throttle_dl)
-
-    def check_ul(self):
-        need_throttle = (self.max_ul_bytes is not None and
-                         self.ul_bytes_this_interval > self.max_ul_bytes * self.tick_interval)
-        if need_throttle:
-            from twisted.internet import reactor
-            reactor.callLater(0, self.throttle_ul)
-
-    def throttle_dl(self):
-        if self.dl_throttled is False:
-            for protocol in self.protocols:
-                protocol.throttle_download()
-            self.dl_throttled = True
-
-    def throttle_ul(self):
-        if self.ul_throttled is False:
-            for protocol in self.protocols:
-                protocol.throttle_upload()
-            self.ul_throttled = True
-
-    def unthrottle_dl(self):
-        if self.dl_throttled is True:
-            for protocol in self.protocols:
-                protocol.unthrottle_download()
-            self.dl_throttled = False
-
-    def unthrottle_ul(self):
-        if self.ul_throttled is True:
-            for protocol in self.protocols:
-                protocol.unthrottle_upload()
-            self.ul_throttled = False
+    def get_share(self, protocol):
+        """Get the fraction of the bandwidth that belongs to a registered protocol"""
+        return 1.0 / len(self._stream_sizes) / self._stream_sizes[self.protocols[protocol]]
 
     #called by protocols
 
-    def report_dl_bytes(self, num_bytes):
-        self.dl_bytes_this_interval += num_bytes
-        self.total_dl_bytes += num_bytes
-        self.check_dl()
+    def report_dl_bytes(self, num_bytes, protocol=None):
+        self.dl_throttle.report_bytes(num_bytes, protocol)
 
-    def report_ul_bytes(self, num_bytes):
-        self.ul_bytes_this_interval += num_bytes
-        self.total_ul_bytes += num_bytes
-        self.check_ul()
+    def report_ul_bytes(self, num_bytes, protocol=None):
+        self.ul_throttle.report_bytes(num_bytes, protocol)
 
-    def register_protocol(self, protocol):
+    def register_protocol(self, protocol, stream=None):
         if protocol not in self.protocols:
-            self.protocols.append(protocol)
-            if self.dl_throttled is True:
-                protocol.throttle_download()
-            if self.ul_throttled is True:
-                protocol.throttle_upload()
+            self.protocols[protocol] = stream
+            self._stream_sizes[stream] = self._stream_sizes.get(stream, 0) + 1
+            self.dl_throttle.add_protocol(protocol)
+            self.ul_throttle.add_protocol(protocol)
 
     def unregister_protocol(self, protocol):
         if protocol in self.protocols:
-            self.protocols.remove(protocol)
+            stream = self.protocols.pop(protocol)
+            self._stream_sizes[stream] -= 1
+            if not self._stream_sizes[stream]:
+                del self._stream_sizes[stream]
+            self.dl_throttle.remove_protocol(protocol)
+            self.ul_throttle.remove_protocol(protocol)
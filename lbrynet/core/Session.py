@@ -1,7 +1,8 @@
 import logging
+import os
 import miniupnpc
 from lbrynet.core.BlobManager import DiskBlobManager
-from lbrynet.dht import node
+from lbrynet.dht import node, datastore
 from lbrynet.database.storage import SQLiteStorage
 from lbrynet.core.PeerManager import PeerManager
 from lbrynet.core.RateLimiter import RateLimiter
@@ -11,6 +12,7 @@ from lbrynet.core.server.DHTHashAnnouncer import DHTHashAnnouncer
 from lbrynet.core.utils import generate_id
 from lbrynet.core.PaymentRateManager import BasePaymentRateManager, NegotiatedPaymentRateManager
 from lbrynet.core.BlobAvailability import BlobAvailabilityTracker
+from lbrynet.core.StartupGraph import StartupGraph
 from twisted.internet import threads, defer
 
 log = logging.getLogger(__name__)
@@ -132,6 +134,7 @@ class Session(object):
         self.wallet = wallet
         self.dht_node_class = dht_node_class
         self.dht_node = None
+        self.dht_data_store = None
 
         self.base_payment_rate_manager = BasePaymentRateManager(blob_data_payment_rate)
         self.payment_rate_manager = None
@@ -143,6 +146,21 @@ class Session(object):
         """Create the blob directory and database if necessary, start all desired services"""
 
         log.debug("Starting session.")
+        startup = StartupGraph()
+        self.add_startup_components(startup)
+        return startup.start()
+
+    def add_startup_components(self, startup, dependencies=()):
+        """
+        Add the components of the session to a StartupGraph, so they can be started concurrently
+        with each other and with the components of an application using the session
+
+        The components are upnp, dht, dht_join, rate_limiter, storage, blob_manager, blob_tracker
+        and wallet.
+
+        @param startup: the StartupGraph to add the components to
+        @param dependencies: names of components which have to be started before the storage
+        """
 
         if self.node_id is None:
             self.node_id = generate_id()
@@ -154,20 +172,14 @@ class Session(object):
         if self.peer_manager is None:
             self.peer_manager = PeerManager()
 
-        if self.use_upnp is True:
-            d = self._try_upnp()
-        else:
-            d = defer.succeed(True)
-
-        if self.peer_finder is None:
-            d.addCallback(lambda _: self._setup_dht())
-        else:
-            if self.hash_announcer is None and self.peer_port is not None:
-                log.warning("The server has no way to advertise its available blobs.")
-                self.hash_announcer = DummyHashAnnouncer()
-
-        d.addCallback(lambda _: self._setup_other_components())
-        return d
+        startup.add_component('upnp', self._try_upnp if self.use_upnp is True else lambda: True)
+        startup.add_component('dht', self._setup_dht, ['upnp'])
+        startup.add_component('dht_join', self._join_dht, ['dht'])
+        startup.add_component('rate_limiter', self._setup_rate_limiter)
+        startup.add_component('storage', self.storage.setup, dependencies)
+        startup.add_component('blob_manager', self._setup_blob_manager, ['storage', 'dht'])
+        startup.add_component('blob_tracker', self._setup_blob_tracker, ['blob_manager'])
+        startup.add_component('wallet', self.wallet.start, ['storage'])
 
     def shut_down(self):
         """Stop all services"""
@@ -177,6 +189,8 @@ class Session(object):
             ds.append(defer.maybeDeferred(self.blob_tracker.stop))
         if self.dht_node is not None:
             ds.append(defer.maybeDeferred(self.dht_node.stop))
+        if self.dht_data_store is not None:
+            ds.append(defer.maybeDeferred(self.dht_data_store.stop))
         if self.rate_limiter is not None:
             ds.append(defer.maybeDeferred(self.rate_limiter.stop))
         if self.peer_finder is not None:
@@ -284,18 +298,26 @@ class Session(object):
         return dl
 
     def _setup_dht(self):
+        if self.peer_finder is not None:
+            if self.hash_announcer is None and self.peer_port is not None:
+                log.warning("The server has no way to advertise its available blobs.")
+                self.hash_announcer = DummyHashAnnouncer()
+            return
+
         log.info("Starting DHT")
 
-        def start_dht(join_network_result):
-            self.peer_finder.run_manage_loop()
-            self.hash_announcer.run_manage_loop()
-            return True
+        if self.db_dir is not None:
+            # keep the peers stored by other nodes across restarts
+            self.dht_data_store = datastore.PersistentDataStore(
+                os.path.join(self.db_dir, "dht_datastore"))
+            self.dht_data_store.start()
 
         self.dht_node = self.dht_node_class(
             udpPort=self.dht_node_port,
             node_id=self.node_id,
             externalIP=self.external_ip,
-            peerPort=self.peer_port
+            peerPort=self.peer_port,
+            dataStore=self.dht_data_store
         )
         self.peer_finder = DHTPeerFinder(self.dht_node, self.peer_manager)
         if self.hash_announcer is None:
@@ -303,15 +325,24 @@ class Session(object):
 
         self.dht_node.startNetwork()
 
-        # pass start_dht() as callback to start the remaining components after joining the DHT
-        return self.join_dht(start_dht)
+    def _join_dht(self):
+        if self.dht_node is None:
+            return
+
+        def start_dht(join_network_result):
+            self.peer_finder.run_manage_loop()
+            self.hash_announcer.run_manage_loop()
+            return True
 
-    def _setup_other_components(self):
-        log.debug("Setting up the rest of the components")
+        # pass start_dht() as callback to start announcing and finding peers after joining the DHT
+        return self.join_dht(start_dht)
 
+    def _setup_rate_limiter(self):
         if self.rate_limiter is None:
             self.rate_limiter = RateLimiter()
+        self.rate_limiter.start()
 
+    def _setup_blob_manager(self):
         if self.blob_manager is None:
             if self.blob_dir is None:
                 raise Exception(
@@ -320,7 +351,9 @@ class Session(object):
                 self.blob_manager = DiskBlobManager(
                     self.hash_announcer, self.blob_dir, self.storage
                 )
+        return self.blob_manager.setup()
 
+    def _setup_blob_tracker(self):
         if self.blob_tracker is None:
             self.blob_tracker = self.blob_tracker_class(
                 self.blob_manager, self.peer_finder, self.dht_node
@@ -329,12 +362,7 @@ class Session(object):
             self.payment_rate_manager = self.payment_rate_manager_class(
                 self.base_payment_rate_manager, self.blob_tracker, self.is_generous
             )
-
-        self.rate_limiter.start()
-        d = self.storage.setup()
-        d.addCallback(lambda _: self.wallet.start())
-        d.addCallback(lambda _: self.blob_tracker.start())
-        return d
+        return self.blob_tracker.start()
 
     def _unset_upnp(self):
         log.info("Unsetting upnp for session")
@@ -0,0 +1,137 @@
+import logging
+from collections import OrderedDict
+from twisted.internet import defer
+
+log = logging.getLogger(__name__)
+
+
+class StartupGraph(object):
+    """
+    Starts components as soon as the components they depend on have started
+
+    A component is a name, a function which starts it (returning a Deferred or a value) and the
+    names of the components it depends on. Components that don't depend on each other are
+    started concurrently. If a component fails to start, the components depending on it are
+    never started and start() fails right away, the components that are already starting are
+    left to finish.
+    """
+
+    WAITING = 'waiting'
+    STARTING = 'starting'
+    STARTED = 'started'
+    FAILED = 'failed'
+
+    def __init__(self, clock=None):
+        if clock is None:
+            from twisted.internet import reactor
+            clock = reactor
+        self.clock = clock
+        self._components = OrderedDict()  # {name: (start function, dependency names)}
+        self._status = {}
+        self._times = {}  # {name: [start time, end time]}
+        self._waiters = {}  # {name: [Deferred]}
+        self._start_time = None
+        self._finished = None
+
+    def add_component(self, name, start, dependencies=()):
+        if name in self._components:
+            raise ValueError("%s is already a component" % name)
+        if self._start_time is not None:
+            raise ValueError("can't add %s, the components have already been started" % name)
+        self._components[name] = (start, tuple(dependencies))
+        self._status[name] = self.WAITING
+
+    def start(self):
+        """
+        Start all of the components
+
+        @return: Deferred which fires once every component has started, or fails with the
+            failure of the first component that fails
+        """
+        for name, (_, dependencies) in self._components.iteritems():
+            for dependency in dependencies:
+                if dependency not in self._components:
+                    raise ValueError("%s depends on unknown component %s" % (name, dependency))
+        self._check_for_cycles()
+        self._start_time = self.clock.seconds()
+        self._finished = defer.Deferred()
+        self._start_ready_components()
+        return self._finished
+
+    def wait_for(self, name):
+        """Get a Deferred which fires once a component has started"""
+        if self._status[name] == self.STARTED:
+            return defer.succeed(True)
+        d = defer.Deferred()
+        self._waiters.setdefault(name, []).append(d)
+        return d
+
+    def is_started(self, name):
+        return self._status.get(name) == self.STARTED
+
+    def get_status(self):
+        """
+        Get the status of each component and how long it took to start
+
+        @return: {name: {'status': waiting, starting, started or failed,
+                         'start_time': seconds after start() that the component started
+                                       starting, None if it hasn't yet,
+                         'duration': seconds it took to start, None if it hasn't started yet}}
+        """
+        status = {}
+        for name in self._components:
+            start_time = end_time = None
+            if name in self._times:
+                start_time, end_time = self._times[name]
+            status[name] = {
+                'status': self._status[name],
+                'start_time': None if start_time is None else start_time - self._start_time,
+                'duration': None if end_time is None else end_time - start_time,
+            }
+        return status
+
+    def _check_for_cycles(self):
+        visited = set()
+
+        def visit(name, path):
+            if name in path:
+                raise ValueError("dependency cycle: %s" % " -> ".join(path + [name]))
+            if name in visited:
+                return
+            for dependency in self._components[name][1]:
+                visit(dependency, path + [name])
+            visited.add(name)
+
+        for name in self._components:
+            visit(name, [])
+
+    def _start_ready_components(self):
+        for name, (start, dependencies) in self._components.items():
+            if self._status[name] != self.WAITING:
+                continue
+            if all(self._status[dependency] == self.STARTED for dependency in dependencies):
+                self._status[name] = self.STARTING
+                self._times[name] = [self.clock.seconds(), None]
+                log.debug("Starting %s", name)
+                d = defer.maybeDeferred(start)
+                d.addCallbacks(self._component_started, self._component_failed,
+                               callbackArgs=(name, ), errbackArgs=(name, ))
+        if all(status == self.STARTED for status in self._status.itervalues()):
+            if not self._finished.called:
+                self._finished.callback(True)
+
+    def _component_started(self, _, name):
+        self._status[name] = self.STARTED
+        self._times[name][1] = self.clock.seconds()
+        log.info("Started %s in %.2fs", name, self._times[name][1] - self._times[name][0])
+        for d in self._waiters.pop(name, []):
+            d.callback(True)
+        self._start_ready_components()
+
+    def _component_failed(self, err, name):
+        self._status[name] = self.FAILED
+        log.error("Failed to start %s: %s", name, err.getErrorMessage())
+        for d in self._waiters.pop(name, []):
+            d.errback(err)
+        if not self._finished.called:
+            self._finished.errback(err)
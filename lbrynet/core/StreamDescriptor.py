@@ -247,7 +247,8 @@ EncryptedFileStreamType = "lbryfile"
 
 @defer.inlineCallbacks
 def save_sd_info(blob_manager, sd_hash, sd_info):
-    if not blob_manager.blobs.get(sd_hash) or not blob_manager.blobs[sd_hash].get_is_verified():
+    sd_blob = yield blob_manager.get_known_blob(sd_hash)
+    if sd_blob is None or not sd_blob.get_is_verified():
         descriptor_writer = BlobStreamDescriptorWriter(blob_manager)
         calculated_sd_hash = yield descriptor_writer.create_descriptor(sd_info)
         if calculated_sd_hash != sd_hash:
@@ -10,6 +10,7 @@ from zope.interface import implements
 from lbrynet.core.Error import ConnectionClosedBeforeResponseError
 from lbrynet.core.Error import InvalidResponseError, RequestCanceledError, NoResponseError
 from lbrynet.core.Error import PriceDisagreementError, DownloadCanceledError, InsufficientFundsError
+from lbrynet.core.client.BlobScheduler import BlobScheduler
 from lbrynet.core.client.ClientRequest import ClientRequest, ClientBlobRequest
 from lbrynet.interfaces import IRequestCreator
 from lbrynet.core.Offer import Offer
@@ -57,6 +58,7 @@ class BlobRequester(object):
         self._protocol_tries = {}
         self._maxed_out_peers = []
         self._incompatible_peers = []
+        self._scheduler = BlobScheduler()
 
     ######## IRequestCreator #########
     def send_next_request(self, peer, protocol):
@@ -125,12 +127,10 @@ class BlobRequester(object):
         r = None
         blobs_to_download = self._blobs_to_download()
         if blobs_to_download:
-            blobs_without_sources = self._blobs_without_sources()
-            if not blobs_without_sources:
-                blob_hash = blobs_to_download[0].blob_hash
-            else:
-                blob_hash = blobs_without_sources[0].blob_hash
-            r = blob_hash
+            without_sources = (
+                b for b in blobs_to_download if not self._hash_available(b.blob_hash)
+            )
+            r = next(without_sources, blobs_to_download[0]).blob_hash
         log.debug("Blob requester peer search response: %s", str(r))
         return defer.succeed(r)
 
@@ -166,25 +166,20 @@ class BlobRequester(object):
         return [p for p in self._peers.iterkeys() if not self._should_send_request_to(p)]
 
     def _hash_available(self, blob_hash):
-        for peer in self._available_blobs:
-            if blob_hash in self._available_blobs[peer]:
-                return True
-        return False
+        # the scheduler counts the peers that have said they have each blob
+        return self._scheduler.count_sources(blob_hash) > 0
 
     def _hash_available_on(self, blob_hash, peer):
         if blob_hash in self._available_blobs[peer]:
             return True
         return False
 
-    def _blobs_to_download(self):
-        needed_blobs = self._download_manager.needed_blobs()
-        return sorted(needed_blobs, key=lambda b: b.is_downloading())
+    def prioritize_blobs(self, blob_hashes):
+        """Download these blobs before the others, in the given order"""
+        self._scheduler.prioritize_blobs(blob_hashes)
 
-    def _blobs_without_sources(self):
-        return [
-            b for b in self._download_manager.needed_blobs()
-            if not self._hash_available(b.blob_hash)
-        ]
+    def _blobs_to_download(self):
+        return self._download_manager.needed_blobs()
 
     def _price_settled(self, protocol):
         if protocol in self._protocol_prices:
@@ -324,11 +319,12 @@ class AvailabilityRequest(RequestHelper):
             b.blob_hash for b in self.requestor._blobs_to_download()
             if not self.is_available(b)
         ]
-        # sort them so that the peer will be asked first for blobs it
-        # hasn't said it doesn't have
+        # sort them so that the peer will be asked first for the prioritized blobs, and then
+        # for blobs it hasn't said it doesn't have
         sorted_needed = sorted(
             all_needed,
-            key=lambda b: b in self.unavailable_blobs
+            key=lambda b: (not self.requestor._scheduler.is_prioritized(b),
+                           b in self.unavailable_blobs)
         )
         return sorted_needed[:limit]
 
@@ -366,6 +362,7 @@ class AvailabilityRequest(RequestHelper):
     def process_available_blob_hash(self, blob_hash, request):
         log.debug("The server has indicated it has the following blob available: %s", blob_hash)
         self.available_blobs.append(blob_hash)
+        self.requestor._scheduler.blob_available(blob_hash, self.peer)
         self.remove_from_unavailable_blobs(blob_hash)
         request.request_dict['requested_blobs'].remove(blob_hash)
 
@@ -438,6 +435,19 @@ class DownloadRequest(RequestHelper):
     def make_request_and_handle_response(self):
         request = self._get_request()
         self._handle_download_request(request)
+        self._add_pipelined_requests()
+
+    def _add_pipelined_requests(self):
+        # peers that support pipelined requests are asked for the next blobs now,
+        # so they can send them right after this one without waiting for another request
+        while self.protocol.can_add_blob_request():
+            blob_details = self.find_blob(self.get_available_blobs())
+            if blob_details is None:
+                break
+            try:
+                self._handle_download_request(self._make_request(blob_details))
+            except InsufficientFundsError:
+                break
 
     def _get_request(self):
         blob_details = self.get_blob_details()
@@ -455,10 +465,8 @@ class DownloadRequest(RequestHelper):
         return self.find_blob(to_download)
 
     def get_available_blobs(self):
-        available_blobs = [
-            b for b in self.requestor._blobs_to_download()
-            if self.requestor._hash_available_on(b.blob_hash, self.peer)
-        ]
+        available_blobs = self.requestor._scheduler.blobs_for_peer(
+            self.peer, self.requestor._blobs_to_download(), set(self.available_blobs))
         log.debug('available blobs: %s', available_blobs)
         return available_blobs
 
@@ -468,6 +476,10 @@ class DownloadRequest(RequestHelper):
             if blob.get_is_verified():
                 log.debug('Skipping blob %s as its already validated', blob)
                 continue
+            if self.peer in blob.writers:
+                log.debug('Skipping blob %s as it is already being downloaded from %s', blob,
+                          self.peer)
+                continue
             writer, d = blob.open_for_writing(self.peer)
             if d is not None:
                 return BlobDownloadDetails(blob, d, writer.write, writer.close, self.peer)
@@ -0,0 +1,77 @@
+import logging
+from collections import defaultdict
+
+
+log = logging.getLogger(__name__)
+
+
+class BlobScheduler(object):
+    """
+    Chooses which of the needed blobs of a stream to request from each peer
+
+    Each connection is given a blob that isn't already being downloaded. The few blobs right
+    after the stream position come first so the stream can be read while it downloads, then
+    the blobs known to be on the fewest peers, so the rare blobs are fetched (and can be
+    seeded) before their sources go away. Blobs already being downloaded from another peer
+    are only handed out again in the endgame, when every blob the peer has is being
+    downloaded and only a few are left, so one slow peer can't hold up the end of a stream.
+
+    Blobs that are prioritized, such as the blobs of a byte range that is being streamed, come
+    before all of the others.
+    """
+
+    READ_AHEAD_BLOBS = 4
+    ENDGAME_BLOBS = 4
+    MAX_ENDGAME_DOWNLOADS = 2
+
+    def __init__(self):
+        self._sources = defaultdict(set)  # {blob_hash: set(Peer)}
+        self._priorities = {}  # {blob_hash: position in the prioritized blobs}
+
+    def blob_available(self, blob_hash, peer):
+        self._sources[blob_hash].add(peer)
+
+    def count_sources(self, blob_hash):
+        if blob_hash not in self._sources:
+            return 0
+        return len(self._sources[blob_hash])
+
+    def prioritize_blobs(self, blob_hashes):
+        """Request these blobs before any other, in the given order, replacing earlier ones"""
+        self._priorities = {blob_hash: i for i, blob_hash in enumerate(blob_hashes)}
+
+    def is_prioritized(self, blob_hash):
+        return blob_hash in self._priorities
+
+    def blobs_for_peer(self, peer, needed_blobs, available_hashes):
+        """
+        Order the blobs to request from a peer, best first
+
+        :param peer: the Peer the blobs would be requested from
+        :param needed_blobs: the blobs still needed, in stream order
+        :param available_hashes: set of the blob hashes the peer has said it has
+        :return: list of blobs, empty if nothing should be requested from the peer
+        """
+        idle = []
+        downloading = []
+        for i, blob in enumerate(needed_blobs):
+            if blob.blob_hash not in available_hashes or peer in blob.writers:
+                continue
+            if blob.writers:
+                downloading.append((len(blob.writers), i, blob))
+            elif blob.blob_hash in self._priorities:
+                idle.append(((-1, self._priorities[blob.blob_hash]), blob))
+            elif i < self.READ_AHEAD_BLOBS:
+                idle.append(((0, i), blob))
+            else:
+                idle.append(((1, self.count_sources(blob.blob_hash), i), blob))
+        if idle:
+            return [blob for _, blob in sorted(idle)]
+        if len(needed_blobs) > self.ENDGAME_BLOBS:
+            return []
+        endgame = [blob for writers, _, blob in sorted(downloading)
+                   if writers < self.MAX_ENDGAME_DOWNLOADS]
+        if endgame:
+            log.debug("Endgame, requesting %i blobs that are already downloading from %s",
+                      len(endgame), peer)
+        return endgame
@@ -1,5 +1,6 @@
 import json
 import logging
+from collections import deque
 from decimal import Decimal
 from twisted.internet import error, defer
 from twisted.internet.protocol import Protocol, ClientFactory
@@ -24,9 +25,18 @@ def encode_decimal(obj):
 
 
 class ClientProtocol(Protocol, TimeoutMixin):
+    """
+    Sends requests to a peer and hands the responses back to the request creators
+
+    If the peer answers the first request with the pipelined_requests field, up to that many
+    blob requests can be outstanding at once. Each one is sent as its own message, and the
+    peer answers them in order, each response followed by the blob data it describes.
+    """
     implements(IRequestSender, IRateLimited)
     ######### Protocol #########
     PROTOCOL_TIMEOUT = 30
+    PIPELINE_QUERY = 'pipelined_requests'
+    MAX_PIPELINED_REQUESTS = 4
 
     def connectionMade(self):
         log.debug("Connection made to %s", self.factory.peer)
@@ -37,34 +47,54 @@ class ClientProtocol(Protocol, TimeoutMixin):
         self._response_buff = ''
         self._downloading_blob = False
         self._blob_download_request = None
+        self._blob_bytes_remaining = None
+        self._blob_download_started = None
+        # when the request being timed to measure the peer's latency was sent
+        self._request_sent_at = None
         self._next_request = {}
+        self._next_blob_request = None
+        # blob requests to send as separate messages after the next request
+        self._next_pipelined_requests = []
+        # messages that have been sent and not answered, oldest first
+        # [({response identifier: deferred}, blob request or None)]
+        self._sent_requests = deque()
+        # answered messages that are still waiting on their blob or response callbacks
+        self._unfinished_requests = 0
+        # blob requests that have not finished or been canceled
+        self._blob_requests = []
+        # None until the peer has answered the first request
+        self._pipeline_size = None
+        self._asking_for_request = False
         self.connection_closed = False
         self.connection_closing = False
         # This needs to be set for TimeoutMixin
         self.callLater = utils.call_later
         self.peer.report_up()
+        # connections to the peers of a stream share the stream's part of the bandwidth
+        self._rate_limiter.register_protocol(self, self._connection_manager)
 
         self._ask_for_request()
 
     def dataReceived(self, data):
         log.debug("Received %d bytes from %s", len(data), self.peer)
         self.setTimeout(None)
-        self._rate_limiter.report_dl_bytes(len(data))
+        self._rate_limiter.report_dl_bytes(len(data), self)
 
-        if self._downloading_blob is True:
-            self._blob_download_request.write(data)
-        else:
+        while data:
+            if self._downloading_blob is True:
+                data = self._write_blob_data(data)
+                continue
             self._response_buff += data
-            if len(self._response_buff) > conf.settings['MAX_RESPONSE_INFO_SIZE']:
-                log.warning("Response is too large from %s. Size %s",
-                            self.peer, len(self._response_buff))
-                self.transport.loseConnection()
+            data = ''
             response, extra_data = self._get_valid_response(self._response_buff)
             if response is not None:
                 self._response_buff = ''
                 self._handle_response(response)
-                if self._downloading_blob is True and len(extra_data) != 0:
-                    self._blob_download_request.write(extra_data)
+                data = extra_data
+            elif len(self._response_buff) > conf.settings['MAX_RESPONSE_INFO_SIZE']:
+                log.warning("Response is too large from %s. Size %s",
+                            self.peer, len(self._response_buff))
+                self.transport.loseConnection()
 
     def timeoutConnection(self):
         log.info("Connection timed out to %s", self.peer)
@@ -75,15 +105,15 @@ class ClientProtocol(Protocol, TimeoutMixin):
         log.debug("Connection lost to %s: %s", self.peer, reason)
         self.setTimeout(None)
         self.connection_closed = True
+        self._rate_limiter.unregister_protocol(self)
         if reason.check(error.ConnectionDone):
             err = failure.Failure(ConnectionClosedBeforeResponseError())
         else:
             err = reason
-        for key, d in self._response_deferreds.items():
-            del self._response_deferreds[key]
+        for d in self._pop_response_deferreds():
             d.errback(err)
-        if self._blob_download_request is not None:
-            self._blob_download_request.cancel(err)
+        for blob_request in list(self._blob_requests):
+            blob_request.cancel(err)
         self.factory.connection_was_made_deferred.callback(True)
 
     ######### IRequestSender #########
@@ -98,62 +128,122 @@ class ClientProtocol(Protocol, TimeoutMixin):
         return d
 
     def add_blob_request(self, blob_request):
-        if self._blob_download_request is None:
+        if not self.can_add_blob_request():
+            raise ValueError("There is already a blob download request active")
+        if self._next_blob_request is None:
             d = self.add_request(blob_request)
-            self._blob_download_request = blob_request
-            blob_request.finished_deferred.addCallbacks(self._downloading_finished,
-                                                        self._handle_response_error)
-            return d
+            self._next_blob_request = blob_request
         else:
-            raise ValueError("There is already a blob download request active")
+            log.debug("Adding a pipelined request for %s. Request: %s", self.peer,
+                      blob_request.request_dict)
+            d = defer.Deferred()
+            self._next_pipelined_requests.append((blob_request, d))
+        self._blob_requests.append(blob_request)
+        blob_request.finished_deferred.addCallbacks(
+            self._downloading_finished, self._handle_response_error,
+            callbackArgs=(blob_request,), errbackArgs=(blob_request,))
+        return d
+
+    def can_add_blob_request(self):
+        """
+        Check whether another blob request can be added, more than one can be outstanding
+        if the peer supports pipelined requests
+        """
+        return len(self._blob_requests) < (self._pipeline_size or 1)
 
     def cancel_requests(self):
         self.connection_closing = True
         ds = []
         err = RequestCanceledError()
-        for key, d in self._response_deferreds.items():
-            del self._response_deferreds[key]
+        for d in self._pop_response_deferreds():
             d.errback(err)
             ds.append(d)
-        if self._blob_download_request is not None:
-            self._blob_download_request.cancel(err)
-            ds.append(self._blob_download_request.finished_deferred)
-            self._blob_download_request = None
+        for blob_request in list(self._blob_requests):
+            blob_request.cancel(err)
+            ds.append(blob_request.finished_deferred)
+        self._blob_download_request = None
         self._downloading_blob = False
         return defer.DeferredList(ds)
 
     ######### Internal request handling #########
 
+    def _pop_response_deferreds(self):
+        response_deferreds = self._response_deferreds.values()
+        self._response_deferreds = {}
+        while self._sent_requests:
+            response_deferreds.extend(self._sent_requests.popleft()[0].values())
+        for blob_request, d in self._next_pipelined_requests:
+            response_deferreds.append(d)
+        self._next_pipelined_requests = []
+        return response_deferreds
+
     def _handle_request_error(self, err):
         log.error(
             "An unexpected error occurred creating or sending a request to %s. Error message: %s",
             self.peer, err.getTraceback())
         self.transport.loseConnection()
 
+    def _requests_in_flight(self):
+        return len(self._sent_requests) + self._unfinished_requests
+
+    def _can_pipeline_request(self):
+        # only blob requests are pipelined, other requests may depend on the responses
+        # to the requests before them
+        return (
+            self._pipeline_size > 1 and
+            self._requests_in_flight() < self._pipeline_size and
+            self.can_add_blob_request() and
+            all(response_deferreds.keys() == ['incoming_blob']
+                for response_deferreds, _ in self._sent_requests)
+        )
+
     def _ask_for_request(self):
         if self.connection_closed is True or self.connection_closing is True:
             return
+        if self._asking_for_request:
+            return
+        if self._requests_in_flight() and not self._can_pipeline_request():
+            return
 
         def send_request_or_close(do_request):
-            if do_request is True:
-                request_msg, self._next_request = self._next_request, {}
-                self._send_request_message(request_msg)
+            self._asking_for_request = False
+            if self.connection_closed is True or self.connection_closing is True:
+                return
+            if do_request is True and (self._next_request or not self._requests_in_flight()):
+                self._send_request_message()
+            elif self._requests_in_flight():
+                # ask again once the outstanding requests have been answered
+                self._next_request, self._response_deferreds = {}, {}
             else:
                 # The connection manager has indicated that this connection should be terminated
                 log.debug("Closing the connection to %s due to having no further requests to send",
                           self.peer)
                 self.peer.report_success()
                 self.transport.loseConnection()
+
+        self._asking_for_request = True
         d = self._connection_manager.get_next_request(self.peer, self)
         d.addCallback(send_request_or_close)
         d.addErrback(self._handle_request_error)
 
-    def _send_request_message(self, request_msg):
+    def _send_request_message(self):
+        request_msg, self._next_request = self._next_request, {}
+        if not self._requests_in_flight():
+            # the response will only be delayed by the peer, not by other requests
+            self._request_sent_at = utils.now()
+            if self._pipeline_size is None:
+                request_msg[self.PIPELINE_QUERY] = self.MAX_PIPELINED_REQUESTS
+        self._sent_requests.append((self._response_deferreds, self._next_blob_request))
+        self._response_deferreds, self._next_blob_request = {}, None
+        messages = [request_msg]
+        for blob_request, d in self._next_pipelined_requests:
+            self._sent_requests.append(({blob_request.response_identifier: d}, blob_request))
+            messages.append(blob_request.request_dict)
+        self._next_pipelined_requests = []
         self.setTimeout(self.PROTOCOL_TIMEOUT)
         # TODO: compare this message to the last one. If they're the same,
         # TODO: incrementally delay this message.
-        m = json.dumps(request_msg, default=encode_decimal)
-        self.transport.write(m)
+        self.transport.write(''.join(json.dumps(m, default=encode_decimal) for m in messages))
 
     def _get_valid_response(self, response_msg):
         extra_data = None
@@ -174,7 +264,9 @@ class ClientProtocol(Protocol, TimeoutMixin):
                 break
         return response, extra_data
 
-    def _handle_response_error(self, err):
+    def _handle_response_error(self, err, blob_request=None):
+        if blob_request in self._blob_requests:
+            self._blob_requests.remove(blob_request)
         # If an error gets to this point, log it and kill the connection.
         if err.check(DownloadCanceledError, RequestCanceledError, error.ConnectionAborted):
             # TODO: (wish-list) it seems silly to close the connection over this, and it shouldn't
@@ -182,7 +274,7 @@ class ClientProtocol(Protocol, TimeoutMixin):
             # TODO: of telling the server it wants the download to stop. It would be great if the
             # TODO: protocol had such a mechanism.
             log.info("Closing the connection to %s because the download of blob %s was canceled",
-                     self.peer, self._blob_download_request.blob)
+                     self.peer, blob_request.blob if blob_request is not None else None)
             result = None
         elif not err.check(MisbehavingPeerError, ConnectionClosedBeforeResponseError):
             log.warning("The connection to %s is closing due to: %s", self.peer, err)
@@ -196,30 +288,44 @@ class ClientProtocol(Protocol, TimeoutMixin):
         return result
 
     def _handle_response(self, response):
+        if not self._sent_requests:
+            log.warning("Got an unexpected response from %s", self.peer)
+            self.transport.loseConnection()
+            return
+        response_deferreds, blob_request = self._sent_requests.popleft()
+        self._unfinished_requests += 1
+        if self._request_sent_at is not None:
+            self.peer.report_latency((utils.now() - self._request_sent_at).total_seconds())
+            self._request_sent_at = None
+        if self._pipeline_size is None:
+            self._pipeline_size = 1
+            if isinstance(response.get(self.PIPELINE_QUERY), int):
+                self._pipeline_size = max(1, min(self.MAX_PIPELINED_REQUESTS,
+                                                 response[self.PIPELINE_QUERY]))
+                log.debug("%s accepts %i pipelined requests", self.peer, self._pipeline_size)
         ds = []
         log.debug(
             "Handling a response from %s. Expected responses: %s. Actual responses: %s",
-            self.peer, self._response_deferreds.keys(), response.keys())
+            self.peer, response_deferreds.keys(), response.keys())
         for key, val in response.items():
-            if key in self._response_deferreds:
-                d = self._response_deferreds.pop(key)
+            if key in response_deferreds:
+                d = response_deferreds.pop(key)
                 d.callback({key: val})
                 ds.append(d)
-        for k, d in self._response_deferreds.items():
-            del self._response_deferreds[k]
+        for k, d in response_deferreds.items():
+            del response_deferreds[k]
             d.errback(failure.Failure(NoResponseError()))
             ds.append(d)
 
-        if self._blob_download_request is not None:
-            self._downloading_blob = True
-            d = self._blob_download_request.finished_deferred
-            d.addErrback(self._handle_response_error)
-            ds.append(d)
+        if blob_request is not None:
+            self._start_blob_download(blob_request, response)
+            ds.append(blob_request.finished_deferred)
 
         # TODO: are we sure we want to consume errors here
         dl = defer.DeferredList(ds, consumeErrors=True)
 
         def get_next_request(results):
+            self._unfinished_requests -= 1
             failed = False
             for success, result in results:
                 if success is False:
@@ -238,11 +344,62 @@ class ClientProtocol(Protocol, TimeoutMixin):
                 self.transport.loseConnection()
 
         dl.addCallback(get_next_request)
-
-    def _downloading_finished(self, arg):
+        if self._pipeline_size > 1 and self._requests_in_flight():
+            # keep the pipeline full while the blob for this response downloads
+            self._ask_for_request()
+
+    def _start_blob_download(self, blob_request, response):
+        self._blob_download_started = utils.now()
+        if self._pipeline_size == 1:
+            # the peer doesn't send anything else until the blob has been downloaded, so
+            # everything it sends is written to the blob
+            if blob_request in self._blob_requests:
+                self._blob_download_request = blob_request
+                self._downloading_blob = True
+            return
+        incoming_blob = response.get(blob_request.response_identifier)
+        length = incoming_blob.get('length') if isinstance(incoming_blob, dict) else None
+        if not isinstance(length, (int, long)) or length < 0:
+            # no blob data is coming, the next response follows immediately
+            if blob_request in self._blob_requests:
+                blob_request.cancel(DownloadCanceledError())
+            return
+        self._blob_download_request = blob_request
+        self._blob_bytes_remaining = length
+        self._downloading_blob = length > 0
+
+    def _write_blob_data(self, data):
+        """
+        Write incoming data to the blob being downloaded
+
+        Returns:
+            the data after the end of the blob
+        """
+        if self._blob_bytes_remaining is None:
+            blob_data, extra_data = data, ''
+        else:
+            blob_data = data[:self._blob_bytes_remaining]
+            extra_data = data[self._blob_bytes_remaining:]
+            self._blob_bytes_remaining -= len(blob_data)
+            if self._blob_bytes_remaining == 0:
+                self._downloading_blob = False
+        # the blob request is gone if its download was canceled, in which case the data it
+        # was sent still has to be read past
+        if self._blob_download_request in self._blob_requests:
+            self._blob_download_request.write(blob_data)
+        return extra_data
+
+    def _downloading_finished(self, arg, blob_request):
         log.debug("The blob has finished downloading from %s", self.peer)
-        self._blob_download_request = None
-        self._downloading_blob = False
+        if blob_request in self._blob_requests:
+            self._blob_requests.remove(blob_request)
+        if self._blob_download_request is blob_request:
+            self.peer.report_blob_downloaded(
+                blob_request.blob.length,
+                (utils.now() - self._blob_download_started).total_seconds())
+        if self._blob_download_request is blob_request and self._blob_bytes_remaining is None:
+            self._blob_download_request = None
+            self._downloading_blob = False
         return arg
 
     ######### IRateLimited #########
@@ -4,6 +4,7 @@ from twisted.internet import defer, reactor
 from zope.interface import implements
 from lbrynet import interfaces
 from lbrynet import conf
+from lbrynet.blob.blob_file import MAX_BLOB_SIZE
 from lbrynet.core.client.ClientProtocol import ClientProtocolFactory
 from lbrynet.core.Error import InsufficientFundsError
 from lbrynet.core import utils
@@ -22,6 +23,17 @@ class ConnectionManager(object):
     implements(interfaces.IConnectionManager)
     MANAGE_CALL_INTERVAL_SEC = 5
     TCP_CONNECT_TIMEOUT = 15
+    # the number of connections starts at the max_connections_per_stream setting and is moved
+    # one at a time within these limits, for as long as doing so improves the stream bandwidth
+    MIN_CONNECTIONS_PER_STREAM = 2
+    MAX_CONNECTIONS_PER_STREAM = 20
+    # changes in bandwidth smaller than this fraction are treated as no change
+    BANDWIDTH_CHANGE = 0.1
+    # manage calls to wait after backing out a change before trying another one
+    CONNECTION_CHANGE_HOLD = 6
+    # a peer expected to send blobs this many times slower than the other connected peers
+    # is disconnected to make room for another one
+    SLOW_PEER_RATIO = 0.25
 
     def __init__(self, downloader, rate_limiter,
                  primary_request_creators, secondary_request_creators):
@@ -34,6 +46,12 @@ class ConnectionManager(object):
         self._primary_request_creators = primary_request_creators
         self._secondary_request_creators = secondary_request_creators
         self._peer_connections = {}  # {Peer: PeerConnectionHandler}
+        # blob bytes downloaded from each peer when the bandwidth was last measured
+        self._peer_bytes = {}  # {Peer: bytes}
+        self._bandwidth_measured_at = None
+        self._last_bandwidth = None
+        self._connection_step = 1
+        self._connection_change_hold = 0
         self._connections_closing = {}  # {Peer: deferred (fired when the connection is closed)}
         self._next_manage_call = None
         # a deferred that gets fired when a _manage call is set
@@ -150,6 +168,10 @@ class ConnectionManager(object):
     @defer.inlineCallbacks
     def manage(self, schedule_next_call=True):
         self._manage_deferred = defer.Deferred()
+        bandwidth = self._measure_bandwidth()
+        if bandwidth is not None:
+            self._adjust_max_connections(bandwidth)
+            self._close_slow_peer()
         if len(self._peer_connections) < self.max_connections_per_stream:
             log.debug("%s have %d connections, looking for %d",
                         self._get_log_name(), len(self._peer_connections),
@@ -162,9 +184,93 @@ class ConnectionManager(object):
         if not self.stopped and schedule_next_call:
             self._next_manage_call = utils.call_later(self.MANAGE_CALL_INTERVAL_SEC, self.manage)
 
+    def _measure_bandwidth(self):
+        """
+        Get the bytes/sec of blob data downloaded since the last call, None on the first call
+        """
+        now = utils.now()
+        downloaded = sum(peer.stats['blob_bytes_downloaded'] - num_bytes
+                         for peer, num_bytes in self._peer_bytes.iteritems())
+        self._peer_bytes = {peer: peer.stats['blob_bytes_downloaded']
+                            for peer in self._peer_connections}
+        last_measured_at, self._bandwidth_measured_at = self._bandwidth_measured_at, now
+        if last_measured_at is None:
+            return None
+        elapsed = (now - last_measured_at).total_seconds()
+        if elapsed <= 0:
+            return None
+        return downloaded / elapsed
+
+    def _adjust_max_connections(self, bandwidth):
+        last_bandwidth, self._last_bandwidth = self._last_bandwidth, bandwidth
+        if len(self._peer_connections) < self.max_connections_per_stream:
+            # there aren't enough peers to fill the connections we already allow
+            return
+        if self._connection_change_hold:
+            self._connection_change_hold -= 1
+            return
+        if last_bandwidth is None or bandwidth > last_bandwidth * (1 + self.BANDWIDTH_CHANGE):
+            # keep going the way that helped, or try more connections
+            step = self._connection_step or 1
+        elif bandwidth < last_bandwidth * (1 - self.BANDWIDTH_CHANGE):
+            # back out the last change if it made things worse, otherwise the peers have
+            # slowed down and more of them may help
+            step = -self._connection_step or 1
+            if self._connection_step:
+                self._connection_change_hold = self.CONNECTION_CHANGE_HOLD
+        elif self._connection_step == 1:
+            # the last connection didn't help
+            step = -1
+            self._connection_change_hold = self.CONNECTION_CHANGE_HOLD
+        else:
+            # fewer connections are as good as more
+            step = -1
+        max_connections = min(self.MAX_CONNECTIONS_PER_STREAM,
+                              max(self.MIN_CONNECTIONS_PER_STREAM,
+                                  self.max_connections_per_stream + step))
+        if max_connections == self.max_connections_per_stream:
+            self._connection_step = 0
+            return
+        self._connection_step = 0 if self._connection_change_hold else step
+        log.debug("%s Changing the connection limit from %i to %i, bandwidth %.0f bytes/sec",
+                  self._get_log_name(), self.max_connections_per_stream, max_connections,
+                  bandwidth)
+        self.max_connections_per_stream = max_connections
+
+    def _close_slow_peer(self):
+        rates = {}
+        for peer, connection_handler in self._peer_connections.iteritems():
+            rate = peer.expected_download_rate(MAX_BLOB_SIZE)
+            if rate is not None and connection_handler.factory.p is not None:
+                rates[peer] = rate
+        if len(rates) < 3:
+            return
+        slowest = min(rates, key=rates.get)
+        others = [rate for peer, rate in rates.iteritems() if peer is not slowest]
+        if rates[slowest] >= self.SLOW_PEER_RATIO * sum(others) / len(others):
+            return
+        log.info("%s Disconnecting from %s, it is much slower than the other peers",
+                 self._get_log_name(), slowest)
+        protocol = self._peer_connections[slowest].factory.p
+        d = protocol.cancel_requests()
+        d.addBoth(lambda _: self._peer_connections[slowest].connection.disconnect()
+                  if slowest in self._peer_connections else None)
+
     def return_shuffled_peers_not_connected_to(self, peers, new_conns_needed):
+        """
+        Choose the peers to connect to, peers that have been fast are chosen first, followed by
+        peers that haven't been downloaded from yet and then the peers that have been slow
+        """
         out = [peer for peer in peers if peer not in self._peer_connections]
         random.shuffle(out)
+        rates = [peer.expected_download_rate(MAX_BLOB_SIZE) for peer in out]
+        measured = [rate for rate in rates if rate is not None]
+        if measured:
+            # new peers are ranked as an average measured peer, ahead of peers as fast as that
+            default_rate = sum(measured) / len(measured)
+            order = sorted(range(len(out)), reverse=True, key=lambda i: (
+                default_rate if rates[i] is None else rates[i], rates[i] is None))
+            out = [out[i] for i in order]
         return out[0:new_conns_needed]
 
     @defer.inlineCallbacks
@@ -207,6 +313,7 @@ class ConnectionManager(object):
             return
 
         log.debug("%s Trying to connect to %s", self._get_log_name(), peer)
+        self._peer_bytes.setdefault(peer, peer.stats['blob_bytes_downloaded'])
         factory = ClientProtocolFactory(peer, self.rate_limiter, self)
         factory.connection_was_made_deferred.addCallback(
                 lambda c_was_made: self._peer_disconnected(c_was_made, peer))
@@ -1,5 +1,6 @@
 import binascii
 import logging
+from collections import OrderedDict
 
 from zope.interface import implements
 from twisted.internet import defer, reactor
@@ -11,22 +12,44 @@ log = logging.getLogger(__name__)
 
 
 class DHTPeerFinder(object):
-    """This class finds peers which have announced to the DHT that they have certain blobs"""
+    """
+    This class finds peers which have announced to the DHT that they have certain blobs
+
+    The peers found for a blob are cached, and concurrent searches for the same blob share a
+    single DHT lookup. Cached results that are used shortly before they expire are refreshed
+    in the background, so frequently requested blobs don't wait on a lookup.
+    """
     implements(IPeerFinder)
 
-    def __init__(self, dht_node, peer_manager):
+    # seconds to cache the peers found for a blob
+    PEER_CACHE_TTL = 300
+    # seconds to cache a search that found no peers, so new announcements are picked up sooner
+    EMPTY_PEER_CACHE_TTL = 30
+    # seconds before a cached search expires that using it starts a background refresh
+    PEER_CACHE_REFRESH = 60
+    # maximum number of blobs to cache peers for
+    PEER_CACHE_SIZE = 10000
+
+    def __init__(self, dht_node, peer_manager, clock=None):
         """
         dht_node - an instance of dht.Node class
         peer_manager - an instance of PeerManager class
         """
+        if clock is None:
+            clock = reactor
         self.dht_node = dht_node
         self.peer_manager = peer_manager
+        self.clock = clock
         self.peers = []
         self.next_manage_call = None
+        # {<blob hash>: (<expiration time>, [(<host>, <port>)])}, least recently used first
+        self._peer_cache = OrderedDict()
+        # {<blob hash>: [<deferreds waiting for the search>]}
+        self._searches = {}
 
     def run_manage_loop(self):
         self._manage_peers()
-        self.next_manage_call = reactor.callLater(60, self.run_manage_loop)
+        self.next_manage_call = self.clock.callLater(60, self.run_manage_loop)
 
     def stop(self):
         log.info("Stopping DHT peer finder.")
@@ -56,22 +79,7 @@ class DHTPeerFinder(object):
         Returns:
         list of peers for the blob
         """
-        def _trigger_timeout():
-            if not finished_deferred.called:
-                log.debug("Peer search for %s timed out", short_hash(blob_hash))
-                finished_deferred.cancel()
-
-        bin_hash = binascii.unhexlify(blob_hash)
-        finished_deferred = self.dht_node.getPeersForBlob(bin_hash)
-
-        if timeout is not None:
-            reactor.callLater(timeout, _trigger_timeout)
-
-        try:
-            peer_list = yield finished_deferred
-        except defer.CancelledError:
-            peer_list = []
-
+        peer_list = yield self._get_peer_list(blob_hash, timeout)
         peers = set(peer_list)
         good_peers = []
         for host, port in peers:
@@ -83,5 +91,71 @@ class DHTPeerFinder(object):
 
         defer.returnValue(good_peers)
 
+    def _get_peer_list(self, blob_hash, timeout):
+        now = self.clock.seconds()
+        cached = self._peer_cache.pop(blob_hash, None)
+        if cached is not None and cached[0] > now:
+            self._peer_cache[blob_hash] = cached
+            if cached[0] - now <= self.PEER_CACHE_REFRESH:
+                self._search(blob_hash)
+            return defer.succeed(cached[1])
+
+        finished_deferred = defer.Deferred()
+        self._search(blob_hash, finished_deferred)
+
+        def _trigger_timeout():
+            if not finished_deferred.called:
+                log.debug("Peer search for %s timed out", short_hash(blob_hash))
+                # the search keeps running so that its result is cached
+                self._searches[blob_hash].remove(finished_deferred)
+                finished_deferred.callback([])
+
+        if timeout is not None:
+            timeout_call = self.clock.callLater(timeout, _trigger_timeout)
+            finished_deferred.addBoth(self._cancel_timeout, timeout_call)
+        return finished_deferred
+
+    @staticmethod
+    def _cancel_timeout(result, timeout_call):
+        if timeout_call.active():
+            timeout_call.cancel()
+        return result
+
+    def _search(self, blob_hash, finished_deferred=None):
+        """
+        Start a DHT search for a blob if one isn't already running
+
+        blob_hash (str): blob hash to look for
+        finished_deferred (Deferred): deferred to fire with the peers found by the search
+        """
+        if blob_hash in self._searches:
+            if finished_deferred is not None:
+                self._searches[blob_hash].append(finished_deferred)
+            return
+        waiting = self._searches[blob_hash] = []
+        if finished_deferred is not None:
+            waiting.append(finished_deferred)
+
+        def _got_peers(peer_list):
+            ttl = self.PEER_CACHE_TTL if peer_list else self.EMPTY_PEER_CACHE_TTL
+            self._peer_cache.pop(blob_hash, None)
+            self._peer_cache[blob_hash] = (self.clock.seconds() + ttl, peer_list)
+            while len(self._peer_cache) > self.PEER_CACHE_SIZE:
+                self._peer_cache.popitem(last=False)
+            del self._searches[blob_hash]
+            for d in waiting:
+                d.callback(peer_list)
+
+        def _search_failed(err):
+            del self._searches[blob_hash]
+            if not waiting:
+                log.warning("Failed to refresh peers for %s: %s", short_hash(blob_hash),
+                            err.getErrorMessage())
+            for d in waiting:
+                d.errback(err)
+
+        d = self.dht_node.getPeersForBlob(binascii.unhexlify(blob_hash))
+        d.addCallbacks(_got_peers, _search_failed)
+
     def get_most_popular_hashes(self, num_to_return):
         return self.dht_node.get_most_popular_hashes(num_to_return)
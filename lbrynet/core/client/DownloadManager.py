@@ -18,6 +18,9 @@ class DownloadManager(object):
         self.connection_manager = None
         self.blobs = {}
         self.blob_infos = {}
+        self.blob_nums = {}  # {blob hash: blob num}
+        # called with the blob and its number when a blob has been downloaded
+        self.progress_listeners = []
 
     ######### IDownloadManager #########
 
@@ -36,16 +39,27 @@ class DownloadManager(object):
 
     @defer.inlineCallbacks
     def stop_downloading(self):
+        for blob in self.blobs.itervalues():
+            blob.remove_verified_callback(self._blob_verified)
         yield self.progress_manager.stop()
         yield self.connection_manager.stop()
         defer.returnValue(True)
 
+    def add_progress_listener(self, listener):
+        self.progress_listeners.append(listener)
+
+    def remove_progress_listener(self, listener):
+        if listener in self.progress_listeners:
+            self.progress_listeners.remove(listener)
+
     def add_blobs_to_download(self, blob_infos):
 
         log.debug("Adding %s blobs to blobs", len(blob_infos))
 
         def add_blob_to_list(blob, blob_num):
             self.blobs[blob_num] = blob
+            self.blob_nums[blob.blob_hash] = blob_num
+            blob.add_verified_callback(self._blob_verified)
             log.debug(
                 "Added blob (hash: %s, number %s) to the list", blob.blob_hash, blob_num)
 
@@ -68,6 +82,14 @@ class DownloadManager(object):
         dl = defer.DeferredList(ds)
         return dl
 
+    def _blob_verified(self, blob):
+        blob_num = self.blob_nums.get(blob.blob_hash)
+        if blob_num is None or self.progress_manager is None:
+            return
+        self.progress_manager.blob_downloaded(blob, blob_num)
+        for listener in list(self.progress_listeners):
+            listener(blob, blob_num)
+
     def stream_position(self):
         return self.progress_manager.stream_position()
 
@@ -6,10 +6,9 @@ from lbrynet.core.client.BlobRequester import BlobRequester
 from lbrynet.core.client.ConnectionManager import ConnectionManager
 from lbrynet.core.client.DownloadManager import DownloadManager
 from lbrynet.core.Error import InvalidBlobHashError, DownloadSDTimeout
-from lbrynet.core.utils import is_valid_blobhash, safe_start_looping_call, safe_stop_looping_call
+from lbrynet.core.utils import is_valid_blobhash
 from twisted.python.failure import Failure
 from twisted.internet import defer
-from twisted.internet.task import LoopingCall
 
 log = logging.getLogger(__name__)
 
@@ -32,35 +31,53 @@ class SingleBlobMetadataHandler(object):
 
 
 class SingleProgressManager(object):
-    def __init__(self, download_manager, finished_callback, timeout_callback, timeout):
+    def __init__(self, download_manager, finished_callback, timeout_callback, timeout, clock=None):
+        if clock is None:
+            from twisted.internet import reactor
+            clock = reactor
+        self.clock = clock
         self.finished_callback = finished_callback
         self.timeout_callback = timeout_callback
         self.download_manager = download_manager
 
         self.timeout = timeout
-        self.timeout_counter = 0
-        self.checker = LoopingCall(self._check_if_finished)
+        self._timeout_call = None
+        self._check_call = None
 
     def start(self):
-        safe_start_looping_call(self.checker, 1)
+        if self.timeout is not None:
+            self._timeout_call = self.clock.callLater(self.timeout, self._timed_out)
+        # the blob may already have been downloaded, otherwise we wait for the download
+        # manager to tell us it has been
+        self._check_call = self.clock.callLater(0, self._check_if_finished)
         return defer.succeed(True)
 
     def stop(self):
-        safe_stop_looping_call(self.checker)
+        self._cancel_calls()
         return defer.succeed(True)
 
+    def blob_downloaded(self, blob, blob_num):
+        self._check_if_finished()
+
+    def _cancel_calls(self):
+        for call in (self._timeout_call, self._check_call):
+            if call is not None and call.active():
+                call.cancel()
+        self._timeout_call = self._check_call = None
+
     def _check_if_finished(self):
+        self._check_call = None
         if self.stream_position() == 1:
             blob_downloaded = self.download_manager.blobs[0]
             log.debug("The blob %s has been downloaded. Calling the finished callback",
                         str(blob_downloaded))
-            safe_stop_looping_call(self.checker)
+            self._cancel_calls()
             self.finished_callback(blob_downloaded)
-        elif self.timeout is not None:
-            self.timeout_counter += 1
-            if self.timeout_counter >= self.timeout:
-                safe_stop_looping_call(self.checker)
-                self.timeout_callback()
+
+    def _timed_out(self):
+        self._timeout_call = None
+        self._cancel_calls()
+        self.timeout_callback()
 
     def stream_position(self):
         blobs = self.download_manager.blobs
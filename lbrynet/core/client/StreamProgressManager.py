@@ -7,6 +7,45 @@ from zope.interface import implements
 log = logging.getLogger(__name__)
 
 
+class BlobNumSet(object):
+    """
+    A set of blob numbers kept as a bit array, which also keeps its size and the lowest number
+    that isn't in it, so membership, size and the lowest missing number are constant time
+    (the lowest missing number is amortized over the numbers added)
+    """
+
+    def __init__(self):
+        self._bits = bytearray()
+        self._count = 0
+        self._lowest_missing = 0
+
+    def add(self, blob_num):
+        i, bit = blob_num >> 3, 1 << (blob_num & 7)
+        if i >= len(self._bits):
+            self._bits.extend(bytearray(i - len(self._bits) + 1))
+        if not self._bits[i] & bit:
+            self._bits[i] |= bit
+            self._count += 1
+            while self._lowest_missing in self:
+                self._lowest_missing += 1
+
+    def discard(self, blob_num):
+        if blob_num in self:
+            self._bits[blob_num >> 3] &= ~(1 << (blob_num & 7))
+            self._count -= 1
+            self._lowest_missing = min(self._lowest_missing, blob_num)
+
+    def lowest_missing(self):
+        return self._lowest_missing
+
+    def __contains__(self, blob_num):
+        i = blob_num >> 3
+        return i < len(self._bits) and bool(self._bits[i] & (1 << (blob_num & 7)))
+
+    def __len__(self):
+        return self._count
+
+
 class StreamProgressManager(object):
     implements(IProgressManager)
 
@@ -16,7 +55,7 @@ class StreamProgressManager(object):
         self.blob_manager = blob_manager
         self.delete_blob_after_finished = delete_blob_after_finished
         self.download_manager = download_manager
-        self.provided_blob_nums = []
+        self.provided_blob_nums = BlobNumSet()
         self.last_blob_outputted = -1
         self.stopped = True
         self._next_try_to_output_call = None
@@ -29,6 +68,8 @@ class StreamProgressManager(object):
         from twisted.internet import reactor
 
         self.stopped = False
+        # output the blobs that are already downloaded, the rest are output as the download
+        # manager tells us they have been downloaded
         self._next_try_to_output_call = reactor.callLater(0, self._try_to_output)
         return defer.succeed(True)
 
@@ -49,10 +90,7 @@ class StreamProgressManager(object):
         self.finished_callback(True)
 
     def _try_to_output(self):
-
-        from twisted.internet import reactor
-
-        self._next_try_to_output_call = reactor.callLater(1, self._try_to_output)
+        self._next_try_to_output_call = None
         if self.outputting_d is None:
             self._output_loop()
 
@@ -80,43 +118,86 @@ class StreamProgressManager(object):
 
 
 class FullStreamProgressManager(StreamProgressManager):
+    """
+    Outputs the blobs of a stream in order as they are downloaded
+
+    The blobs that have been verified or provided to the blob handler are tracked incrementally
+    as the download manager adds blobs and reports them downloaded, so the stream position and
+    whether a blob is needed are answered in constant time, and the list of needed blobs is
+    only rebuilt after it has changed.
+    """
+
     def __init__(self, finished_callback, blob_manager,
                  download_manager, delete_blob_after_finished=False):
         StreamProgressManager.__init__(self, finished_callback, blob_manager, download_manager,
                                        delete_blob_after_finished)
         self.outputting_d = None
+        self._known_blob_nums = BlobNumSet()  # blob nums of the download manager's blobs
+        self._done_blob_nums = BlobNumSet()  # verified or provided
+        self._needed_nums = None  # blob nums of the needed blobs, None if blobs were added
+        self._needed = None  # the needed blobs, None if they have changed
 
     ######### IProgressManager #########
 
-    def _done(self, i, blobs):
-        """Return true if `i` is a blob number we don't have"""
-        return (
-            i not in blobs or
-            (
-                not blobs[i].get_is_verified() and
-                i not in self.provided_blob_nums
-            )
-        )
+    def blob_downloaded(self, blob, blob_num):
+        self._blob_done(blob_num)
+        StreamProgressManager.blob_downloaded(self, blob, blob_num)
 
     def stream_position(self):
-        blobs = self.download_manager.blobs
-        if not blobs:
-            return 0
-        else:
-            for i in xrange(max(blobs.iterkeys())):
-                if self._done(i, blobs):
-                    return i
-            return max(blobs.iterkeys()) + 1
+        self._update_known_blobs()
+        return self._done_blob_nums.lowest_missing()
 
     def needed_blobs(self):
-        blobs = self.download_manager.blobs
-        return [
-            b for n, b in blobs.iteritems()
-            if not b.get_is_verified() and not n in self.provided_blob_nums
-        ]
+        """
+        Get the blobs that haven't been verified or provided yet, in stream order
+
+        The same list is returned until a blob is verified, provided or added, so it must not be
+        modified
+        """
+        self._update_known_blobs()
+        if self._needed is None:
+            blobs = self.download_manager.blobs
+            if self._needed_nums is None:
+                self._needed_nums = sorted(blobs)
+            needed_nums = []
+            for blob_num in self._needed_nums:
+                if blob_num in self._done_blob_nums:
+                    continue
+                if blobs[blob_num].get_is_verified():
+                    # verified without the download manager telling us
+                    self._done_blob_nums.add(blob_num)
+                    continue
+                needed_nums.append(blob_num)
+            self._needed_nums = needed_nums
+            self._needed = [blobs[n] for n in needed_nums]
+        return self._needed
+
+    def is_blob_needed(self, blob_num):
+        self._update_known_blobs()
+        return blob_num in self._known_blob_nums and blob_num not in self._done_blob_nums
+
+    def num_needed_blobs(self):
+        self._update_known_blobs()
+        return len(self._known_blob_nums) - len(self._done_blob_nums)
 
     ######### internal #########
 
+    def _update_known_blobs(self):
+        blobs = self.download_manager.blobs
+        if len(blobs) == len(self._known_blob_nums):
+            return
+        for blob_num, blob in blobs.iteritems():
+            if blob_num not in self._known_blob_nums:
+                self._known_blob_nums.add(blob_num)
+                if blob.get_is_verified():
+                    self._done_blob_nums.add(blob_num)
+        self._needed_nums = self._needed = None
+
+    def _blob_done(self, blob_num):
+        if blob_num not in self._done_blob_nums:
+            self._done_blob_nums.add(blob_num)
+            self._needed = None
+
     def _output_loop(self):
 
         from twisted.internet import reactor
@@ -147,7 +228,8 @@ class FullStreamProgressManager(StreamProgressManager):
 
         if current_blob_num in blobs and blobs[current_blob_num].get_is_verified():
             log.debug("Outputting blob %s", str(self.last_blob_outputted + 1))
-            self.provided_blob_nums.append(self.last_blob_outputted + 1)
+            self.provided_blob_nums.add(current_blob_num)
+            self._blob_done(current_blob_num)
             d = self.download_manager.handle_blob(self.last_blob_outputted + 1)
             d.addCallback(lambda _: finished_outputting_blob())
             d.addCallback(lambda _: self._finished_with_blob(current_blob_num))
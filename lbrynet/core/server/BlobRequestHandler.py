@@ -1,4 +1,6 @@
 import logging
+import mmap
+import os
 
 from twisted.internet import defer
 from twisted.protocols.basic import FileSender
@@ -6,12 +8,60 @@ from twisted.python.failure import Failure
 from zope.interface import implements
 
 from lbrynet import analytics
+from lbrynet import conf
 from lbrynet.core.Offer import Offer
 from lbrynet.interfaces import IQueryHandlerFactory, IQueryHandler, IBlobSender
 
 log = logging.getLogger(__name__)
 
 
+class MappedFileSender(FileSender):
+    """
+    A FileSender that slices chunks from a read only memory map of the file instead of
+    reading them through the file object, the mapping is shared through the page cache
+    by every upload of the same blob
+    """
+
+    CHUNK_SIZE = 2 ** 16
+
+    mapped = None
+    offset = 0
+
+    def beginFileTransfer(self, file, consumer, transform=None):
+        if os.fstat(file.fileno()).st_size:
+            # mapping an empty file is not allowed
+            self.mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.offset = 0
+        return FileSender.beginFileTransfer(self, file, consumer, transform)
+
+    def resumeProducing(self):
+        chunk = ''
+        if self.mapped is not None:
+            chunk = self.mapped[self.offset:self.offset + self.CHUNK_SIZE]
+            self.offset += len(chunk)
+        if not chunk:
+            self._close_mapping()
+            self.consumer.unregisterProducer()
+            if self.deferred:
+                self.deferred.callback(self.lastSent)
+                self.deferred = None
+            return
+        if self.transform:
+            chunk = self.transform(chunk)
+        self.consumer.write(chunk)
+        self.lastSent = chunk[-1:]
+
+    def stopProducing(self):
+        self._close_mapping()
+        FileSender.stopProducing(self)
+
+    def _close_mapping(self):
+        if self.mapped is not None:
+            self.mapped.close()
+            self.mapped = None
+        self.file = None
+
+
 class BlobRequestHandlerFactory(object):
     implements(IQueryHandlerFactory)
 
@@ -196,10 +246,18 @@ class BlobRequestHandler(object):
             return data
 
         def start_transfer():
-            self.file_sender = FileSender()
             log.debug("Starting the file upload")
             assert self.read_handle is not None, \
                 "self.read_handle was None when trying to start the transfer"
+            if hasattr(self.read_handle, 'fileno') and conf.settings['mmap_blob_uploads']:
+                self.file_sender = MappedFileSender()
+                try:
+                    return self.file_sender.beginFileTransfer(self.read_handle, consumer,
+                                                              count_bytes)
+                except (EnvironmentError, ValueError, mmap.error) as err:
+                    log.warning("Failed to map %s for uploading, falling back to reading it: %s",
+                                self.currently_uploading, err)
+            self.file_sender = FileSender()
             d = self.file_sender.beginFileTransfer(self.read_handle, consumer, count_bytes)
             return d
 
@@ -1,26 +1,52 @@
 import binascii
+import bisect
 import collections
 import logging
+import math
 import time
 
 from twisted.internet import defer
+from twisted.python import failure
 from lbrynet.core import utils
+from lbrynet.dht import constants
+from lbrynet.dht.distance import Distance
 
 log = logging.getLogger(__name__)
 
 
 class DHTHashAnnouncer(object):
     ANNOUNCE_CHECK_INTERVAL = 60
+    # number of concurrent node lookups to start with, this is adjusted as lookups complete
     CONCURRENT_ANNOUNCERS = 5
-
-    """This class announces to the DHT that this peer has certain blobs"""
+    MIN_CONCURRENT_ANNOUNCERS = 1
+    MAX_CONCURRENT_ANNOUNCERS = 50
+    # rate of node lookups that the number of concurrent lookups is sized for
+    TARGET_LOOKUPS_PER_SECOND = 2.0
+    # most hashes to announce using the contacts found by a single lookup
+    MAX_HASHES_PER_LOOKUP = 100
+
+    """
+    This class announces to the DHT that this peer has certain blobs
+
+    Queued hashes are kept sorted, so that after the nodes closest to one hash have been looked
+    up every other queued hash those nodes are also closest to can be announced to them without
+    another lookup. The number of lookups run at once is sized by Little's law from the
+    measured lookup time, so that slow lookups don't limit how many hashes get announced.
+    """
     def __init__(self, dht_node, peer_port):
         self.dht_node = dht_node
         self.peer_port = peer_port
         self.suppliers = []
         self.next_manage_call = None
+        # hashes in the order they should be looked up, hashes that have already been
+        # announced as part of another lookup are skipped when they are popped
         self.hash_queue = collections.deque()
-        self._concurrent_announcers = 0
+        self._pending = {}
+        self._sorted_hashes = []
+        self._active_announcers = 0
+        self.concurrent_announcers = self.CONCURRENT_ANNOUNCERS
+        self._lookup_time = None
+        self._announced = collections.deque()
 
     def run_manage_loop(self):
         if self.peer_port is not None:
@@ -43,7 +69,16 @@ class DHTHashAnnouncer(object):
             return defer.succeed(False)
 
     def hash_queue_size(self):
-        return len(self.hash_queue)
+        return len(self._pending)
+
+    def announces_per_minute(self):
+        """
+        Get the number of hashes announced over the last minute
+        """
+        cutoff = time.time() - 60
+        while self._announced and self._announced[0][0] < cutoff:
+            self._announced.popleft()
+        return sum(count for _, count in self._announced)
 
     def _announce_available_hashes(self):
         log.debug('Announcing available hashes')
@@ -62,34 +97,116 @@ class DHTHashAnnouncer(object):
         # TODO: add a timeit decorator
         start = time.time()
         ds = []
+        new_hashes = []
 
         for h in hashes:
             announce_deferred = defer.Deferred()
             ds.append(announce_deferred)
+            if h not in self._pending:
+                self._pending[h] = []
+                new_hashes.append(h)
+            self._pending[h].append(announce_deferred)
             if immediate:
                 self.hash_queue.appendleft((h, announce_deferred))
             else:
                 self.hash_queue.append((h, announce_deferred))
+        # hex hashes sort in the same order as the binary hashes, and sorting the concatenation
+        # of two sorted lists is a linear merge
+        new_hashes.sort()
+        self._sorted_hashes.extend(new_hashes)
+        self._sorted_hashes.sort()
         log.debug('There are now %s hashes remaining to be announced', self.hash_queue_size())
 
-        def announce():
-            if len(self.hash_queue):
-                h, announce_deferred = self.hash_queue.popleft()
-                log.debug('Announcing blob %s to dht', h)
-                d = self.dht_node.announceHaveBlob(binascii.unhexlify(h))
-                d.chainDeferred(announce_deferred)
-                d.addBoth(lambda _: utils.call_later(0, announce))
-            else:
-                self._concurrent_announcers -= 1
-
-        for i in range(self._concurrent_announcers, self.CONCURRENT_ANNOUNCERS):
-            self._concurrent_announcers += 1
-            announce()
+        self._start_announcers()
         d = defer.DeferredList(ds)
         d.addCallback(lambda _: log.debug('Took %s seconds to announce %s hashes',
                                           time.time() - start, len(hashes)))
         return d
 
+    def _start_announcers(self):
+        while self._active_announcers < self.concurrent_announcers:
+            h = self._next_lookup_hash()
+            if h is None:
+                break
+            self._active_announcers += 1
+            d = self._announce_near(h)
+            d.addBoth(self._announcer_finished)
+
+    def _announcer_finished(self, _):
+        self._active_announcers -= 1
+        utils.call_later(0, self._start_announcers)
+
+    def _next_lookup_hash(self):
+        while self.hash_queue:
+            h, _ = self.hash_queue.popleft()
+            if h in self._pending:
+                return h
+        return None
+
+    def _claim_hashes(self, lower, upper):
+        """
+        Remove the queued hashes in [lower, upper] from the queue
+
+        Returns:
+            dict of {hash: [deferreds]}
+        """
+        i = bisect.bisect_left(self._sorted_hashes, lower)
+        j = min(bisect.bisect_right(self._sorted_hashes, upper), i + self.MAX_HASHES_PER_LOOKUP)
+        claimed = {h: self._pending.pop(h) for h in self._sorted_hashes[i:j]}
+        del self._sorted_hashes[i:j]
+        return claimed
+
+    @defer.inlineCallbacks
+    def _announce_near(self, lookup_hash):
+        claimed = self._claim_hashes(lookup_hash, lookup_hash)
+        try:
+            log.debug('Looking up nodes close to blob %s', lookup_hash)
+            key = binascii.unhexlify(lookup_hash)
+            lookup_start = time.time()
+            contacts = yield self.dht_node.iterativeFindNode(key)
+            self._update_concurrency(time.time() - lookup_start)
+            closest = Distance(key).closest(contacts, constants.k)
+            if len(closest) < constants.k:
+                # every node the lookup could find is among the closest for every hash
+                claimed.update(self._claim_hashes('', 'f' * len(lookup_hash)))
+            else:
+                # every hash sharing enough leading bits with the lookup key has the same closest
+                # nodes, give or take the nodes right at the edge of the radius
+                radius_bits = Distance(key).to_contact(closest[-1]).bit_length()
+                key_long = long(lookup_hash, 16)
+                lower = (key_long >> radius_bits) << radius_bits
+                upper = lower | ((1 << radius_bits) - 1)
+                claimed.update(self._claim_hashes(self._to_hex(lower, len(lookup_hash)),
+                                                  self._to_hex(upper, len(lookup_hash))))
+            hashes = sorted(claimed)
+            log.debug('Announcing %i blobs to %i nodes', len(hashes), len(contacts))
+            results = yield self.dht_node.announceHaveBlobs(
+                [binascii.unhexlify(h) for h in hashes], contacts)
+        except Exception:
+            err = failure.Failure()
+            for deferreds in claimed.itervalues():
+                for d in deferreds:
+                    d.errback(err)
+        else:
+            self._announced.append((time.time(), len(hashes)))
+            for h, result in zip(hashes, results):
+                for d in claimed[h]:
+                    d.callback(result)
+
+    def _update_concurrency(self, lookup_time):
+        if self._lookup_time is None:
+            self._lookup_time = lookup_time
+        else:
+            self._lookup_time = 0.8 * self._lookup_time + 0.2 * lookup_time
+        # Little's law: lookups in flight = lookup rate * time per lookup
+        wanted = int(math.ceil(self.TARGET_LOOKUPS_PER_SECOND * self._lookup_time))
+        self.concurrent_announcers = max(self.MIN_CONCURRENT_ANNOUNCERS,
+                                         min(self.MAX_CONCURRENT_ANNOUNCERS, wanted))
+
+    @staticmethod
+    def _to_hex(value, length):
+        return ('%x' % value).zfill(length)
+
 
 class DHTHashSupplier(object):
     # 1 hour is the min time hash will be reannounced
@@ -24,7 +24,7 @@ class ServerProtocol(Protocol):
     10) Pause/resume production when told by the rate limiter
     """
 
-    implements(interfaces.IConsumer)
+    implements(interfaces.IConsumer, interfaces.IPushProducer)
 
     #Protocol stuff
 
@@ -48,7 +48,7 @@ class ServerProtocol(Protocol):
 
     def dataReceived(self, data):
         log.debug("Receiving %s bytes of data from the transport", str(len(data)))
-        self.factory.rate_limiter.report_dl_bytes(len(data))
+        self.factory.rate_limiter.report_dl_bytes(len(data), self)
         if self.request_handler is not None:
             self.request_handler.data_received(data)
 
@@ -57,15 +57,31 @@ class ServerProtocol(Protocol):
     def registerProducer(self, producer, streaming):
         log.debug("Registering the producer")
         assert streaming is True
+        self.transport.registerProducer(self, True)
 
     def unregisterProducer(self):
         self.request_handler = None
+        self.transport.unregisterProducer()
         self.transport.loseConnection()
 
     def write(self, data):
         log.trace("Writing %s bytes of data to the transport", len(data))
         self.transport.write(data)
-        self.factory.rate_limiter.report_ul_bytes(len(data))
+        self.factory.rate_limiter.report_ul_bytes(len(data), self)
+
+    #IPushProducer stuff, the transport pauses us while its write buffer is full
+
+    def pauseProducing(self):
+        if self.request_handler is not None:
+            self.request_handler.pause_writing()
+
+    def resumeProducing(self):
+        if self.request_handler is not None:
+            self.request_handler.resume_writing()
+
+    def stopProducing(self):
+        # the request handler is stopped in connectionLost
+        pass
 
     #Rate limiter stuff
 
@@ -1,5 +1,6 @@
 import json
 import logging
+from collections import deque
 from twisted.internet import interfaces, defer
 from zope.interface import implements
 from lbrynet.interfaces import IRequestHandler
@@ -14,17 +15,23 @@ class ServerRequestHandler(object):
     associated with streams.
     """
     implements(interfaces.IPushProducer, interfaces.IConsumer, IRequestHandler)
+    # clients that include this query in a request may send their next requests without waiting
+    # for the responses, the requests are answered one after another in the order they arrive
+    PIPELINE_QUERY = 'pipelined_requests'
+    MAX_PIPELINED_REQUESTS = 4
 
     def __init__(self, consumer):
         self.consumer = consumer
         self.production_paused = False
+        self.writing_paused = False
         self.request_buff = ''
-        self.response_buff = ''
+        self.response_buff = deque()  # chunks of response data waiting to be written
         self.producer = None
         self.request_received = False
-        self.CHUNK_SIZE = 2**14
+        self.request_queue = deque()  # requests waiting for the current one to be answered
         self.query_handlers = {}  # {IQueryHandler: [query_identifiers]}
         self.blob_sender = None
+        self._producing = False
         self.consumer.registerProducer(self, True)
 
     #IPushProducer stuff
@@ -37,75 +44,84 @@ class ServerRequestHandler(object):
             self.producer.stopProducing()
             self.producer = None
         self.production_paused = True
+        self.response_buff.clear()
         self.consumer.unregisterProducer()
 
     def resumeProducing(self):
-
-        from twisted.internet import reactor
-
         self.production_paused = False
         self._produce_more()
-        if self.producer is not None:
-            reactor.callLater(0, self.producer.resumeProducing)
 
-    def _produce_more(self):
+    # called by the consumer when the transport's write buffer fills up and drains
 
-        from twisted.internet import reactor
+    def pause_writing(self):
+        self.writing_paused = True
 
-        if self.production_paused:
-            return
-        chunk = self.response_buff[:self.CHUNK_SIZE]
-        self.response_buff = self.response_buff[self.CHUNK_SIZE:]
-        if chunk == '':
+    def resume_writing(self):
+        self.writing_paused = False
+        self._produce_more()
+
+    def _produce_more(self):
+        # write out queued response data and pull more blob data from the producer until
+        # there is nothing left to send or we are paused, either by the rate limiter or
+        # by the transport
+        if self._producing:
             return
-        log.trace("writing %s bytes to the client", len(chunk))
-        self.consumer.write(chunk)
-        reactor.callLater(0, self._produce_more)
+        self._producing = True
+        try:
+            while not self.production_paused and not self.writing_paused:
+                if self.response_buff:
+                    chunk = self.response_buff.popleft()
+                    log.trace("writing %s bytes to the client", len(chunk))
+                    self.consumer.write(chunk)
+                elif self.producer is not None:
+                    log.trace("Requesting more data from the producer")
+                    self.producer.resumeProducing()
+                    if not self.response_buff:
+                        break
+                else:
+                    break
+        finally:
+            self._producing = False
 
     #IConsumer stuff
 
     def registerProducer(self, producer, streaming):
         self.producer = producer
         assert streaming is False
-        producer.resumeProducing()
+        self._produce_more()
 
     def unregisterProducer(self):
         self.producer = None
 
     def write(self, data):
-
-        from twisted.internet import reactor
-
-        self.response_buff = self.response_buff + data
+        if data:
+            self.response_buff.append(data)
         self._produce_more()
 
-        def get_more_data():
-            if self.producer is not None:
-                log.trace("Requesting more data from the producer")
-                self.producer.resumeProducing()
-
-        reactor.callLater(0, get_more_data)
-
     #From Protocol
 
     def data_received(self, data):
         log.debug("Received data")
         log.debug("%s", str(data))
-        if self.request_received is False:
-            return self._parse_data_and_maybe_send_blob(data)
-        else:
-            log.warning(
-                "The client sent data when we were uploading a file. This should not happen")
-
-    def _parse_data_and_maybe_send_blob(self, data):
         self.request_buff = self.request_buff + data
-        msg = self.try_to_parse_request(self.request_buff)
-        if msg:
-            self.request_buff = ''
-            self._process_msg(msg)
-        else:
+        while True:
+            msg, self.request_buff = self.try_to_parse_request(self.request_buff)
+            if msg is None:
+                break
+            self.request_queue.append(msg)
+        if self.request_buff:
             log.debug("Request buff not a valid json message")
             log.debug("Request buff: %s", self.request_buff)
+        if len(self.request_queue) > self.MAX_PIPELINED_REQUESTS:
+            log.warning("The client sent more requests than can be queued, closing the connection")
+            self.stopProducing()
+            return
+        self._process_next_msg()
+
+    def _process_next_msg(self):
+        if self.request_received is False and self.request_queue:
+            self.request_received = True
+            self._process_msg(self.request_queue.popleft())
 
     def _process_msg(self, msg):
         d = self.handle_request(msg)
@@ -132,12 +148,13 @@ class ServerRequestHandler(object):
     def finished_response(self):
         self.request_received = False
         self._produce_more()
+        self._process_next_msg()
 
     def send_response(self, msg):
         m = json.dumps(msg)
         log.debug("Sending a response of length %s", str(len(m)))
         log.debug("Response: %s", str(m))
-        self.response_buff = self.response_buff + m
+        self.response_buff.append(m)
         self._produce_more()
         return True
 
@@ -153,6 +170,8 @@ class ServerRequestHandler(object):
                 else:
                     # result is a Failure
                     return result
+            if self.PIPELINE_QUERY in msg:
+                response[self.PIPELINE_QUERY] = self.MAX_PIPELINED_REQUESTS
             log.debug("Finished making the response message. Response: %s", str(response))
             return response
 
@@ -179,8 +198,15 @@ class ServerRequestHandler(object):
         return dl
 
     def try_to_parse_request(self, request_buff):
+        """
+        Parse the first request out of request_buff
+
+        Returns:
+            (request or None if there isn't a complete one, the rest of request_buff)
+        """
+        request_buff = request_buff.lstrip()
         try:
-            msg = json.loads(request_buff)
-            return msg
+            msg, end = json.JSONDecoder().raw_decode(request_buff)
         except ValueError:
-            return None
+            return None, request_buff
+        return msg, request_buff[end:]
@@ -1,14 +1,16 @@
 import binascii
 import logging
-from io import BytesIO
-from twisted.internet import defer
-from twisted.web.client import FileBodyProducer
+import os
+import tempfile
+from twisted.internet import defer, task
 from cryptography.hazmat.primitives.ciphers import Cipher, modes
 from cryptography.hazmat.primitives.ciphers.algorithms import AES
 from cryptography.hazmat.primitives.padding import PKCS7
 from cryptography.hazmat.backends import default_backend
 from lbrynet.core.BlobInfo import BlobInfo
+from lbrynet.core.cryptoutils import get_lbry_hash_obj
 from lbrynet.blob.blob_file import MAX_BLOB_SIZE
+from lbrynet.blob.writer import TEMP_BLOB_PREFIX, TEMP_BLOB_SUFFIX
 
 log = logging.getLogger(__name__)
 backend = default_backend()
@@ -31,6 +33,8 @@ class CryptBlobInfo(BlobInfo):
 
 
 class StreamBlobDecryptor(object):
+    CHUNK_SIZE = 2 ** 16
+
     def __init__(self, blob, key, iv, length):
         """
         This class decrypts blob
@@ -55,6 +59,9 @@ class StreamBlobDecryptor(object):
         """
         Decrypt blob and write its content useing write_func
 
+        The blob is read and decrypted CHUNK_SIZE bytes at a time, and each decrypted chunk is
+        passed to write_func before the next one is read, cooperatively with the reactor.
+
         write_func - function that takes decrypted string as
             arugment and writes it somewhere
 
@@ -63,14 +70,13 @@ class StreamBlobDecryptor(object):
         deferred that returns after decrypting blob and writing content
         """
 
-        def remove_padding(data):
-            return self.unpadder.update(data) + self.unpadder.finalize()
-
-        def write_bytes():
-            if self.len_read < self.length:
-                num_bytes_to_decrypt = greatest_multiple(len(self.buff), (AES.block_size / 8))
-                data_to_decrypt, self.buff = split(self.buff, num_bytes_to_decrypt)
-                write_func(self.cipher.update(data_to_decrypt))
+        def decrypt_bytes(data):
+            self.buff += data
+            self.len_read += len(data)
+            num_bytes_to_decrypt = greatest_multiple(len(self.buff), (AES.block_size / 8))
+            data_to_decrypt, self.buff = split(self.buff, num_bytes_to_decrypt)
+            # the unpadder holds back the last block, the padding is removed when it is finalized
+            write_func(self.unpadder.update(self.cipher.update(data_to_decrypt)))
 
         def finish_decrypt():
             bytes_left = len(self.buff) % (AES.block_size / 8)
@@ -80,22 +86,26 @@ class StreamBlobDecryptor(object):
                                 (self.blob.blob_hash, bytes_left))
             data_to_decrypt, self.buff = self.buff, b''
             last_chunk = self.cipher.update(data_to_decrypt) + self.cipher.finalize()
-            write_func(remove_padding(last_chunk))
-
+            write_func(self.unpadder.update(last_chunk) + self.unpadder.finalize())
 
         read_handle = self.blob.open_for_reading()
 
+        def decrypt_chunks():
+            data = read_handle.read(self.CHUNK_SIZE)
+            while data:
+                decrypt_bytes(data)
+                yield
+                data = read_handle.read(self.CHUNK_SIZE)
+
         @defer.inlineCallbacks
-        def decrypt_bytes():
-            producer = FileBodyProducer(read_handle)
-            buff = BytesIO()
-            yield producer.startProducing(buff)
-            self.buff = buff.getvalue()
-            self.len_read += len(self.buff)
-            write_bytes()
+        def decrypt_blob():
+            try:
+                yield task.cooperate(decrypt_chunks()).whenDone()
+            finally:
+                read_handle.close()
             finish_decrypt()
 
-        d = decrypt_bytes()
+        d = decrypt_blob()
         return d
 
 
@@ -157,6 +167,37 @@ class CryptStreamBlobMaker(object):
         defer.returnValue(blob)
 
 
+def encrypt_blob(blob_dir, key, iv, blob_num, data):
+    """
+    Encrypt the plaintext of a whole blob and write it to the blob directory
+
+    This doesn't touch the reactor, so it can be run on a worker thread. The encrypted blob is
+    written to a temporary file which is then moved to its hash. An empty plaintext makes the
+    terminating blob of a stream, which has no hash and isn't written.
+
+    Returns the CryptBlobInfo of the blob
+    """
+    if not data:
+        return CryptBlobInfo(None, blob_num, 0, binascii.hexlify(iv))
+    if len(data) > MAX_BLOB_SIZE - 1:
+        raise ValueError("%i bytes is too much data for a blob" % len(data))
+    padder = PKCS7(AES.block_size).padder()
+    cipher = Cipher(AES(key), modes.CBC(iv), backend=backend).encryptor()
+    encrypted_data = cipher.update(padder.update(data) + padder.finalize()) + cipher.finalize()
+    hashsum = get_lbry_hash_obj()
+    hashsum.update(encrypted_data)
+    blob_hash = hashsum.hexdigest()
+    fd, temp_path = tempfile.mkstemp(TEMP_BLOB_SUFFIX, TEMP_BLOB_PREFIX, blob_dir)
+    with os.fdopen(fd, 'wb') as temp_file:
+        temp_file.write(encrypted_data)
+    blob_path = os.path.join(blob_dir, blob_hash)
+    if os.name == 'nt' and os.path.isfile(blob_path):
+        # os.rename can't replace an existing file on windows
+        os.remove(blob_path)
+    os.rename(temp_path, blob_path)
+    return CryptBlobInfo(blob_hash, blob_num, len(encrypted_data), binascii.hexlify(iv))
+
+
 def greatest_multiple(a, b):
     """return the largest value `c`, that is a multiple of `b` and is <= `a`"""
     return (a // b) * b
@@ -3,11 +3,15 @@ Utility for creating Crypt Streams, which are encrypted blobs and associated met
 """
 
 import logging
-from twisted.internet import interfaces, defer
+import os
+import threading
+from collections import deque
+from twisted.internet import interfaces, defer, threads
 from zope.interface import implements
 from Crypto import Random
 from Crypto.Cipher import AES
-from lbrynet.cryptstream.CryptBlob import CryptStreamBlobMaker
+from lbrynet.blob.blob_file import MAX_BLOB_SIZE
+from lbrynet.cryptstream.CryptBlob import CryptStreamBlobMaker, encrypt_blob
 
 
 log = logging.getLogger(__name__)
@@ -148,3 +152,209 @@ class CryptStreamCreator(object):
 
     def _blob_finished(self, blob_info):
         raise NotImplementedError()
+
+
+class ThreadedCryptStreamCreator(object):
+    """
+    Create a new stream from a file on worker threads.
+
+    Like CryptStreamCreator, each blob is encrypted with the same key and its own
+    initialization vector. Instead of being fed by a producer on the reactor thread, the file
+    is read and each blob is encrypted, hashed and written to the blob directory by up to
+    `workers` threads at a time, so reading the next blob overlaps with encrypting the last.
+    The blobs are registered with the blob manager in one batch once all of them are written.
+
+    If split_file is True and the file being read is a regular file on disk, it is split into
+    the plaintext ranges of its blobs up front and each worker opens the file and reads its
+    own range, so reading is parallel as well. The initialization vectors are still drawn in
+    blob order, so the stream is the same as the one made by reading the file in order. AES
+    and the blob hash release the GIL, so this uses as many cores as there are workers.
+    """
+
+    def __init__(self, blob_manager, name=None, key=None, iv_generator=None, workers=2,
+                 split_file=False):
+        """@param blob_manager: Object that stores and provides access to blobs.
+        @type blob_manager: DiskBlobManager
+
+        @param name: the name of the stream, which will be presented to the user
+        @type name: string
+
+        @param key: the raw AES key which will be used to encrypt the
+            blobs. If None, a random key will be generated.
+        @type key: string
+
+        @param iv_generator: a generator which yields initialization
+            vectors for the blobs. Will be called once for each blob.
+        @type iv_generator: a generator function which yields strings
+
+        @param workers: the number of blobs to read and encrypt at a time
+        @type workers: integer
+
+        @param split_file: whether to read the blobs of files on disk in parallel
+        @type split_file: boolean
+
+        @return: None
+        """
+        self.blob_manager = blob_manager
+        self.name = name
+        self.key = key
+        if iv_generator is None:
+            self.iv_generator = CryptStreamCreator.random_iv_generator()
+        else:
+            self.iv_generator = iv_generator
+        self.workers = workers
+        self.split_file = split_file
+        self.blob_count = 0
+        self.blobs_created = 0
+        self.bytes_read = 0
+        self.total_bytes = None
+        # the file and the iv generator are used by one worker at a time
+        self._read_lock = threading.Lock()
+        self._read_finished = False
+
+    def setup(self):
+        """Create the symmetric key if it wasn't provided"""
+
+        if self.key is None:
+            self.key = Random.new().read(AES.block_size)
+
+        return defer.succeed(True)
+
+    def get_progress(self):
+        return {
+            'bytes_read': self.bytes_read,
+            'total_bytes': self.total_bytes,
+            'blobs_created': self.blobs_created,
+        }
+
+    def create_stream(self, file_handle):
+        """
+        Read the file and create the blobs of the stream, including the terminating blob
+
+        @param file_handle: the file to read, it is only read from worker threads
+        @type file_handle: any file-like object with a read method
+
+        @return: Deferred which fires with the result of _finished
+        """
+        file_path = getattr(file_handle, 'name', None)
+        if self.split_file and isinstance(file_path, basestring) and os.path.isfile(file_path):
+            return self.create_stream_from_file(file_path)
+        self.total_bytes = get_file_size(file_handle)
+        return self._create_stream(
+            lambda: threads.deferToThread(self._create_next_blob, file_handle))
+
+    def create_stream_from_file(self, file_path):
+        """
+        Create the stream of a file on disk, reading the plaintext of the blobs in parallel
+
+        @param file_path: the path of the file
+        @type file_path: string
+
+        @return: Deferred which fires with the result of _finished
+        """
+        self.total_bytes = os.path.getsize(file_path)
+        blob_size = MAX_BLOB_SIZE - 1
+        num_blobs = (self.total_bytes + blob_size - 1) // blob_size
+        # draw the ivs in blob order, they are the same as when the file is read in order
+        blobs = deque(self._next_blob() for _ in range(num_blobs))
+
+        def create_blob():
+            if self._read_finished or not blobs:
+                return defer.succeed(None)
+            blob_num, iv = blobs.popleft()
+            length = min(blob_size, self.total_bytes - blob_num * blob_size)
+            d = threads.deferToThread(self._create_blob_from_range, file_path, blob_num, iv,
+                                      blob_num * blob_size, length)
+            d.addCallback(self._range_read, length)
+            return d
+
+        return self._create_stream(create_blob)
+
+    @defer.inlineCallbacks
+    def _create_stream(self, create_blob):
+        blob_infos = []
+        try:
+            yield defer.gatherResults(
+                [self._create_blobs(create_blob, blob_infos) for _ in range(self.workers)],
+                consumeErrors=True
+            )
+        except defer.FirstError as err:
+            err.subFailure.raiseException()
+        blob_infos.sort(key=lambda blob_info: blob_info.blob_num)
+        yield self.blob_manager.blobs_created(blob_infos)
+        blob_num, iv = self._next_blob()
+        terminator = encrypt_blob(self.blob_manager.blob_dir, self.key, iv, blob_num, b'')
+        for blob_info in blob_infos + [terminator]:
+            self._blob_finished(blob_info)
+        result = yield self._finished()
+        defer.returnValue(result)
+
+    @defer.inlineCallbacks
+    def _create_blobs(self, create_blob, blob_infos):
+        while True:
+            try:
+                blob_info = yield create_blob()
+            except Exception:
+                # stop the other workers
+                self._read_finished = True
+                raise
+            if blob_info is None:
+                break
+            blob_infos.append(blob_info)
+            self.blobs_created += 1
+
+    def _create_next_blob(self, file_handle):
+        """Called in a worker thread, returns None once the whole file has been read"""
+        with self._read_lock:
+            if self._read_finished:
+                return None
+            data = read_blob_data(file_handle)
+            if not data:
+                self._read_finished = True
+                return None
+            blob_num, iv = self._next_blob()
+            self.bytes_read += len(data)
+        return encrypt_blob(self.blob_manager.blob_dir, self.key, iv, blob_num, data)
+
+    def _create_blob_from_range(self, file_path, blob_num, iv, offset, length):
+        """Called in a worker thread"""
+        with open(file_path, 'rb') as file_handle:
+            file_handle.seek(offset)
+            data = file_handle.read(length)
+        if len(data) != length:
+            raise IOError("%s changed while its stream was being created" % file_path)
+        return encrypt_blob(self.blob_manager.blob_dir, self.key, iv, blob_num, data)
+
+    def _range_read(self, blob_info, length):
+        self.bytes_read += length
+        return blob_info
+
+    def _next_blob(self):
+        blob_num = self.blob_count
+        self.blob_count += 1
+        return blob_num, self.iv_generator.next()
+
+    def _finished(self):
+        raise NotImplementedError()
+
+    def _blob_finished(self, blob_info):
+        raise NotImplementedError()
+
+
+def read_blob_data(file_handle):
+    """Read the plaintext of the next blob, an empty string at the end of the file"""
+    num_bytes = MAX_BLOB_SIZE - 1
+    data = file_handle.read(num_bytes)
+    while data and len(data) < num_bytes:
+        more_data = file_handle.read(num_bytes - len(data))
+        if not more_data:
+            break
+        data += more_data
+    return data
+
+
+def get_file_size(file_handle):
+    try:
+        return os.fstat(file_handle.fileno()).st_size
+    except (AttributeError, IOError, OSError):
+        return None
@@ -72,10 +72,19 @@ class CryptStreamDownloader(object):
         self.finished_deferred = None
         self.points_paid = 0.0
         self.blob_requester = None
+        # called with the blob and its number in the stream when a blob has been downloaded
+        self.progress_listeners = []
 
     def __str__(self):
         return str(self.stream_name)
 
+    def add_progress_listener(self, listener):
+        self.progress_listeners.append(listener)
+
+    def remove_progress_listener(self, listener):
+        if listener in self.progress_listeners:
+            self.progress_listeners.remove(listener)
+
     def toggle_running(self):
         if self.stopped is True:
             return self.start()
@@ -158,9 +167,11 @@ class CryptStreamDownloader(object):
         # blob_requester needs to be set before the connection manager is setup
         self.blob_requester = self._get_blob_requester(download_manager)
         download_manager.connection_manager = self._get_connection_manager(download_manager)
+        download_manager.add_progress_listener(self._blob_downloaded)
         return download_manager
 
     def _remove_download_manager(self):
+        self.download_manager.remove_progress_listener(self._blob_downloaded)
         self.download_manager.blob_info_finder = None
         self.download_manager.progress_manager = None
         self.download_manager.blob_handler = None
@@ -212,6 +223,10 @@ class CryptStreamDownloader(object):
     def _get_finished_deferred_callback_value(self):
         return None
 
+    def _blob_downloaded(self, blob, blob_num):
+        for listener in list(self.progress_listeners):
+            listener(blob, blob_num)
+
     def _finished_downloading(self, finished):
         if finished is True:
             self.completed = True
@@ -34,6 +34,7 @@ from lbrynet.lbry_file.client.EncryptedFileOptions import add_lbry_file_to_sd_id
 from lbrynet.file_manager.EncryptedFileManager import EncryptedFileManager
 from lbrynet.daemon.Downloader import GetStream
 from lbrynet.daemon.Publisher import Publisher
+from lbrynet.daemon.ProgressSubscriptions import ProgressSubscriptions
 from lbrynet.daemon.ExchangeRateManager import ExchangeRateManager
 from lbrynet.daemon.auth.server import AuthJSONRPCServer
 from lbrynet.core.PaymentRateManager import OnlyFreePaymentsManager
@@ -41,6 +42,7 @@ from lbrynet.core import utils, system_info
 from lbrynet.core.StreamDescriptor import StreamDescriptorIdentifier, download_sd_blob
 from lbrynet.core.StreamDescriptor import EncryptedFileStreamType
 from lbrynet.core.Session import Session
+from lbrynet.core.StartupGraph import StartupGraph
 from lbrynet.core.Wallet import LBRYumWallet, ClaimOutpoint
 from lbrynet.core.looping_call_manager import LoopingCallManager
 from lbrynet.core.server.BlobRequestHandler import BlobRequestHandlerFactory
@@ -206,9 +208,11 @@ class Daemon(AuthJSONRPCServer):
         self.connected_to_internet = True
         self.connection_status_code = None
         self.platform = None
-        self.current_db_revision = 6
+        self.current_db_revision = 7
         self.db_revision_file = conf.settings.get_db_revision_filename()
         self.session = None
+        self.startup = None
+        self.migrated = False
         self._session_id = conf.settings.get_session_id()
         # TODO: this should probably be passed into the daemon, or
         # possibly have the entire log upload functionality taken out
@@ -222,6 +226,8 @@ class Daemon(AuthJSONRPCServer):
         self.query_handlers = {}
         self.waiting_on = {}
         self.streams = {}
+        # publishers that are creating a stream or making a claim
+        self.publishers = []
         self.exchange_rate_manager = ExchangeRateManager()
         calls = {
             Checker.INTERNET_CONNECTION: LoopingCall(CheckInternetConnection(self)),
@@ -230,6 +236,7 @@ class Daemon(AuthJSONRPCServer):
         self.looping_call_manager = LoopingCallManager(calls)
         self.sd_identifier = StreamDescriptorIdentifier()
         self.lbry_file_manager = None
+        self.progress_subscriptions = ProgressSubscriptions()
 
     @defer.inlineCallbacks
     def setup(self):
@@ -244,17 +251,12 @@ class Daemon(AuthJSONRPCServer):
         self.exchange_rate_manager.start()
 
         yield self._initial_setup()
+        # the dht data store and the databases are kept in the data directory
         yield threads.deferToThread(self._setup_data_directory)
-        migrated = yield self._check_db_migration()
-        yield self.storage.setup()
-        yield self._get_session()
-        yield self._check_wallet_locked()
-        yield self._start_analytics()
-        yield add_lbry_file_to_sd_identifier(self.sd_identifier)
-        yield self._setup_stream_identifier()
-        yield self._setup_lbry_file_manager()
-        yield self._setup_query_handlers()
-        yield self._setup_server()
+        self._create_session()
+        self.startup = StartupGraph()
+        self._add_startup_components(self.startup)
+        yield self.startup.start()
         log.info("Starting balance: " + str(self.session.wallet.get_balance()))
         self.announced_startup = True
         self.startup_status = STARTUP_STAGES[5]
@@ -262,7 +264,7 @@ class Daemon(AuthJSONRPCServer):
 
         ###
         # this should be removed with the next db revision
-        if migrated:
+        if self.migrated:
             missing_channel_claim_ids = yield self.storage.get_unknown_certificate_ids()
             while missing_channel_claim_ids:  # in case there are a crazy amount lets batch to be safe
                 batch = missing_channel_claim_ids[:100]
@@ -272,6 +274,27 @@ class Daemon(AuthJSONRPCServer):
 
         self._auto_renew()
 
+    def _add_startup_components(self, startup):
+        """
+        Add the components of the daemon and its session to the startup graph, a component is
+        started as soon as the components it depends on have started
+        """
+
+        startup.add_component('database', self._setup_database)
+        self.session.add_startup_components(startup, ['database'])
+        startup.add_component('wallet_unlocked', self._check_wallet_locked, ['wallet'])
+        startup.add_component('analytics', self._start_analytics)
+        startup.add_component('stream_identifier', self._setup_stream_identifier,
+                              ['blob_manager', 'rate_limiter'])
+        startup.add_component('file_manager', self._setup_lbry_file_manager,
+                              ['stream_identifier', 'blob_tracker', 'wallet_unlocked'])
+        startup.add_component('query_handlers', self._setup_query_handlers, ['blob_tracker'])
+        startup.add_component('wallet_query_handler', self._setup_wallet_query_handler,
+                              ['wallet'])
+        startup.add_component('peer_server', self._start_server,
+                              ['query_handlers', 'rate_limiter'])
+        startup.add_component('reflector_server', self._start_reflector, ['file_manager'])
+
     def _get_platform(self):
         if self.platform is None:
             self.platform = system_info.get_platform()
@@ -332,6 +355,7 @@ class Daemon(AuthJSONRPCServer):
         return defer.succeed(True)
 
     def _start_reflector(self):
+        self.startup_status = STARTUP_STAGES[4]
         if self.run_reflector_server:
             log.info("Starting reflector server")
             if self.reflector_port is not None:
@@ -377,12 +401,6 @@ class Daemon(AuthJSONRPCServer):
         except AttributeError:
             return defer.succeed(True)
 
-    def _setup_server(self):
-        self.startup_status = STARTUP_STAGES[4]
-        d = self._start_server()
-        d.addCallback(lambda _: self._start_reflector())
-        return d
-
     def _setup_query_handlers(self):
         handlers = [
             BlobRequestHandlerFactory(
@@ -391,10 +409,14 @@ class Daemon(AuthJSONRPCServer):
                 self.session.payment_rate_manager,
                 self.analytics_manager
             ),
-            self.session.wallet.get_wallet_info_query_handler_factory(),
         ]
         return self._add_query_handlers(handlers)
 
+    def _setup_wallet_query_handler(self):
+        # the peer server may already be running, connections made from now on will get it
+        handlers = [self.session.wallet.get_wallet_info_query_handler_factory()]
+        return self._add_query_handlers(handlers)
+
     def _add_query_handlers(self, query_handlers):
         for handler in query_handlers:
             query_id = handler.get_primary_query_identifier()
@@ -419,6 +441,7 @@ class Daemon(AuthJSONRPCServer):
         log.info("Status at time of shutdown: " + self.startup_status[0])
 
         self._stop_streams()
+        self.progress_subscriptions.stop()
 
         self.looping_call_manager.shutdown()
         if self.analytics_manager:
@@ -497,6 +520,11 @@ class Daemon(AuthJSONRPCServer):
             log.warning("db_revision file not found. Creating it")
             self._write_db_revision_file(self.current_db_revision)
 
+    @defer.inlineCallbacks
+    def _setup_database(self):
+        self.migrated = yield self._check_db_migration()
+        self.startup_status = STARTUP_STAGES[2]
+
     @defer.inlineCallbacks
     def _check_db_migration(self):
         old_revision = 1
@@ -525,6 +553,7 @@ class Daemon(AuthJSONRPCServer):
         log.info('Starting the file manager')
         self.startup_status = STARTUP_STAGES[3]
         self.lbry_file_manager = EncryptedFileManager(self.session, self.sd_identifier)
+        self.lbry_file_manager.add_progress_listener(self.progress_subscriptions.add_event)
         yield self.lbry_file_manager.setup()
         log.info('Done setting up file manager')
 
@@ -532,7 +561,7 @@ class Daemon(AuthJSONRPCServer):
         if not self.analytics_manager.is_started:
             self.analytics_manager.start()
 
-    def _get_session(self):
+    def _create_session(self):
         def get_wallet():
             if self.wallet_type == LBRYCRD_WALLET:
                 raise ValueError('LBRYcrd Wallet is no longer supported')
@@ -553,37 +582,29 @@ class Daemon(AuthJSONRPCServer):
                     config['use_keyring'] = conf.settings['use_keyring']
                 if conf.settings['lbryum_wallet_dir']:
                     config['lbryum_path'] = conf.settings['lbryum_wallet_dir']
-                wallet = LBRYumWallet(self.storage, config)
-                return defer.succeed(wallet)
+                return LBRYumWallet(self.storage, config)
             elif self.wallet_type == PTC_WALLET:
                 log.info("Using PTC wallet")
                 from lbrynet.core.PTCWallet import PTCWallet
-                return defer.succeed(PTCWallet(self.db_dir))
+                return PTCWallet(self.db_dir)
             else:
                 raise ValueError('Wallet Type {} is not valid'.format(self.wallet_type))
 
-        d = get_wallet()
-
-        def create_session(wallet):
-            self.session = Session(
-                conf.settings['data_rate'],
-                db_dir=self.db_dir,
-                node_id=self.node_id,
-                blob_dir=self.blobfile_dir,
-                dht_node_port=self.dht_node_port,
-                known_dht_nodes=conf.settings['known_dht_nodes'],
-                peer_port=self.peer_port,
-                use_upnp=self.use_upnp,
-                wallet=wallet,
-                is_generous=conf.settings['is_generous_host'],
-                external_ip=self.platform['ip'],
-                storage=self.storage
-            )
-            self.startup_status = STARTUP_STAGES[2]
-
-        d.addCallback(create_session)
-        d.addCallback(lambda _: self.session.setup())
-        return d
+        wallet = get_wallet()
+        self.session = Session(
+            conf.settings['data_rate'],
+            db_dir=self.db_dir,
+            node_id=self.node_id,
+            blob_dir=self.blobfile_dir,
+            dht_node_port=self.dht_node_port,
+            known_dht_nodes=conf.settings['known_dht_nodes'],
+            peer_port=self.peer_port,
+            use_upnp=self.use_upnp,
+            wallet=wallet,
+            is_generous=conf.settings['is_generous_host'],
+            external_ip=self.platform['ip'],
+            storage=self.storage
+        )
 
     @defer.inlineCallbacks
     def _check_wallet_locked(self):
@@ -593,7 +614,9 @@ class Daemon(AuthJSONRPCServer):
 
         yield wallet.check_locked()
 
+    @defer.inlineCallbacks
     def _setup_stream_identifier(self):
+        yield add_lbry_file_to_sd_identifier(self.sd_identifier)
         file_saver_factory = EncryptedFileSaverFactory(
             self.session.peer_finder,
             self.session.rate_limiter,
@@ -604,7 +627,6 @@ class Daemon(AuthJSONRPCServer):
         )
         self.sd_identifier.add_stream_downloader_factory(EncryptedFileStreamType,
                                                          file_saver_factory)
-        return defer.succeed(None)
 
     def _download_blob(self, blob_hash, rate_manager=None, timeout=None):
         """
@@ -722,8 +744,12 @@ class Daemon(AuthJSONRPCServer):
             claim_out = yield publisher.publish_stream(name, bid, claim_dict, stream_hash, claim_address,
                                                        change_address)
         else:
-            claim_out = yield publisher.create_and_publish_stream(name, bid, claim_dict, file_path,
-                                                                  claim_address, change_address)
+            self.publishers.append(publisher)
+            try:
+                claim_out = yield publisher.create_and_publish_stream(name, bid, claim_dict, file_path,
+                                                                      claim_address, change_address)
+            finally:
+                self.publishers.remove(publisher)
             if conf.settings['reflect_uploads']:
                 d = reupload.reflect_stream(publisher.lbry_file)
                 d.addCallbacks(lambda _: log.info("Reflected new publication to lbry://%s", name),
@@ -876,12 +902,7 @@ class Daemon(AuthJSONRPCServer):
         key = binascii.b2a_hex(lbry_file.key) if lbry_file.key else None
         full_path = os.path.join(lbry_file.download_directory, lbry_file.file_name)
         mime_type = mimetypes.guess_type(full_path)[0]
-        if os.path.isfile(full_path):
-            with open(full_path) as written_file:
-                written_file.seek(0, os.SEEK_END)
-                written_bytes = written_file.tell()
-        else:
-            written_bytes = 0
+        written_bytes = lbry_file.get_written_bytes()
 
         size = num_completed = num_known = status = None
 
@@ -903,6 +924,7 @@ class Daemon(AuthJSONRPCServer):
             'suggested_file_name': lbry_file.suggested_file_name,
             'sd_hash': lbry_file.sd_hash,
             'download_path': full_path,
+            'streaming_url': '%s/stream/%s' % (conf.settings.get_ui_address(), lbry_file.sd_hash),
             'mime_type': mime_type,
             'key': key,
             'total_bytes': size,
@@ -925,10 +947,9 @@ class Daemon(AuthJSONRPCServer):
     def _get_lbry_file(self, search_by, val, return_json=False, full_status=False):
         lbry_file = None
         if search_by in FileID:
-            for l_f in self.lbry_file_manager.lbry_files:
-                if l_f.__dict__.get(search_by) == val:
-                    lbry_file = l_f
-                    break
+            lbry_files = self.lbry_file_manager.lbry_files.find(stop=1, **{search_by: val})
+            if lbry_files:
+                lbry_file = lbry_files[0]
         else:
             raise NoValidSearch('{} is not a valid search operation'.format(search_by))
         if return_json and lbry_file:
@@ -936,11 +957,14 @@ class Daemon(AuthJSONRPCServer):
         defer.returnValue(lbry_file)
 
     @defer.inlineCallbacks
-    def _get_lbry_files(self, return_json=False, full_status=True, **kwargs):
-        lbry_files = list(self.lbry_file_manager.lbry_files)
-        if kwargs:
-            for search_type, value in iter_lbry_file_search_values(kwargs):
-                lbry_files = [l_f for l_f in lbry_files if l_f.__dict__[search_type] == value]
+    def _get_lbry_files(self, return_json=False, full_status=True, page=None, page_size=None,
+                        **kwargs):
+        start, stop = 0, None
+        if page_size:
+            start = (page or 0) * page_size
+            stop = start + page_size
+        search = dict(iter_lbry_file_search_values(kwargs))
+        lbry_files = self.lbry_file_manager.lbry_files.find(start, stop, **search)
         if return_json:
             file_dicts = []
             for lbry_file in lbry_files:
@@ -1024,17 +1048,18 @@ class Daemon(AuthJSONRPCServer):
     ############################################################################
 
     @defer.inlineCallbacks
-    @AuthJSONRPCServer.flags(session_status="-s", dht_status="-d")
-    def jsonrpc_status(self, session_status=False, dht_status=False):
+    @AuthJSONRPCServer.flags(session_status="-s", dht_status="-d", publish_status="-p")
+    def jsonrpc_status(self, session_status=False, dht_status=False, publish_status=False):
         """
         Get daemon status
 
         Usage:
-            status [-s] [-d]
+            status [-s] [-d] [-p]
 
         Options:
             -s  : include session status in results
             -d  : include dht network and peer status
+            -p  : include the progress of the streams being created for publishes
 
         Returns:
             (dict) lbrynet-daemon status
@@ -1045,7 +1070,16 @@ class Daemon(AuthJSONRPCServer):
                 'is_first_run': bool,
                 'startup_status': {
                     'code': status code,
-                    'message': status message
+                    'message': status message,
+                    'components': {
+                        <component name>: {
+                            'status': waiting, starting, started or failed,
+                            'start_time': seconds after the start of the startup that the
+                                          component started starting, null if it hasn't yet,
+                            'duration': seconds the component took to start, null if it
+                                        hasn't started yet
+                        },
+                    }
                 },
                 'connection_status': {
                     'code': connection status code,
@@ -1063,7 +1097,15 @@ class Daemon(AuthJSONRPCServer):
                         'managed_blobs': count of blobs in the blob manager,
                         'managed_streams': count of streams in the file manager
                         'announce_queue_size': number of blobs currently queued to be announced
-                        'should_announce_blobs': number of blobs that should be announced
+                        'announces_per_minute': number of blobs announced over the last minute,
+                        'should_announce_blobs': number of blobs that should be announced,
+                        'blob_cache': {
+                            'cached_blobs': number of blob objects held in memory,
+                            'max_cached_blobs': maximum number of cached blob objects,
+                            'hits': blob lookups answered from the cache,
+                            'misses': blob lookups that had to create a blob object,
+                            'evictions': blob objects evicted from the cache
+                        }
                     }
 
                 If given the dht status option:
@@ -1077,6 +1119,16 @@ class Daemon(AuthJSONRPCServer):
                         'recent_contacts': count of recently contacted peers,
                         'unique_contacts': count of unique peers
                     },
+
+                If given the publish status option:
+                    'publish_status': [
+                        {
+                            'file_name': name of the file being published,
+                            'bytes_read': bytes of the file read and encrypted so far,
+                            'total_bytes': size of the file, or null if it isn't known,
+                            'blobs_created': number of blobs written so far
+                        },
+                    ]
             }
         """
 
@@ -1096,6 +1148,7 @@ class Daemon(AuthJSONRPCServer):
             'startup_status': {
                 'code': self.startup_status[0],
                 'message': self.startup_status[1],
+                'components': self.startup.get_status() if self.startup else {},
             },
             'connection_status': {
                 'code': self.connection_status_code,
@@ -1121,10 +1174,15 @@ class Daemon(AuthJSONRPCServer):
                 'managed_blobs': len(blobs),
                 'managed_streams': len(self.lbry_file_manager.lbry_files),
                 'announce_queue_size': announce_queue_size,
+                'announces_per_minute': self.session.hash_announcer.announces_per_minute(),
                 'should_announce_blobs': should_announce_blobs,
+                'blob_cache': self.session.blob_manager.get_cache_stats(),
             }
         if dht_status:
             response['dht_status'] = self.session.dht_node.get_bandwidth_stats()
+        if publish_status:
+            progress = [publisher.get_progress() for publisher in self.publishers]
+            response['publish_status'] = [p for p in progress if p is not None]
         defer.returnValue(response)
 
     def jsonrpc_version(self):
@@ -1390,7 +1448,7 @@ class Daemon(AuthJSONRPCServer):
             file_list [--sd_hash=<sd_hash>] [--file_name=<file_name>] [--stream_hash=<stream_hash>]
                       [--rowid=<rowid>] [--claim_id=<claim_id>] [--outpoint=<outpoint>] [--txid=<txid>] [--nout=<nout>]
                       [--channel_claim_id=<channel_claim_id>] [--channel_name=<channel_name>]
-                      [--claim_name=<claim_name>] [-f]
+                      [--claim_name=<claim_name>] [--page_size=<page_size>] [--page=<page>] [-f]
 
         Options:
             --sd_hash=<sd_hash>                    : get file with matching sd hash
@@ -1405,6 +1463,9 @@ class Daemon(AuthJSONRPCServer):
             --channel_claim_id=<channel_claim_id>  : get file with matching channel claim id
             --channel_name=<channel_name>  : get file with matching channel name
             --claim_name=<claim_name>              : get file with matching claim name
+            --page_size=<page_size>                : number of files in a page, defaults to all
+                                                     of the files
+            --page=<page>                          : page of files to return, the first page is 0
             -f                                     : full status, populate the 'message' and 'size' fields
 
         Returns:
@@ -1422,6 +1483,7 @@ class Daemon(AuthJSONRPCServer):
                     'suggested_file_name': (str) suggested file name,
                     'sd_hash': (str) sd hash of file,
                     'download_path': (str) download path of file,
+                    'streaming_url': (str) url to stream the file from while it downloads,
                     'mime_type': (str) mime type of file,
                     'key': (str) key attached to file,
                     'total_bytes': (int) file size in bytes, None if full_status is false,
@@ -1445,6 +1507,72 @@ class Daemon(AuthJSONRPCServer):
         response = yield self._render_response(result)
         defer.returnValue(response)
 
+    def jsonrpc_file_subscribe(self, sd_hash=None):
+        """
+        Subscribe to the download progress events of files, get the events with file_events
+
+        Usage:
+            file_subscribe [--sd_hash=<sd_hash>]
+
+        Options:
+            --sd_hash=<sd_hash>  : only get the events of the file with matching sd hash
+
+        Returns:
+            (str) subscription id, the subscription is removed if file_events isn't called
+                  with it for five minutes
+        """
+
+        return self._render_response(self.progress_subscriptions.subscribe(sd_hash))
+
+    @defer.inlineCallbacks
+    def jsonrpc_file_events(self, subscription_id, timeout=30):
+        """
+        Get the download progress events of a subscription, waiting for the next event if
+        there haven't been any since the last call
+
+        Usage:
+            file_events (<subscription_id> | --subscription_id=<subscription_id>)
+                        [--timeout=<timeout>]
+
+        Options:
+            --timeout=<timeout>  : seconds to wait for an event, defaults to 30
+
+        Returns:
+            (list) List of events, empty if there were none before the timeout
+            [
+                {
+                    'event': (str) 'blob_downloaded' or 'status',
+                    'sd_hash': (str) sd hash of file,
+                    'stream_hash': (str) stream hash of file,
+                    'file_name': (str) name of file,
+                    'written_bytes': (int) written size in bytes,
+                    'time': (float) time of the event,
+                    'blob_hash': (str) hash of the downloaded blob, for blob_downloaded events,
+                    'blob_num': (int) number of the downloaded blob in the stream, for
+                                blob_downloaded events,
+                    'status': (str) 'running', 'stopped' or 'finished', for status events
+                },
+            ]
+        """
+
+        events = yield self.progress_subscriptions.get_events(subscription_id, int(timeout))
+        response = yield self._render_response(events)
+        defer.returnValue(response)
+
+    def jsonrpc_file_unsubscribe(self, subscription_id):
+        """
+        Remove a subscription to download progress events
+
+        Usage:
+            file_unsubscribe (<subscription_id> | --subscription_id=<subscription_id>)
+
+        Returns:
+            (bool) true if successful
+        """
+
+        self.progress_subscriptions.unsubscribe(subscription_id)
+        return self._render_response(True)
+
     @defer.inlineCallbacks
     @AuthJSONRPCServer.flags(force='-f')
     def jsonrpc_resolve_name(self, name, force=False):
@@ -1633,6 +1761,7 @@ class Daemon(AuthJSONRPCServer):
                 'suggested_file_name': (str) suggested file name,
                 'sd_hash': (str) sd hash of file,
                 'download_path': (str) download path of file,
+                'streaming_url': (str) url to stream the file from while it downloads,
                 'mime_type': (str) mime type of file,
                 'key': (str) key attached to file,
                 'total_bytes': (int) file size in bytes, None if full_status is false,
@@ -2765,7 +2894,8 @@ class Daemon(AuthJSONRPCServer):
             (str) Success/fail message
         """
 
-        if blob_hash not in self.session.blob_manager.blobs:
+        blob = yield self.session.blob_manager.get_known_blob(blob_hash)
+        if blob is None or not blob.get_is_verified():
             response = yield self._render_response("Don't have that blob")
             defer.returnValue(response)
         try:
@@ -2989,24 +3119,23 @@ class Daemon(AuthJSONRPCServer):
         """
 
         result = {}
-        data_store = deepcopy(self.session.dht_node._dataStore._dict)
-        datastore_len = len(data_store)
+        data_store = self.session.dht_node._dataStore
         hosts = {}
 
-        if datastore_len:
-            for k, v in data_store.iteritems():
-                for value, lastPublished, originallyPublished, originalPublisherID in v:
-                    try:
-                        contact = self.session.dht_node._routingTable.getContact(
-                            originalPublisherID)
-                    except ValueError:
-                        continue
-                    if contact in hosts:
-                        blobs = hosts[contact]
-                    else:
-                        blobs = []
-                    blobs.append(k.encode('hex'))
-                    hosts[contact] = blobs
+        for k in data_store.keys():
+            for value, lastPublished, originallyPublished, originalPublisherID in \
+                    data_store.getPeerEntriesForBlob(k):
+                try:
+                    contact = self.session.dht_node._routingTable.getContact(
+                        originalPublisherID)
+                except ValueError:
+                    continue
+                if contact in hosts:
+                    blobs = hosts[contact]
+                else:
+                    blobs = []
+                blobs.append(k.encode('hex'))
+                hosts[contact] = blobs
 
         contact_set = []
         blob_hashes = []
@@ -3153,7 +3282,8 @@ class Daemon(AuthJSONRPCServer):
         response['sd_hash'] = sd_hash
         head_blob_hash = None
         downloader = self._get_single_peer_downloader()
-        have_sd_blob = sd_hash in self.session.blob_manager.blobs
+        sd_blob = yield self.session.blob_manager.get_known_blob(sd_hash)
+        have_sd_blob = sd_blob is not None and sd_blob.get_is_verified()
         try:
             sd_blob = yield self.jsonrpc_blob_get(sd_hash, timeout=blob_timeout,
                                                   encoding="json")
@@ -7,6 +7,7 @@ from twisted.cred import portal
 
 from lbrynet import conf
 from lbrynet.daemon.Daemon import Daemon
+from lbrynet.daemon.StreamResource import StreamResource
 from lbrynet.daemon.auth.auth import PasswordChecker, HttpPasswordRealm
 from lbrynet.daemon.auth.util import initialize_api_key_file
 
@@ -33,6 +34,7 @@ class DaemonServer(object):
         self.root.putChild("", self._daemon)
         # TODO: DEPRECATED, remove this and just serve the API at the root
         self.root.putChild(conf.settings['API_ADDRESS'], self._daemon)
+        self.root.putChild("stream", StreamResource(self._daemon))
 
         lbrynet_server = get_site_base(use_auth, self.root)
 
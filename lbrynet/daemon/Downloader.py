@@ -1,13 +1,11 @@
 import logging
 import os
 from twisted.internet import defer
-from twisted.internet.task import LoopingCall
 
 from lbryschema.fee import Fee
 
 from lbrynet.core.Error import InsufficientFundsError, KeyFeeAboveMaxAllowed
 from lbrynet.core.Error import DownloadDataTimeout, DownloadCanceledError, DownloadSDTimeout
-from lbrynet.core.utils import safe_start_looping_call, safe_stop_looping_call
 from lbrynet.core.StreamDescriptor import download_sd_blob
 from lbrynet.file_manager.EncryptedFileDownloader import ManagedEncryptedFileDownloaderFactory
 from lbrynet import conf
@@ -31,14 +29,17 @@ log = logging.getLogger(__name__)
 
 class GetStream(object):
     def __init__(self, sd_identifier, session, exchange_rate_manager,
-                 max_key_fee, disable_max_key_fee, data_rate=None, timeout=None):
+                 max_key_fee, disable_max_key_fee, data_rate=None, timeout=None, clock=None):
+        if clock is None:
+            from twisted.internet import reactor
+            clock = reactor
+        self.clock = clock
 
         self.timeout = timeout or conf.settings['download_timeout']
         self.data_rate = data_rate or conf.settings['data_rate']
         self.max_key_fee = max_key_fee or conf.settings['max_key_fee'][1]
         self.disable_max_key_fee = disable_max_key_fee or conf.settings['disable_max_key_fee']
         self.download_directory = conf.settings['download_directory']
-        self.timeout_counter = 0
         self.code = None
         self.sd_hash = None
         self.session = session
@@ -47,7 +48,7 @@ class GetStream(object):
         self.payment_rate_manager = self.session.payment_rate_manager
         self.sd_identifier = sd_identifier
         self.downloader = None
-        self.checker = LoopingCall(self.check_status)
+        self._timeout_call = None
 
         # fired when the download is complete
         self.finished_deferred = None
@@ -61,29 +62,29 @@ class GetStream(object):
     def _check_status(self, status):
         if status.num_completed > 0 and not self.data_downloading_deferred.called:
             self.data_downloading_deferred.callback(True)
-        if self.data_downloading_deferred.called:
-            safe_stop_looping_call(self.checker)
-        else:
-            log.debug("Waiting for stream data (%i seconds)", self.timeout_counter)
 
-    def check_status(self):
+    def _blob_downloaded(self, blob, blob_num):
+        if not self.data_downloading_deferred.called:
+            self.data_downloading_deferred.callback(True)
+
+    def _timed_out(self):
         """
-        Check if we've got the first data blob in the stream yet
+        Fail if we haven't got the first data blob in the stream by now
         """
-        self.timeout_counter += 1
-        if self.timeout_counter > self.timeout:
-            if not self.data_downloading_deferred.called:
-                if self.downloader:
-                    err = DownloadDataTimeout(self.sd_hash)
-                else:
-                    err = DownloadSDTimeout(self.sd_hash)
-                self.data_downloading_deferred.errback(err)
-            safe_stop_looping_call(self.checker)
-        elif self.downloader:
-            d = self.downloader.status()
-            d.addCallback(self._check_status)
-        else:
-            log.debug("Waiting for stream descriptor (%i seconds)", self.timeout_counter)
+        self._timeout_call = None
+        if not self.data_downloading_deferred.called:
+            if self.downloader:
+                err = DownloadDataTimeout(self.sd_hash)
+            else:
+                err = DownloadSDTimeout(self.sd_hash)
+            self.data_downloading_deferred.errback(err)
+
+    def _stop_waiting_for_data(self):
+        if self._timeout_call is not None and self._timeout_call.active():
+            self._timeout_call.cancel()
+        self._timeout_call = None
+        if self.downloader:
+            self.downloader.remove_progress_listener(self._blob_downloaded)
 
     def convert_max_fee(self):
         currency, amount = self.max_key_fee['currency'], self.max_key_fee['amount']
@@ -147,13 +148,13 @@ class GetStream(object):
         self.set_status(DOWNLOAD_STOPPED_CODE, name)
         log.info("Finished downloading lbry://%s (%s) --> %s", name, self.sd_hash[:6],
                  self.download_path)
-        safe_stop_looping_call(self.checker)
+        self._stop_waiting_for_data()
         status = yield self.downloader.status()
         self._check_status(status)
         defer.returnValue(self.download_path)
 
     def fail(self, err):
-        safe_stop_looping_call(self.checker)
+        self._stop_waiting_for_data()
         raise err
 
     @defer.inlineCallbacks
@@ -202,18 +203,21 @@ class GetStream(object):
         self.set_status(INITIALIZING_CODE, name)
         key_fee = yield self._initialize(stream_info)
 
-        safe_start_looping_call(self.checker, 1)
-        self.set_status(DOWNLOAD_METADATA_CODE, name)
-        sd_blob = yield self._download_sd_blob()
+        self._timeout_call = self.clock.callLater(self.timeout, self._timed_out)
+        try:
+            self.set_status(DOWNLOAD_METADATA_CODE, name)
+            sd_blob = yield self._download_sd_blob()
 
-        yield self._download(sd_blob, name, key_fee, txid, nout, file_name)
-        self.set_status(DOWNLOAD_RUNNING_CODE, name)
+            yield self._download(sd_blob, name, key_fee, txid, nout, file_name)
+            self.set_status(DOWNLOAD_RUNNING_CODE, name)
 
-        try:
+            # wait for the downloader to tell us it has downloaded a blob, unless it already has
+            self.downloader.add_progress_listener(self._blob_downloaded)
+            status = yield self.downloader.status()
+            self._check_status(status)
             yield self.data_downloading_deferred
-        except DownloadDataTimeout as err:
-            safe_stop_looping_call(self.checker)
-            raise err
+        finally:
+            self._stop_waiting_for_data()
 
         defer.returnValue((self.downloader, self.finished_deferred))
 
@@ -0,0 +1,135 @@
+"""
+Queue the progress events of lbry files for json-rpc clients, so they can wait for them instead
+of polling file_list
+"""
+import binascii
+import logging
+import os
+from collections import deque
+
+from twisted.internet import defer
+
+log = logging.getLogger(__name__)
+
+
+class Subscription(object):
+    def __init__(self, sd_hash=None, max_events=None):
+        self.sd_hash = sd_hash
+        self.events = deque(maxlen=max_events)
+        self.waiter = None  # Deferred of a client waiting for events
+        self.timeout_call = None  # fires the waiter with no events
+        self.expire_call = None  # removes the subscription if no client waits for its events
+
+    def wants(self, event):
+        return self.sd_hash is None or self.sd_hash == event['sd_hash']
+
+    def pop_events(self):
+        events = list(self.events)
+        self.events.clear()
+        return events
+
+
+class ProgressSubscriptions(object):
+    """
+    Keeps the events of the file manager progress listener for each subscription until a client
+    gets them
+
+    A client waiting for the events of a subscription gets them as soon as there are any, or an
+    empty list after a timeout. Subscriptions that nobody has waited on for EXPIRE_AFTER seconds
+    are removed, and only the last MAX_EVENTS events of a subscription are kept.
+    """
+
+    EXPIRE_AFTER = 300
+    MAX_EVENTS = 1000
+
+    def __init__(self, clock=None):
+        if clock is None:
+            from twisted.internet import reactor
+            clock = reactor
+        self.clock = clock
+        self._subscriptions = {}  # {subscription id: Subscription}
+
+    def subscribe(self, sd_hash=None):
+        """
+        Start queuing the progress events of the file with the given sd hash, or of every file
+
+        @return: the id of the subscription
+        """
+        subscription_id = binascii.hexlify(os.urandom(16))
+        self._subscriptions[subscription_id] = Subscription(sd_hash, self.MAX_EVENTS)
+        self._schedule_expiry(subscription_id)
+        return subscription_id
+
+    def unsubscribe(self, subscription_id):
+        subscription = self._get_subscription(subscription_id)
+        del self._subscriptions[subscription_id]
+        self._cancel(subscription.expire_call)
+        self._fire_waiter(subscription)
+
+    def get_events(self, subscription_id, timeout):
+        """
+        Get the events queued since the last call, or wait up to timeout seconds for the next one
+
+        @return: Deferred which fires with a list of event dicts
+        """
+        subscription = self._get_subscription(subscription_id)
+        # only one client at a time can wait on a subscription
+        self._fire_waiter(subscription)
+        if subscription.events:
+            self._schedule_expiry(subscription_id)
+            return defer.succeed(subscription.pop_events())
+        self._cancel(subscription.expire_call)
+        subscription.expire_call = None
+        d = subscription.waiter = defer.Deferred()
+        subscription.timeout_call = self.clock.callLater(timeout, self._fire_waiter,
+                                                         subscription)
+        d.addBoth(self._finished_waiting, subscription_id)
+        return d
+
+    def add_event(self, event):
+        """Progress listener for the file manager"""
+        event = dict(event, time=self.clock.seconds())
+        for subscription in self._subscriptions.itervalues():
+            if subscription.wants(event):
+                subscription.events.append(event)
+                if subscription.waiter is not None:
+                    self._fire_waiter(subscription)
+
+    def stop(self):
+        for subscription_id in self._subscriptions.keys():
+            self.unsubscribe(subscription_id)
+
+    def _get_subscription(self, subscription_id):
+        if subscription_id not in self._subscriptions:
+            raise Exception("Unknown subscription: %s" % subscription_id)
+        return self._subscriptions[subscription_id]
+
+    def _fire_waiter(self, subscription):
+        self._cancel(subscription.timeout_call)
+        subscription.timeout_call = None
+        waiter, subscription.waiter = subscription.waiter, None
+        if waiter is not None:
+            waiter.callback(subscription.pop_events())
+
+    def _finished_waiting(self, result, subscription_id):
+        if subscription_id in self._subscriptions:
+            self._schedule_expiry(subscription_id)
+        return result
+
+    def _schedule_expiry(self, subscription_id):
+        subscription = self._subscriptions[subscription_id]
+        self._cancel(subscription.expire_call)
+        subscription.expire_call = self.clock.callLater(self.EXPIRE_AFTER, self._expire,
+                                                        subscription_id)
+
+    def _expire(self, subscription_id):
+        subscription = self._subscriptions.pop(subscription_id, None)
+        if subscription is not None:
+            log.debug("Subscription %s expired", subscription_id)
+            subscription.expire_call = None
+            self._fire_waiter(subscription)
+
+    @staticmethod
+    def _cancel(call):
+        if call is not None and call.active():
+            call.cancel()
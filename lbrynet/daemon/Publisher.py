@@ -1,11 +1,13 @@
 import logging
 import mimetypes
+import multiprocessing
 import os
 
 from twisted.internet import defer
 
+from lbrynet import conf
 from lbrynet.core import file_utils
-from lbrynet.file_manager.EncryptedFileCreator import create_lbry_file
+from lbrynet.file_manager.EncryptedFileCreator import create_lbry_file, EncryptedFileStreamCreator
 
 log = logging.getLogger(__name__)
 
@@ -17,6 +19,7 @@ class Publisher(object):
         self.wallet = wallet
         self.certificate_id = certificate_id
         self.lbry_file = None
+        self.lbry_file_creator = None
 
     @defer.inlineCallbacks
     def create_and_publish_stream(self, name, bid, claim_dict, file_path, claim_address=None,
@@ -29,9 +32,14 @@ class Publisher(object):
             raise Exception("Cannot publish empty file {}".format(file_path))
 
         file_name = os.path.basename(file_path)
+        self.lbry_file_creator = EncryptedFileStreamCreator(
+            self.session.blob_manager, self.lbry_file_manager, file_name,
+            workers=get_publish_workers(), split_file=True
+        )
         with file_utils.get_read_handle(file_path) as read_handle:
             self.lbry_file = yield create_lbry_file(self.session, self.lbry_file_manager, file_name,
-                                                    read_handle)
+                                                    read_handle,
+                                                    lbry_file_creator=self.lbry_file_creator)
 
         if 'source' not in claim_dict['stream']:
             claim_dict['stream']['source'] = {}
@@ -46,6 +54,14 @@ class Publisher(object):
         yield self.lbry_file.get_claim_info()
         defer.returnValue(claim_out)
 
+    def get_progress(self):
+        """Get the progress of creating the stream, None if a stream isn't being created"""
+        if self.lbry_file_creator is None or self.lbry_file is not None:
+            return None
+        progress = {'file_name': self.lbry_file_creator.name}
+        progress.update(self.lbry_file_creator.get_progress())
+        return progress
+
     @defer.inlineCallbacks
     def publish_stream(self, name, bid, claim_dict, stream_hash, claim_address=None, change_address=None):
         """Make a claim without creating a lbry file"""
@@ -62,5 +78,15 @@ class Publisher(object):
         defer.returnValue(claim_out)
 
 
+def get_publish_workers():
+    workers = conf.settings['publish_workers']
+    if workers > 0:
+        return workers
+    try:
+        return multiprocessing.cpu_count()
+    except NotImplementedError:
+        return 2
+
+
 def get_content_type(filename):
     return mimetypes.guess_type(filename)[0] or 'application/octet-stream'
@@ -0,0 +1,326 @@
+"""
+Serve the decrypted content of lbry files over http, while they are being downloaded
+"""
+import binascii
+import bisect
+import logging
+import mimetypes
+import re
+
+from cryptography.hazmat.primitives.ciphers import Cipher, modes
+from cryptography.hazmat.primitives.ciphers.algorithms import AES
+from twisted.internet import defer
+from twisted.internet.interfaces import IPushProducer
+from twisted.web import http, resource, server
+from zope.interface import implements
+
+from lbrynet.blob.blob_file import MAX_BLOB_SIZE
+from lbrynet.cryptstream.CryptBlob import StreamBlobDecryptor, backend
+
+log = logging.getLogger(__name__)
+
+BLOCK_SIZE = AES.block_size / 8
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class StreamResource(resource.Resource):
+    """
+    Serves the content of the lbry file of a stream at /stream/<sd hash>
+
+    Single byte ranges are supported so players can seek. Only the blobs of the requested
+    range are read, the blobs that haven't been downloaded yet are downloaded before the
+    other blobs of the stream, and each blob is decrypted from the blob store as it is sent.
+    """
+
+    isLeaf = True
+
+    def __init__(self, daemon):
+        resource.Resource.__init__(self)
+        self._daemon = daemon
+
+    def render_GET(self, request):
+        d = self._stream(request)
+        d.addErrback(self._stream_failed, request)
+        return server.NOT_DONE_YET
+
+    # twisted would otherwise render HEAD requests as GET, and finish them before the headers
+    # are known
+    render_HEAD = render_GET
+
+    @defer.inlineCallbacks
+    def _stream(self, request):
+        lbry_file = None
+        if len(request.postpath) == 1 and self._daemon.lbry_file_manager is not None:
+            lbry_files = self._daemon.lbry_file_manager.lbry_files.find(stop=1,
+                                                                       sd_hash=request.postpath[0])
+            if lbry_files:
+                lbry_file = lbry_files[0]
+        if lbry_file is None:
+            self._finish_with_error(request, http.NOT_FOUND, "no lbry file for that sd hash")
+            return
+
+        producer = StreamProducer(lbry_file, self._daemon.lbry_file_manager)
+        request.notifyFinish().addErrback(lambda _: producer.stopProducing())
+        range_header = request.getHeader('range')
+        yield producer.get_size(range_header)
+        try:
+            byte_range = parse_range(range_header, producer.size)
+        except ValueError:
+            request.setHeader('content-range', 'bytes */%i' % producer.size)
+            self._finish_with_error(request, http.REQUESTED_RANGE_NOT_SATISFIABLE,
+                                    "range not satisfiable")
+            return
+
+        if byte_range is None:
+            start, end = 0, producer.size - 1
+        else:
+            start, end = byte_range
+            request.setResponseCode(http.PARTIAL_CONTENT)
+            request.setHeader('content-range', 'bytes %i-%i/%i' % (start, end, producer.size))
+        file_name = getattr(lbry_file, 'suggested_file_name', None) or lbry_file.file_name
+        content_type = mimetypes.guess_type(file_name)[0] or 'application/octet-stream'
+        request.setHeader('accept-ranges', 'bytes')
+        request.setHeader('content-type', content_type)
+        request.setHeader('content-length', str(max(0, end - start + 1)))
+        if request.method == 'HEAD':
+            request.finish()
+            return
+        request.registerProducer(producer, True)
+        yield producer.send(request.write, start, end + 1)
+        if not producer.stopped:
+            request.unregisterProducer()
+            request.finish()
+
+    @staticmethod
+    def _finish_with_error(request, code, message):
+        request.setResponseCode(code)
+        request.setHeader('content-type', 'text/plain')
+        request.write(message)
+        request.finish()
+
+    @staticmethod
+    def _stream_failed(err, request):
+        if err.check(defer.CancelledError) or request._disconnected:
+            return
+        log.error("Failed to stream %s: %s", request.path, err.getTraceback())
+        if not request.startedWriting:
+            StreamResource._finish_with_error(request, http.INTERNAL_SERVER_ERROR,
+                                              err.getErrorMessage())
+        else:
+            # the response is cut short, the client can tell from the content length
+            request.unregisterProducer()
+            request.loseConnection()
+
+
+class StreamProducer(object):
+    """
+    Writes a byte range of the plaintext of a stream, decrypting the blobs as they are needed
+
+    The blobs of a stream hold MAX_BLOB_SIZE - 1 bytes of plaintext each, except for the last
+    one, so where each blob starts is known from the blob lengths. The plaintext length of the
+    last blob (and of any other blob that isn't full) is read from its padding.
+    """
+
+    implements(IPushProducer)
+
+    def __init__(self, lbry_file, lbry_file_manager):
+        self.lbry_file = lbry_file
+        self.lbry_file_manager = lbry_file_manager
+        self.blob_manager = lbry_file.blob_manager
+        self.blob_infos = []
+        self.offsets = []  # where the plaintext of each blob starts
+        self.size = None
+        self.stopped = False
+        self._paused = None
+        self._waiting = None
+
+    @defer.inlineCallbacks
+    def get_size(self, range_header=None):
+        """
+        Get the blobs of the stream and the size of its plaintext
+
+        The blobs needed to know the size, along with the first blob of the range that is going
+        to be requested, are downloaded before the rest of the stream.
+        """
+        blob_infos = yield self.lbry_file.storage.get_blobs_for_stream(self.lbry_file.stream_hash)
+        self.blob_infos = [blob_info for blob_info in blob_infos if blob_info.length]
+        last = len(self.blob_infos) - 1
+        not_full = [i for i, blob_info in enumerate(self.blob_infos)
+                    if blob_info.length != MAX_BLOB_SIZE or i == last]
+        # a blob holds at least one byte less than its length because of the padding
+        lengths = [blob_info.length - 1 for blob_info in self.blob_infos]
+        if any(not self._is_available(self.blob_infos[i]) for i in not_full):
+            self._set_lengths(lengths)
+            try:
+                estimated_range = parse_range(range_header, self.size)
+            except ValueError:
+                estimated_range = None
+            first_blob = self._blob_index(estimated_range[0]) if estimated_range else 0
+            self._prioritize([first_blob] + not_full)
+        for i in not_full:
+            lengths[i] = yield self._read_plaintext_length(self.blob_infos[i])
+        self._set_lengths(lengths)
+        defer.returnValue(self.size)
+
+    @defer.inlineCallbacks
+    def send(self, write_func, start, end):
+        """
+        Write the plaintext from start to end (exclusive), waiting for blobs that aren't
+        downloaded yet. get_size must have been called first.
+        """
+        if start >= end:
+            return
+        first_blob, last_blob = self._blob_index(start), self._blob_index(end - 1)
+        self._prioritize(range(first_blob, last_blob + 1))
+        for i in range(first_blob, last_blob + 1):
+            blob_start = self.offsets[i]
+            blob_end = self.offsets[i + 1] if i + 1 < len(self.offsets) else self.size
+            yield self._wait_for_blob(self.blob_infos[i])
+            blob = yield self.blob_manager.get_blob(self.blob_infos[i].blob_hash,
+                                                    self.blob_infos[i].length)
+            reader = blob.open_for_reading()
+            if reader is None:
+                raise ValueError("blob %s isn't available" % blob.blob_hash)
+            try:
+                chunks = decrypt_blob_range(reader, self.lbry_file.key,
+                                            binascii.unhexlify(self.blob_infos[i].iv),
+                                            max(start, blob_start) - blob_start,
+                                            min(end, blob_end) - blob_start)
+                for chunk in chunks:
+                    if self.stopped:
+                        return
+                    write_func(chunk)
+                    if self._paused is not None:
+                        yield self._paused
+            finally:
+                reader.close()
+
+    def pauseProducing(self):
+        if self._paused is None:
+            self._paused = defer.Deferred()
+
+    def resumeProducing(self):
+        self._paused, paused = None, self._paused
+        if paused is not None:
+            paused.callback(None)
+
+    def stopProducing(self):
+        self.stopped = True
+        if self._waiting is not None:
+            self._waiting.cancel()
+        self.resumeProducing()
+
+    def _set_lengths(self, lengths):
+        self.offsets = []
+        self.size = 0
+        for length in lengths:
+            self.offsets.append(self.size)
+            self.size += length
+
+    def _blob_index(self, offset):
+        return max(0, bisect.bisect_right(self.offsets, offset) - 1)
+
+    def _is_available(self, blob_info):
+        return blob_info.blob_hash in self.blob_manager.verified_blob_hashes
+
+    def _prioritize(self, blob_indexes):
+        to_download = [self.blob_infos[i].blob_hash for i in blob_indexes
+                       if not self._is_available(self.blob_infos[i])]
+        if not to_download:
+            return
+        if self.lbry_file.stopped:
+            log.info("Starting %s to stream it", self.lbry_file.sd_hash)
+            d = self.lbry_file_manager.toggle_lbry_file_running(self.lbry_file)
+            d.addErrback(lambda err: log.warning("Failed to start %s: %s",
+                                                 self.lbry_file.sd_hash, err.getErrorMessage()))
+        if self.lbry_file.blob_requester is not None:
+            self.lbry_file.blob_requester.prioritize_blobs(to_download)
+
+    @defer.inlineCallbacks
+    def _wait_for_blob(self, blob_info):
+        if self._is_available(blob_info):
+            return
+        self._waiting = self.blob_manager.wait_for_blob(blob_info.blob_hash)
+        try:
+            yield self._waiting
+        finally:
+            self._waiting = None
+
+    @defer.inlineCallbacks
+    def _read_plaintext_length(self, blob_info):
+        yield self._wait_for_blob(blob_info)
+        blob = yield self.blob_manager.get_blob(blob_info.blob_hash, blob_info.length)
+        reader = blob.open_for_reading()
+        if reader is None:
+            raise ValueError("blob %s isn't available" % blob.blob_hash)
+        try:
+            if blob_info.length > BLOCK_SIZE:
+                reader.seek(blob_info.length - 2 * BLOCK_SIZE)
+                iv = reader.read(BLOCK_SIZE)
+            else:
+                iv = binascii.unhexlify(blob_info.iv)
+            last_block = reader.read(BLOCK_SIZE)
+        finally:
+            reader.close()
+        decryptor = Cipher(AES(self.lbry_file.key), modes.CBC(iv), backend=backend).decryptor()
+        padded = decryptor.update(last_block) + decryptor.finalize()
+        defer.returnValue(blob_info.length - ord(padded[-1]))
+
+
+def decrypt_blob_range(reader, key, iv, start, end):
+    """
+    Decrypt part of the plaintext of a blob
+
+    CBC decryption only needs the previous cipher block, so decryption starts at the block
+    holding the start of the range.
+
+    @param reader: the reader of the blob, positioned at the start of the blob
+    @param key: the raw AES key of the stream
+    @param iv: the raw initialization vector of the blob
+    @param start: offset in the plaintext of the blob to start from
+    @param end: offset in the plaintext of the blob to stop at (exclusive)
+
+    @return: iterator of plaintext strings of up to StreamBlobDecryptor.CHUNK_SIZE bytes
+    """
+    block_start = start - start % BLOCK_SIZE
+    if block_start:
+        reader.seek(block_start - BLOCK_SIZE)
+        iv = reader.read(BLOCK_SIZE)
+    block_end = end + (-end % BLOCK_SIZE)
+    decryptor = Cipher(AES(key), modes.CBC(iv), backend=backend).decryptor()
+    position = block_start
+    while position < block_end:
+        data = reader.read(min(StreamBlobDecryptor.CHUNK_SIZE, block_end - position))
+        if not data:
+            raise ValueError("blob ended before the end of the range")
+        plaintext = decryptor.update(data)
+        yield plaintext[max(start - position, 0):end - position]
+        position += len(data)
+
+
+def parse_range(range_header, size):
+    """
+    Get the first range of a Range header as (start, end), end inclusive
+
+    Returns None if the whole content should be sent, which is the case when there is no range
+    header or it isn't a byte range. Raises ValueError if the range can't be satisfied.
+    """
+    if not range_header:
+        return None
+    match = RANGE_RE.match(range_header.split(',')[0].strip())
+    if match is None:
+        return None
+    start, end = match.groups()
+    if not start:
+        if not end:
+            return None
+        suffix = int(end)
+        if not suffix:
+            raise ValueError("empty suffix range")
+        start, end = max(0, size - suffix), size - 1
+    else:
+        start = int(start)
+        end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise ValueError("range %s is outside of %i bytes" % (range_header, size))
+    return start, end
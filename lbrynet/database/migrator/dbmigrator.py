@@ -19,6 +19,9 @@ def migrate_db(db_dir, start, end):
         elif current == 5:
             from lbrynet.database.migrator.migrate5to6 import do_migration
             do_migration(db_dir)
+        elif current == 6:
+            from lbrynet.database.migrator.migrate6to7 import do_migration
+            do_migration(db_dir)
         else:
             raise Exception("DB migration of version {} to {} is not available".format(current,
                                                                                        current+1))
@@ -0,0 +1,27 @@
+import sqlite3
+import os
+import logging
+
+log = logging.getLogger(__name__)
+
+
+def do_migration(db_dir):
+    log.info("Doing the migration")
+    add_stream_blob_position_index(db_dir)
+    log.info("Migration succeeded")
+
+
+def add_stream_blob_position_index(db_dir):
+    """
+    Add a covering index for looking up the blobs of a stream ordered by position
+    """
+
+    db_path = os.path.join(db_dir, "lbrynet.sqlite")
+    connection = sqlite3.connect(db_path)
+    cursor = connection.cursor()
+    cursor.execute(
+        "create index if not exists stream_blob_position_idx "
+        "on stream_blob (stream_hash, position, blob_hash, iv)"
+    )
+    connection.commit()
+    connection.close()
@@ -2,10 +2,13 @@ import logging
 import os
 import time
 import sqlite3
+import threading
 import traceback
+import Queue
 from decimal import Decimal
 from twisted.internet import defer, task, reactor, threads
 from twisted.enterprise import adbapi
+from twisted.python.failure import Failure
 
 from lbryschema.claim import ClaimDict
 from lbryschema.decode import smart_decode
@@ -92,15 +95,213 @@ def rerun_if_locked(f):
     return wrapper
 
 
-class SqliteConnection(adbapi.ConnectionPool):
+def _set_query_only(connection):
+    connection.execute("pragma query_only=1")
+
+
+class SqliteReadPool(adbapi.ConnectionPool):
+    """
+    A pool of query only connections, in WAL mode these never block (or get blocked by) the writer
+    """
+
     def __init__(self, db_path):
-        adbapi.ConnectionPool.__init__(self, 'sqlite3', db_path, check_same_thread=False)
+        adbapi.ConnectionPool.__init__(self, 'sqlite3', db_path, check_same_thread=False,
+                                       cp_openfun=_set_query_only)
 
     @rerun_if_locked
     def runInteraction(self, interaction, *args, **kw):
         return adbapi.ConnectionPool.runInteraction(self, interaction, *args, **kw)
 
 
+def _claim_response(outpoint, claim_id, name, amount, height, serialized, channel_id, address, claim_sequence):
+    r = {
+        "name": name,
+        "claim_id": claim_id,
+        "address": address,
+        "claim_sequence": claim_sequence,
+        "value": ClaimDict.deserialize(serialized.decode('hex')).claim_dict,
+        "height": height,
+        "amount": float(Decimal(amount) / Decimal(COIN)),
+        "nout": int(outpoint.split(":")[1]),
+        "txid": outpoint.split(":")[0],
+        "channel_claim_id": channel_id,
+        "channel_name": None
+    }
+    return r
+
+
+def _run_operation(transaction, query, args):
+    transaction.execute(query, args)
+
+
+def _run_script(transaction, script):
+    transaction.executescript(script)
+
+
+class SqliteWriter(object):
+    """
+    Runs every write on one thread with its own connection
+
+    When writes are queuing up, the interactions queued within batch_interval seconds of each
+    other (up to max_batch_size of them) are run in a single transaction, each inside of its
+    own savepoint so that a failing interaction is rolled back without affecting the rest of
+    the batch. The deferred returned for an interaction fires once the transaction it was part
+    of has been committed.
+    """
+
+    def __init__(self, db_path, batch_interval=0.0, max_batch_size=1000):
+        self.db_path = db_path
+        self.batch_interval = batch_interval
+        self.max_batch_size = max_batch_size
+        self.transactions = 0
+        self.interactions = 0
+        self._queue = Queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="sqlite-writer")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def runInteraction(self, interaction, *args, **kw):
+        return self._put(True, interaction, args, kw)
+
+    def runOperation(self, query, args=()):
+        return self.runInteraction(_run_operation, query, args)
+
+    def runScript(self, script):
+        """
+        Run a sql script on its own, outside of a transaction (needed for pragmas like journal_mode)
+        """
+        return self._put(False, _run_script, (script, ), {})
+
+    def stop(self):
+        """
+        Finish the queued writes and stop the writer thread
+        """
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    def _put(self, in_transaction, interaction, args, kw):
+        d = defer.Deferred()
+        self._queue.put((in_transaction, interaction, args, kw, d))
+        return d
+
+    def _get_batch(self, first):
+        # a lone write is committed right away, once writes are queuing up keep collecting
+        # them for batch_interval so that they share a commit
+        batch = [first]
+        deadline = time.time() + self.batch_interval
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.time()
+            try:
+                if timeout > 0 and len(batch) > 1:
+                    item = self._queue.get(timeout=timeout)
+                else:
+                    item = self._queue.get_nowait()
+            except Queue.Empty:
+                break
+            if item is None or not item[0]:
+                return batch, item
+            batch.append(item)
+        return batch, False
+
+    def _run(self):
+        connection = sqlite3.connect(self.db_path, isolation_level=None)
+        try:
+            item = self._queue.get()
+            while item is not None:
+                if item[0]:
+                    batch, item = self._get_batch(item)
+                    self._run_batch(connection, batch)
+                    if item is False:
+                        item = self._queue.get()
+                else:
+                    self._run_batch(connection, [item], in_transaction=False)
+                    item = self._queue.get()
+        finally:
+            connection.close()
+
+    def _run_batch(self, connection, batch, in_transaction=True):
+        # an error running the batch (for instance if sqlite has already rolled back the
+        # transaction after a disk error) fails the whole batch, but not the writer thread
+        try:
+            results = self._execute_batch(connection, batch, in_transaction)
+        except Exception:
+            log.exception("failed to run %i database writes", len(batch))
+            err = Failure()
+            if in_transaction:
+                self._rollback(connection)
+            results = [(False, err) for _ in batch]
+        if in_transaction:
+            self.transactions += 1
+        self.interactions += len(batch)
+        for (success, result), (_, _, _, _, d) in zip(results, batch):
+            reactor.callFromThread(d.callback if success else d.errback, result)
+
+    @staticmethod
+    def _execute_batch(connection, batch, in_transaction):
+        results = []
+        if in_transaction:
+            connection.execute("begin")
+        for _, interaction, args, kw, _ in batch:
+            cursor = connection.cursor()
+            if in_transaction:
+                cursor.execute("savepoint interaction")
+            try:
+                results.append((True, interaction(cursor, *args, **kw)))
+            except Exception:
+                results.append((False, Failure()))
+                if in_transaction:
+                    cursor.execute("rollback to interaction")
+            if in_transaction:
+                cursor.execute("release interaction")
+        if in_transaction:
+            connection.execute("commit")
+        return results
+
+    @staticmethod
+    def _rollback(connection):
+        try:
+            connection.execute("rollback")
+        except sqlite3.Error as err:
+            # sqlite may have rolled the transaction back already
+            log.warning("failed to roll back database writes: %s", err)
+
+
+class SqliteConnection(object):
+    """
+    Sends reads to a pool of query only connections and writes to a single writer thread
+
+    Interactions that write, or that need to read what they are about to write, must use
+    runInteraction. Interactions that only read should use runReadInteraction.
+    """
+
+    # once writes are queuing up, collect them for this many seconds so they share a commit
+    WRITE_BATCH_INTERVAL = 0.005
+
+    def __init__(self, db_path):
+        self.reader = SqliteReadPool(db_path)
+        self.writer = SqliteWriter(db_path, batch_interval=self.WRITE_BATCH_INTERVAL)
+
+    def runQuery(self, query, args=()):
+        return self.reader.runQuery(query, args)
+
+    def runReadInteraction(self, interaction, *args, **kw):
+        return self.reader.runInteraction(interaction, *args, **kw)
+
+    def runOperation(self, query, args=()):
+        return self.writer.runOperation(query, args)
+
+    def runInteraction(self, interaction, *args, **kw):
+        return self.writer.runInteraction(interaction, *args, **kw)
+
+    def runScript(self, script):
+        return self.writer.runScript(script)
+
+    def close(self):
+        self.writer.stop()
+        self.reader.close()
+
+
 class SQLiteStorage(object):
     CREATE_TABLES_QUERY = """
             pragma foreign_keys=on;
@@ -129,6 +330,9 @@ class SQLiteStorage(object):
                 iv char(32) not null,
                 primary key (stream_hash, blob_hash)
             );
+
+            create index if not exists stream_blob_position_idx
+                on stream_blob (stream_hash, position, blob_hash, iv);
             
             create table if not exists claim (
                 claim_outpoint text not null primary key,
@@ -171,9 +375,7 @@ class SQLiteStorage(object):
         self.db = SqliteConnection(self._db_path)
 
     def setup(self):
-        def _create_tables(transaction):
-            transaction.executescript(self.CREATE_TABLES_QUERY)
-        return self.db.runInteraction(_create_tables)
+        return self.db.runScript(self.CREATE_TABLES_QUERY)
 
     @defer.inlineCallbacks
     def run_and_return_one_or_none(self, query, *args):
@@ -197,15 +399,39 @@ class SQLiteStorage(object):
 
     # # # # # # # # # blob functions # # # # # # # # #
 
-    @defer.inlineCallbacks
     def add_completed_blob(self, blob_hash, length, next_announce_time, should_announce):
         log.debug("Adding a completed blob. blob_hash=%s, length=%i", blob_hash, length)
-        yield self.add_known_blob(blob_hash, length)
-        yield self.set_blob_status(blob_hash, "finished")
-        yield self.set_should_announce(blob_hash, next_announce_time, should_announce)
-        yield self.db.runOperation(
-            "update blob set blob_length=? where blob_hash=?", (length, blob_hash)
-        )
+
+        def _add_completed_blob(transaction):
+            transaction.execute("insert or ignore into blob values (?, ?, ?, ?, ?)",
+                                (blob_hash, length, 0, 0, "pending"))
+            transaction.execute(
+                "update blob set blob_length=?, next_announce_time=?, should_announce=?, status=? "
+                "where blob_hash=?",
+                (length, next_announce_time, 1 if should_announce else 0, "finished", blob_hash)
+            )
+        return self.db.runInteraction(_add_completed_blob)
+
+    def add_completed_blobs(self, blob_infos):
+        """
+        Add completed blobs in one transaction
+
+        :param blob_infos: list of (blob hash, length, next announce time, should announce)
+        """
+        log.debug("Adding %i completed blobs", len(blob_infos))
+
+        def _add_completed_blobs(transaction):
+            transaction.executemany(
+                "insert or ignore into blob values (?, ?, ?, ?, ?)",
+                [(blob_hash, length, 0, 0, "pending") for blob_hash, length, _, _ in blob_infos]
+            )
+            transaction.executemany(
+                "update blob set blob_length=?, next_announce_time=?, should_announce=?, status=? "
+                "where blob_hash=?",
+                [(length, next_announce_time, 1 if should_announce else 0, "finished", blob_hash)
+                 for blob_hash, length, next_announce_time, should_announce in blob_infos]
+            )
+        return self.db.runInteraction(_add_completed_blobs)
 
     def set_should_announce(self, blob_hash, next_announce_time, should_announce):
         should_announce = 1 if should_announce else 0
@@ -224,14 +450,14 @@ class SQLiteStorage(object):
             "select status from blob where blob_hash=?", blob_hash
         )
 
-    @defer.inlineCallbacks
     def add_known_blob(self, blob_hash, length):
-        status = yield self.get_blob_status(blob_hash)
-        if status is None:
-            status = "pending"
-            yield self.db.runOperation("insert into blob values (?, ?, ?, ?, ?)",
-                                       (blob_hash, length, 0, 0, status))
-        defer.returnValue(status)
+        def _add_known_blob(transaction):
+            transaction.execute("insert or ignore into blob values (?, ?, ?, ?, ?)",
+                                (blob_hash, length, 0, 0, "pending"))
+            return transaction.execute(
+                "select status from blob where blob_hash=?", (blob_hash, )
+            ).fetchone()[0]
+        return self.db.runInteraction(_add_known_blob)
 
     def should_announce(self, blob_hash):
         return self.run_and_return_one_or_none(
@@ -282,6 +508,9 @@ class SQLiteStorage(object):
     def get_all_blob_hashes(self):
         return self.run_and_return_list("select blob_hash from blob")
 
+    def get_all_finished_blobs(self):
+        return self.run_and_return_list("select blob_hash from blob where status=?", "finished")
+
     # # # # # # # # # stream blob functions # # # # # # # # #
 
     def add_blobs_to_stream(self, stream_hash, blob_infos):
@@ -292,11 +521,13 @@ class SQLiteStorage(object):
                                      blob_info['blob_num'], blob_info['iv']))
         return self.db.runInteraction(_add_stream_blobs)
 
-    @defer.inlineCallbacks
     def add_known_blobs(self, blob_infos):
-        for blob_info in blob_infos:
-            if blob_info.get('blob_hash') and blob_info['length']:
-                yield self.add_known_blob(blob_info['blob_hash'], blob_info['length'])
+        def _add_known_blobs(transaction):
+            for blob_info in blob_infos:
+                if blob_info.get('blob_hash') and blob_info['length']:
+                    transaction.execute("insert or ignore into blob values (?, ?, ?, ?, ?)",
+                                        (blob_info['blob_hash'], blob_info['length'], 0, 0, "pending"))
+        return self.db.runInteraction(_add_known_blobs)
 
     # # # # # # # # # stream functions # # # # # # # # #
 
@@ -368,24 +599,18 @@ class SQLiteStorage(object):
             stream_hash, blob_num
         )
 
+    @defer.inlineCallbacks
     def get_blobs_for_stream(self, stream_hash):
-        def _get_blobs_for_stream(transaction):
-            crypt_blob_infos = []
-            stream_blobs = transaction.execute("select blob_hash, position, iv from stream_blob "
-                                               "where stream_hash=?", (stream_hash, )).fetchall()
-            if stream_blobs:
-                for blob_hash, position, iv in stream_blobs:
-                    if blob_hash is not None:
-                        blob_length = transaction.execute("select blob_length from blob "
-                                                          "where blob_hash=?",
-                                                          (blob_hash,)).fetchone()
-                        blob_length = 0 if not blob_length else blob_length[0]
-                        crypt_blob_infos.append(CryptBlobInfo(blob_hash, position, blob_length, iv))
-                    else:
-                        crypt_blob_infos.append(CryptBlobInfo(None, position, 0, iv))
-                crypt_blob_infos = sorted(crypt_blob_infos, key=lambda info: info.blob_num)
-            return crypt_blob_infos
-        return self.db.runInteraction(_get_blobs_for_stream)
+        stream_blobs = yield self.db.runQuery(
+            "select s.blob_hash, s.position, s.iv, b.blob_length from stream_blob s "
+            "left outer join blob b on b.blob_hash=s.blob_hash "
+            "where s.stream_hash=? order by s.position",
+            (stream_hash, )
+        )
+        defer.returnValue([
+            CryptBlobInfo(blob_hash, position, blob_length or 0, iv)
+            for blob_hash, position, iv, blob_length in stream_blobs
+        ])
 
     def get_stream_of_blob(self, blob_hash):
         return self.run_and_return_one_or_none(
@@ -427,8 +652,17 @@ class SQLiteStorage(object):
         return self.run_and_return_one_or_none("select file_name from file where rowid=?", rowid)
 
     def get_all_lbry_files(self):
+        """
+        Get the files along with their streams and content claims (without supports), the
+        claims are in the same format as the results of get_claim, or None if the file has no
+        content claim
+        """
+
         def _lbry_file_dict(rowid, stream_hash, file_name, download_dir, data_rate, status, _, sd_hash, stream_key,
-                            stream_name, suggested_file_name):
+                            stream_name, suggested_file_name, *claim_info):
+            claim = None
+            if claim_info[0] is not None:
+                claim = _claim_response(*claim_info)
             return {
                 "row_id": rowid,
                 "stream_hash": stream_hash,
@@ -439,22 +673,35 @@ class SQLiteStorage(object):
                 "sd_hash": sd_hash,
                 "key": stream_key,
                 "stream_name": stream_name,
-                "suggested_file_name": suggested_file_name
+                "suggested_file_name": suggested_file_name,
+                "claim": claim
             }
 
         def _get_all_files(transaction):
-            return [
+            files = [
                 _lbry_file_dict(*file_info) for file_info in transaction.execute(
-                    "select file.rowid, file.*, stream.* "
-                    "from file inner join stream on file.stream_hash=stream.stream_hash"
+                    "select file.rowid, file.*, stream.*, claim.* "
+                    "from file inner join stream on file.stream_hash=stream.stream_hash "
+                    "left outer join content_claim on file.stream_hash=content_claim.stream_hash "
+                    "left outer join claim on content_claim.claim_outpoint=claim.claim_outpoint"
                 ).fetchall()
             ]
-
-        d = self.db.runInteraction(_get_all_files)
+            # the names of the channels of the claims, in one query instead of one per file
+            channel_names = dict(transaction.execute(
+                "select claim_id, claim_name from claim where claim_id in "
+                "(select channel_claim_id from claim where channel_claim_id is not null)"
+            ).fetchall())
+            for file_info in files:
+                if file_info['claim'] and file_info['claim']['channel_claim_id']:
+                    file_info['claim']['channel_name'] = channel_names.get(
+                        file_info['claim']['channel_claim_id'])
+            return files
+
+        d = self.db.runReadInteraction(_get_all_files)
         return d
 
     def change_file_status(self, rowid, new_status):
-        d = self.db.runQuery("update file set status=? where rowid=?", (new_status, rowid))
+        d = self.db.runOperation("update file set status=? where rowid=?", (new_status, rowid))
         d.addCallback(lambda _: new_status)
         return d
 
@@ -500,7 +747,7 @@ class SQLiteStorage(object):
                 ).fetchall()
             ]
 
-        return self.db.runInteraction(_get_supports)
+        return self.db.runReadInteraction(_get_supports)
 
     # # # # # # # # # claim functions # # # # # # # # #
 
@@ -578,7 +825,7 @@ class SQLiteStorage(object):
                 return None
             return claim_id[0]
 
-        content_claim_id = yield self.db.runInteraction(_get_content_claim)
+        content_claim_id = yield self.db.runReadInteraction(_get_content_claim)
         result = None
         if content_claim_id:
             result = yield self.get_claim(content_claim_id, include_supports)
@@ -586,22 +833,6 @@ class SQLiteStorage(object):
 
     @defer.inlineCallbacks
     def get_claim(self, claim_id, include_supports=True):
-        def _claim_response(outpoint, claim_id, name, amount, height, serialized, channel_id, address, claim_sequence):
-            r = {
-                "name": name,
-                "claim_id": claim_id,
-                "address": address,
-                "claim_sequence": claim_sequence,
-                "value": ClaimDict.deserialize(serialized.decode('hex')).claim_dict,
-                "height": height,
-                "amount": float(Decimal(amount) / Decimal(COIN)),
-                "nout": int(outpoint.split(":")[1]),
-                "txid": outpoint.split(":")[0],
-                "channel_claim_id": channel_id,
-                "channel_name": None
-            }
-            return r
-
         def _get_claim(transaction):
             claim_info = transaction.execute(
                 "select * from claim where claim_id=? order by height, rowid desc", (claim_id, )
@@ -615,7 +846,7 @@ class SQLiteStorage(object):
                     result['channel_name'] = channel_name_result[0]
             return result
 
-        result = yield self.db.runInteraction(_get_claim)
+        result = yield self.db.runReadInteraction(_get_claim)
         if include_supports:
             supports = yield self.get_supports(result['claim_id'])
             result['supports'] = supports
@@ -634,4 +865,4 @@ class SQLiteStorage(object):
                     "(select c2.claim_id from claim as c2)"
                 ).fetchall()
             ]
-        return self.db.runInteraction(_get_unknown_certificate_claim_ids)
+        return self.db.runReadInteraction(_get_unknown_certificate_claim_ids)
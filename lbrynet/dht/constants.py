@@ -55,6 +55,12 @@ checkRefreshInterval = refreshTimeout / 5
 #: be spread across several UDP packets.
 udpDatagramMaxSize = 8192  # 8 KB
 
+#: The maximum number of store RPCs a node sends without having had a response
+maxConcurrentStores = 20
+
+#: The interval at which a persistent datastore writes its peers to disk (in seconds)
+dataStoreSnapshotInterval = 600  # 10 minutes
+
 from lbrynet.core.cryptoutils import get_lbry_hash_obj
 
 h = get_lbry_hash_obj()
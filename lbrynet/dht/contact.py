@@ -7,6 +7,8 @@ class Contact(object):
 
     def __init__(self, id, ipAddress, udpPort, networkProtocol, firstComm=0):
         self.id = id
+        # the id as a long, used for calculating distances
+        self.long_id = long(id.encode('hex'), 16) if isinstance(id, str) else id
         self.address = ipAddress
         self.port = udpPort
         self._networkProtocol = networkProtocol
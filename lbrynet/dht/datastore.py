@@ -1,9 +1,16 @@
 import UserDict
+import heapq
+import logging
+import os
+import struct
 import time
 import constants
 from interface import IDataStore
+from twisted.internet import task, threads
 from zope.interface import implements
 
+log = logging.getLogger(__name__)
+
 
 class DictDataStore(UserDict.DictMixin):
     """ A datastore using an in-memory Python dictionary """
@@ -50,3 +57,177 @@ class DictDataStore(UserDict.DictMixin):
             self._dict[key] = [val for val in self._dict[key] if val[0] != value]
             if not self._dict[key]:
                 del self._dict[key]
+
+    def getPeerEntriesForBlob(self, key):
+        return list(self._dict.get(key, []))
+
+
+class PersistentDataStore(object):
+    """
+    An in-memory datastore that periodically writes a snapshot of itself to disk
+
+    Peers are kept per key in a dict keyed by their compact 6 byte address (4 byte ip
+    followed by a 2 byte port), so a peer announcing a blob again replaces its older entry.
+    The peer addresses and node ids are interned, so they are only held once no matter how
+    many blobs a peer announces. Expiry is indexed with time buckets of the keys that had
+    peers published during them, so removing expired peers only touches those keys.
+    """
+    implements(IDataStore)
+
+    bucket_size = 60
+    _record = struct.Struct('>HHHHII')
+
+    def __init__(self, snapshot_path, snapshot_interval=constants.dataStoreSnapshotInterval):
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+        # { <key>: { <compact peer>: (<peer node id>, <lastPublished>, <originallyPublished>,
+        #                              <originalPublisherID>) } }
+        self._peers = {}
+        # { <compact peer>: set(<key>) }
+        self._peer_keys = {}
+        # { <bucket>: set(<key>) }, with a heap of the bucket numbers
+        self._expiry_buckets = {}
+        self._bucket_heap = []
+        self._snapshot_lc = task.LoopingCall(self.saveSnapshot)
+
+    def __len__(self):
+        return len(self._peers)
+
+    def __contains__(self, key):
+        return key in self._peers
+
+    def start(self):
+        self.loadSnapshot()
+        self._snapshot_lc.start(self.snapshot_interval, now=False)
+
+    def stop(self):
+        if self._snapshot_lc.running:
+            self._snapshot_lc.stop()
+        return self.saveSnapshot()
+
+    def keys(self):
+        """ Return a list of the keys in this data store """
+        return self._peers.keys()
+
+    def removeExpiredPeers(self, now=None):
+        cutoff = int(now or time.time()) - constants.dataExpireTimeout
+        last_bucket = cutoff // self.bucket_size
+        while self._bucket_heap and self._bucket_heap[0] <= last_bucket:
+            bucket = self._bucket_heap[0]
+            for key in self._expiry_buckets[bucket]:
+                self._removeExpiredPeersForKey(key, cutoff)
+            if bucket == last_bucket:
+                # only part of this bucket has expired, check it again next time
+                break
+            heapq.heappop(self._bucket_heap)
+            del self._expiry_buckets[bucket]
+
+    def hasPeersForBlob(self, key):
+        return key in self._peers
+
+    def addPeerToBlob(self, key, value, lastPublished, originallyPublished, originalPublisherID):
+        peer, node_id = intern(value[:6]), intern(value[6:])
+        self._peers.setdefault(key, {})[peer] = (node_id, lastPublished, originallyPublished,
+                                                 intern(originalPublisherID))
+        self._peer_keys.setdefault(peer, set()).add(key)
+        # a replaced entry leaves the key in the bucket of its old publish time, the key is
+        # checked again when that bucket expires
+        bucket = originallyPublished // self.bucket_size
+        if bucket not in self._expiry_buckets:
+            self._expiry_buckets[bucket] = set()
+            heapq.heappush(self._bucket_heap, bucket)
+        self._expiry_buckets[bucket].add(key)
+
+    def getPeersForBlob(self, key):
+        if key in self._peers:
+            return [peer + entry[0] for peer, entry in self._peers[key].iteritems()]
+
+    def getPeerEntriesForBlob(self, key):
+        return [
+            (peer + node_id, last_published, originally_published, publisher_id)
+            for peer, (node_id, last_published, originally_published, publisher_id)
+            in self._peers.get(key, {}).iteritems()
+        ]
+
+    def removePeer(self, value):
+        peer = value[:6]
+        for key in list(self._peer_keys.get(peer, ())):
+            if self._peers[key][peer][0] == value[6:]:
+                self._removeEntry(key, peer)
+
+    def saveSnapshot(self):
+        """
+        Write the peers to the snapshot file
+
+        The snapshot is serialized here and written to a temporary file in a thread, which
+        is then moved over the previous snapshot
+        """
+        return threads.deferToThread(self._writeSnapshot, self._serializeSnapshot())
+
+    def loadSnapshot(self):
+        """
+        Add the unexpired peers from the snapshot file, if there is one
+        """
+        if not os.path.isfile(self.snapshot_path):
+            return
+        with open(self.snapshot_path, 'rb') as snapshot_file:
+            data = snapshot_file.read()
+        cutoff = int(time.time()) - constants.dataExpireTimeout
+        offset, loaded = 0, 0
+        try:
+            while offset < len(data):
+                key_len, peer_len, node_id_len, publisher_len, last_published, originally_published = \
+                    self._record.unpack_from(data, offset)
+                offset += self._record.size
+                fields = []
+                for length in (key_len, peer_len, node_id_len, publisher_len):
+                    fields.append(data[offset:offset + length])
+                    offset += length
+                if offset > len(data):
+                    raise ValueError("truncated record")
+                key, peer, node_id, publisher_id = fields
+                if originally_published >= cutoff:
+                    self.addPeerToBlob(key, peer + node_id, last_published, originally_published,
+                                       publisher_id or node_id)
+                    loaded += 1
+        except (struct.error, ValueError) as err:
+            log.warning("Failed to read the dht datastore snapshot %s: %s", self.snapshot_path, err)
+        log.info("Loaded %i peers for %i blobs from the dht datastore snapshot", loaded,
+                 len(self._peers))
+
+    def _serializeSnapshot(self):
+        records = []
+        for key, peers in self._peers.iteritems():
+            for peer, (node_id, last_published, originally_published, publisher_id) in \
+                    peers.iteritems():
+                if publisher_id == node_id:
+                    publisher_id = ''
+                records.append(self._record.pack(len(key), len(peer), len(node_id),
+                                                 len(publisher_id), last_published,
+                                                 originally_published))
+                records.extend((key, peer, node_id, publisher_id))
+        return ''.join(records)
+
+    def _writeSnapshot(self, data):
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, 'wb') as snapshot_file:
+            snapshot_file.write(data)
+        if os.name == 'nt' and os.path.isfile(self.snapshot_path):
+            os.remove(self.snapshot_path)
+        os.rename(tmp_path, self.snapshot_path)
+
+    def _removeExpiredPeersForKey(self, key, cutoff):
+        peers = self._peers.get(key)
+        if peers:
+            for peer in [peer for peer, entry in peers.iteritems() if entry[2] < cutoff]:
+                self._removeEntry(key, peer)
+
+    def _removeEntry(self, key, peer):
+        peers = self._peers[key]
+        del peers[peer]
+        if not peers:
+            del self._peers[key]
+        keys = self._peer_keys[peer]
+        keys.discard(key)
+        if not keys:
+            del self._peer_keys[peer]
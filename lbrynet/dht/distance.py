@@ -0,0 +1,44 @@
+import heapq
+
+
+class Distance(object):
+    """Calculate the XOR result between two string variables.
+
+    Frequently we re-use one of the points so as an optimization
+    we pre-calculate the long value of that point. Contacts carry the
+    long value of their id as well, so the distance to a contact is a
+    single xor.
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self.val_key_one = long(key.encode('hex'), 16)
+
+    def __call__(self, key_two):
+        val_key_two = long(key_two.encode('hex'), 16)
+        return self.val_key_one ^ val_key_two
+
+    def is_closer(self, a, b):
+        """Returns true is `a` is closer to `key` than `b` is"""
+        return self(a) < self(b)
+
+    def to_contact(self, contact):
+        """A convenience function for calculating the distance to a contact"""
+        return self.val_key_one ^ contact.long_id
+
+    def to_range(self, range_min, range_max):
+        """The smallest distance from `key` to any id in [range_min, range_max)
+
+        The size of the range must be a power of two that range_min is a
+        multiple of, which is always the case for the range of a k-bucket.
+        """
+        range_bits = (range_max - range_min).bit_length() - 1
+        return ((self.val_key_one ^ range_min) >> range_bits) << range_bits
+
+    def sort(self, contacts):
+        """Sort a list of contacts in place, closest first"""
+        contacts.sort(key=self.to_contact)
+
+    def closest(self, contacts, count):
+        """Get the `count` closest contacts from an iterable of contacts, closest first"""
+        return heapq.nsmallest(count, contacts, key=self.to_contact)
@@ -1,19 +1,35 @@
-from collections import Counter
-import datetime
+from collections import deque
 
 
 class HashWatcher(object):
-    def __init__(self):
-        self.ttl = 600
-        self.hashes = []
-        self.next_tick = None
+    """
+    Counts how many distinct ips requested each hash over the last ttl seconds
 
-    def tick(self):
+    Requests are recorded in per minute buckets. A (hash, ip) pair is only counted once while
+    it is in the window, and the counts are updated as buckets fall out of the window, so
+    recording a request and expiring old ones are O(1) per request. Hashes are also grouped
+    by their count, so the most popular hashes can be read without sorting every hash.
+    """
 
-        from twisted.internet import reactor
+    def __init__(self, ttl=600, bucket_size=60, clock=None):
+        if clock is None:
+            from twisted.internet import reactor
+            clock = reactor
+        self.ttl = ttl
+        self.bucket_size = bucket_size
+        self.clock = clock
+        self.next_tick = None
+        # deque of (<bucket number>, [(<hash>, <ip>)]), oldest first
+        self._buckets = deque()
+        self._requests = set()
+        self._counts = {}
+        # { <count>: set(<hash>) }
+        self._hashes_by_count = {}
+        self._max_count = 0
 
+    def tick(self):
         self._remove_old_hashes()
-        self.next_tick = reactor.callLater(10, self.tick)
+        self.next_tick = self.clock.callLater(10, self.tick)
 
     def stop(self):
         if self.next_tick is not None:
@@ -21,15 +37,54 @@ class HashWatcher(object):
             self.next_tick = None
 
     def add_requested_hash(self, hashsum, contact):
-        from_ip = contact.compact_ip
-        matching_hashes = [h for h in self.hashes if h[0] == hashsum and h[2] == from_ip]
-        if len(matching_hashes) == 0:
-            self.hashes.append((hashsum, datetime.datetime.now(), from_ip))
+        request = (hashsum, contact.compact_ip())
+        if request in self._requests:
+            return
+        self._requests.add(request)
+        bucket = int(self.clock.seconds() // self.bucket_size)
+        if not self._buckets or self._buckets[-1][0] != bucket:
+            self._buckets.append((bucket, []))
+        self._buckets[-1][1].append(request)
+        self._set_count(hashsum, self._counts.get(hashsum, 0) + 1)
 
     def most_popular_hashes(self, num_to_return=10):
-        hash_counter = Counter([h[0] for h in self.hashes])
-        return hash_counter.most_common(num_to_return)
+        """
+        Get the most requested hashes
+
+        :return: list of (hash, number of ips that requested it) tuples, most requested first
+        """
+        result = []
+        count = self._max_count
+        while count > 0 and len(result) < num_to_return:
+            for hashsum in self._hashes_by_count.get(count, ()):
+                result.append((hashsum, count))
+                if len(result) == num_to_return:
+                    break
+            count -= 1
+        return result
 
     def _remove_old_hashes(self):
-        remove_time = datetime.datetime.now() - datetime.timedelta(minutes=10)
-        self.hashes = [h for h in self.hashes if h[1] < remove_time]
+        oldest_bucket = int((self.clock.seconds() - self.ttl) // self.bucket_size)
+        while self._buckets and self._buckets[0][0] < oldest_bucket:
+            _, requests = self._buckets.popleft()
+            for request in requests:
+                self._requests.remove(request)
+                self._set_count(request[0], self._counts[request[0]] - 1)
+
+    def _set_count(self, hashsum, count):
+        old_count = self._counts.get(hashsum, 0)
+        if old_count:
+            hashes = self._hashes_by_count[old_count]
+            hashes.remove(hashsum)
+            if not hashes:
+                del self._hashes_by_count[old_count]
+        if count:
+            self._counts[hashsum] = count
+            self._hashes_by_count.setdefault(count, set()).add(hashsum)
+        else:
+            del self._counts[hashsum]
+        if count > self._max_count:
+            self._max_count = count
+        elif old_count == self._max_count and old_count not in self._hashes_by_count:
+            # counts only change by one, so the next highest count is the old one minus one
+            self._max_count = count
@@ -27,6 +27,11 @@ class IDataStore(Interface):
     def removePeer(self, key):
         pass
 
+    def getPeerEntriesForBlob(self, key):
+        """ Return a list of (value, lastPublished, originallyPublished, originalPublisherID)
+        tuples for the peers stored for a key """
+        pass
+
 
 class IRoutingTable(Interface):
     """ Interface for RPC message translators/formatters
@@ -8,11 +8,10 @@
 # may be created by processing this file with epydoc: http://epydoc.sf.net
 import binascii
 import hashlib
-import operator
 import struct
 import time
 
-from twisted.internet import defer, error, reactor, threads, task
+from twisted.internet import defer, error, reactor, task
 
 import constants
 import routingtable
@@ -20,6 +19,7 @@ import datastore
 import protocol
 
 from contact import Contact
+from distance import Distance
 from hashwatcher import HashWatcher
 import logging
 
@@ -101,6 +101,9 @@ class Node(object):
         # Initialize the data storage mechanism used by this node
         self.token_secret = self._generateID()
         self.old_token_secret = None
+        # store tokens given to us by other nodes, {<node id>: (<token>, <expiration time>)}
+        self._storeTokens = {}
+        self._storeSemaphore = defer.DeferredSemaphore(constants.maxConcurrentStores)
         if dataStore is None:
             self._dataStore = datastore.DictDataStore()
         else:
@@ -221,7 +224,7 @@ class Node(object):
         # bad estimate of the average number of hashes per node, then multiply by the
         # approximate number of nodes to get a horrendous estimate of the total number
         # of hashes in the DHT
-        num_in_data_store = len(self._dataStore._dict)
+        num_in_data_store = len(self._dataStore.keys())
         if num_in_data_store == 0:
             return 0
         return num_in_data_store * self.getApproximateTotalDHTNodes() / 8
@@ -309,9 +312,102 @@ class Node(object):
         d.addCallbacks(requestPeers)
         return d
 
+    @defer.inlineCallbacks
+    def announceHaveBlobs(self, blob_hashes, contacts):
+        """ Announce several blobs using the results of a single node lookup
+
+        The blob hashes should be close to each other in the keyspace, so that the contacts found
+        by looking up one of them are also close to the others. Store tokens are cached per
+        contact, so a contact is only asked for a token again once its token could have expired.
+        The stores for all of the blob hashes are queued at once, up to
+        C{constants.maxConcurrentStores} of them are sent at a time, and a contact that fails a
+        store isn't sent the queued stores that haven't been sent yet.
+
+        @param blob_hashes: the blob hashes to announce
+        @param contacts: the contacts found by iterativeFindNode for a nearby key
+
+        @return: a list of the number of contacts each blob hash was stored at
+        """
+        value = {'port': self.peerPort, 'lbryid': self.node_id}
+        tokens = yield self._getStoreTokens(contacts, blob_hashes[0])
+        ds = []
+        for blob_hash in blob_hashes:
+            closest = Distance(blob_hash).closest(tokens.keys(), constants.k)
+            if self.externalIP is not None:
+                if len(closest) < constants.k:
+                    self.store(blob_hash, value, self_store=True, originalPublisherID=self.node_id)
+                elif Distance(blob_hash).is_closer(self.node_id, closest[-1].id):
+                    closest.pop()
+                    self.store(blob_hash, value, self_store=True, originalPublisherID=self.node_id)
+            stores = []
+            for contact in closest:
+                stores.append(self._storeSemaphore.run(self._storeBlob, blob_hash, value,
+                                                       contact, tokens))
+            ds.append(defer.DeferredList(stores))
+        results = yield defer.DeferredList(ds)
+        defer.returnValue([
+            len([r for success, r in store_results if success and r is not False])
+            for _, store_results in results
+        ])
+
+    def _storeBlob(self, blob_hash, value, contact, tokens):
+        if contact not in tokens:
+            # the contact failed a store since this one was queued
+            return False
+        d = contact.store(blob_hash, dict(value, token=tokens[contact]), self.node_id, 0)
+        d.addErrback(self._storeFailed, blob_hash, contact, tokens)
+        return d
+
+    def _getStoreTokens(self, contacts, key):
+        """ Get a store token from each contact, contacts that don't respond are left out
+
+        @return: deferred that fires with a dictionary of {<contact>: <token>}
+        """
+        now = time.time()
+        tokens = {}
+
+        def _got_token(responseTuple, contact):
+            result = responseTuple[0].response
+            if isinstance(result, dict) and 'token' in result:
+                tokens[contact] = result['token']
+                # tokens are accepted until the secret that made them has been rotated twice
+                self._storeTokens[contact.id] = (result['token'],
+                                                 now + constants.tokenSecretChangeInterval)
+
+        ds = []
+        for contact in contacts:
+            cached = self._storeTokens.get(contact.id)
+            if cached is not None and cached[1] > now:
+                tokens[contact] = cached[0]
+                continue
+            d = contact.findValue(key, rawResponse=True)
+            d.addCallback(_got_token, contact)
+            d.addErrback(self._storeFailed, key, contact, tokens)
+            ds.append(d)
+        d = defer.DeferredList(ds)
+        d.addCallback(lambda _: tokens)
+        return d
+
+    def _storeFailed(self, err, blob_hash, contact, tokens=None):
+        # don't use the contact for the rest of the batch, or for later ones until it gives
+        # us a new token
+        self._storeTokens.pop(contact.id, None)
+        if tokens is not None:
+            tokens.pop(contact, None)
+        if err.check(protocol.TimeoutError):
+            log.debug("Timeout while storing blob_hash %s at %s",
+                      binascii.hexlify(blob_hash), contact)
+        else:
+            log.error("Unexpected error while storing blob_hash %s at %s: %s",
+                      binascii.hexlify(blob_hash), contact, err.getErrorMessage())
+        return False
+
     def change_token(self):
         self.old_token_secret = self.token_secret
         self.token_secret = self._generateID()
+        now = time.time()
+        self._storeTokens = {node_id: token for node_id, token in self._storeTokens.iteritems()
+                             if token[1] > now}
 
     def make_token(self, compact_ip):
         h = hashlib.new('sha384')
@@ -659,8 +755,7 @@ class Node(object):
 
     # args put here because _refreshRoutingTable does outerDF.callback(None)
     def _removeExpiredPeers(self, *args):
-        df = threads.deferToThread(self._dataStore.removeExpiredPeers)
-        return df
+        return defer.maybeDeferred(self._dataStore.removeExpiredPeers)
 
 
 # This was originally a set of nested methods in _iterativeFind
@@ -787,7 +882,7 @@ class _IterativeFindHelper(object):
 
     def sortByDistance(self, contact_list):
         """Sort the list of contacts in order by distance from key"""
-        ExpensiveSort(contact_list, self.distance.to_contact).sort()
+        self.distance.sort(contact_list)
 
     # Send parallel, asynchronous FIND_NODE RPCs to the shortlist of contacts
     def searchIteration(self):
@@ -865,62 +960,3 @@ class _IterativeFindHelper(object):
                 len(self.active_probes) == self.slow_node_count[0]
             )
         )
-
-
-class Distance(object):
-    """Calculate the XOR result between two string variables.
-
-    Frequently we re-use one of the points so as an optimization
-    we pre-calculate the long value of that point.
-    """
-
-    def __init__(self, key):
-        self.key = key
-        self.val_key_one = long(key.encode('hex'), 16)
-
-    def __call__(self, key_two):
-        val_key_two = long(key_two.encode('hex'), 16)
-        return self.val_key_one ^ val_key_two
-
-    def is_closer(self, a, b):
-        """Returns true is `a` is closer to `key` than `b` is"""
-        return self(a) < self(b)
-
-    def to_contact(self, contact):
-        """A convenience function for calculating the distance to a contact"""
-        return self(contact.id)
-
-
-class ExpensiveSort(object):
-    """Sort a list in place.
-
-    The result of `key(item)` is cached for each item in the `to_sort`
-    list as an optimization.  This can be useful when `key` is
-    expensive.
-
-    Attributes:
-        to_sort: a list of items to sort
-        key: callable, like `key` in normal python sort
-        attr: the attribute name used to cache the value on each item.
-    """
-
-    def __init__(self, to_sort, key, attr='__value'):
-        self.to_sort = to_sort
-        self.key = key
-        self.attr = attr
-
-    def sort(self):
-        self._cacheValues()
-        self._sortByValue()
-        self._removeValue()
-
-    def _cacheValues(self):
-        for item in self.to_sort:
-            setattr(item, self.attr, self.key(item))
-
-    def _sortByValue(self):
-        self.to_sort.sort(key=operator.attrgetter(self.attr))
-
-    def _removeValue(self):
-        for item in self.to_sort:
-            delattr(item, self.attr)
@@ -11,6 +11,7 @@ from zope.interface import implements
 import constants
 import kbucket
 import protocol
+from distance import Distance
 from interface import IRoutingTable
 import logging
 
@@ -117,43 +118,28 @@ class TreeRoutingTable(object):
         @type _rpcNodeID: str
 
         @return: A list of node contacts (C{kademlia.contact.Contact instances})
-                 closest to the specified key.
+                 closest to the specified key, sorted by their distance to it.
                  This method will return C{k} (or C{count}, if specified)
                  contacts if at all possible; it will only return fewer if the
                  node is returning all of the contacts that it knows of.
         @rtype: list
         """
-        bucketIndex = self._kbucketIndex(key)
-
-        if bucketIndex < len(self._buckets):
-            closestNodes = self._buckets[bucketIndex].getContacts(count, _rpcNodeID)
-        else:
-            closestNodes = []
-        # This method must return k contacts (even if we have the node
-        # with the specified key as node ID), unless there is less
-        # than k remote nodes in the routing table
-        i = 1
-        canGoLower = bucketIndex - i >= 0
-        canGoHigher = bucketIndex + i < len(self._buckets)
-
-        def get_remain(closest):
-            return min(count, constants.k) - len(closest)
-
-        # Fill up the node list to k nodes, starting with the closest neighbouring nodes known
-        while len(closestNodes) < min(count, constants.k) and (canGoLower or canGoHigher):
-            # TODO: this may need to be optimized
-            # TODO: add "key" kwarg to getContacts() to sort contacts returned by xor distance
-            # to the key
-            if canGoLower and len(closestNodes) < min(count, constants.k):
-                closestNodes.extend(
-                    self._buckets[bucketIndex - i].getContacts(get_remain(closestNodes),
-                                                               _rpcNodeID))
-                canGoLower = bucketIndex - (i + 1) >= 0
-            if canGoHigher and len(closestNodes) < min(count, constants.k):
-                closestNodes.extend(self._buckets[bucketIndex + i].getContacts(
-                    get_remain(closestNodes), _rpcNodeID))
-                canGoHigher = bucketIndex + (i + 1) < len(self._buckets)
-            i += 1
+        count = min(count, constants.k)
+        distance = Distance(key)
+        # Visit the k-buckets in order of the smallest distance any of their contacts could
+        # have to the key, and stop once the next bucket can't hold a closer contact than
+        # the furthest of the closest ones found so far
+        buckets = [
+            (distance.to_range(bucket.rangeMin, bucket.rangeMax), bucket) for bucket in self._buckets
+        ]
+        buckets.sort(key=lambda b: b[0])
+        closestNodes = []
+        for bucketDistance, bucket in buckets:
+            if len(closestNodes) >= count and \
+                    bucketDistance > distance.to_contact(closestNodes[count - 1]):
+                break
+            closestNodes.extend(c for c in bucket._contacts if c != _rpcNodeID)
+            closestNodes = distance.closest(closestNodes, count)
         return closestNodes
 
     def getContact(self, contactID):
@@ -7,23 +7,24 @@ import logging
 import os
 
 from twisted.internet import defer
-from twisted.protocols.basic import FileSender
 
 from lbrynet.core.StreamDescriptor import BlobStreamDescriptorWriter, EncryptedFileStreamType
 from lbrynet.core.StreamDescriptor import format_sd_info, get_stream_hash
-from lbrynet.cryptstream.CryptStreamCreator import CryptStreamCreator
+from lbrynet.cryptstream.CryptStreamCreator import ThreadedCryptStreamCreator
 
 log = logging.getLogger(__name__)
 
 
-class EncryptedFileStreamCreator(CryptStreamCreator):
+class EncryptedFileStreamCreator(ThreadedCryptStreamCreator):
     """
-    A CryptStreamCreator which adds itself and its additional metadata to an EncryptedFileManager
+    A ThreadedCryptStreamCreator which adds itself and its additional metadata to an
+    EncryptedFileManager
     """
 
     def __init__(self, blob_manager, lbry_file_manager, stream_name=None,
-                 key=None, iv_generator=None):
-        CryptStreamCreator.__init__(self, blob_manager, stream_name, key, iv_generator)
+                 key=None, iv_generator=None, workers=2, split_file=False):
+        ThreadedCryptStreamCreator.__init__(self, blob_manager, stream_name, key, iv_generator,
+                                            workers, split_file)
         self.lbry_file_manager = lbry_file_manager
         self.stream_hash = None
         self.blob_infos = []
@@ -48,14 +49,9 @@ class EncryptedFileStreamCreator(CryptStreamCreator):
         return defer.succeed(self.stream_hash)
 
 
-# TODO: this should be run its own thread. Encrypting a large file can
-#       be very cpu intensive and there is no need to run that on the
-#       main reactor thread. The FileSender mechanism that is used is
-#       great when sending over the network, but this is all local so
-#       we can simply read the file from the disk without needing to
-#       involve reactor.
 @defer.inlineCallbacks
-def create_lbry_file(session, lbry_file_manager, file_name, file_handle, key=None, iv_generator=None):
+def create_lbry_file(session, lbry_file_manager, file_name, file_handle, key=None,
+                     iv_generator=None, lbry_file_creator=None):
     """Turn a plain file into an LBRY File.
 
     An LBRY File is a collection of encrypted blobs of data and the metadata that binds them
@@ -63,8 +59,8 @@ def create_lbry_file(session, lbry_file_manager, file_name, file_handle, key=Non
     in the original file.
 
     The stream parameters that aren't specified are generated, the file is read and broken
-    into chunks and encrypted, and then a stream descriptor file with the stream parameters
-    and other metadata is written to disk.
+    into chunks and encrypted on worker threads, and then a stream descriptor file with the
+    stream parameters and other metadata is written to disk.
 
     @param session: An Session object.
     @type session: Session
@@ -76,7 +72,7 @@ def create_lbry_file(session, lbry_file_manager, file_name, file_handle, key=Non
     @type file_name: string
 
     @param file_handle: The file-like object to read
-    @type file_handle: any file-like object which can be read by twisted.protocols.basic.FileSender
+    @type file_handle: any file-like object with a read method
 
     @param key: the raw AES key which will be used to encrypt the blobs. If None, a random key will
         be generated.
@@ -86,6 +82,10 @@ def create_lbry_file(session, lbry_file_manager, file_name, file_handle, key=Non
         vectors for the blobs. Will be called once for each blob.
     @type iv_generator: a generator function which yields strings
 
+    @param lbry_file_creator: the creator to make the stream with, so its progress can be
+        followed. If None, one is made with the given key and iv_generator.
+    @type lbry_file_creator: EncryptedFileStreamCreator
+
     @return: a Deferred which fires with the stream_hash of the LBRY File
     @rtype: Deferred which fires with hex-encoded string
     """
@@ -93,20 +93,13 @@ def create_lbry_file(session, lbry_file_manager, file_name, file_handle, key=Non
     base_file_name = os.path.basename(file_name)
     file_directory = os.path.dirname(file_handle.name)
 
-    lbry_file_creator = EncryptedFileStreamCreator(
-        session.blob_manager, lbry_file_manager, base_file_name, key, iv_generator
-    )
+    if lbry_file_creator is None:
+        lbry_file_creator = EncryptedFileStreamCreator(
+            session.blob_manager, lbry_file_manager, base_file_name, key, iv_generator
+        )
 
     yield lbry_file_creator.setup()
-    # TODO: Using FileSender isn't necessary, we can just read
-    #       straight from the disk. The stream creation process
-    #       should be in its own thread anyway so we don't need to
-    #       worry about interacting with the twisted reactor
-    file_sender = FileSender()
-    yield file_sender.beginFileTransfer(file_handle, lbry_file_creator)
-
-    log.debug("the file sender has triggered its deferred. stopping the stream writer")
-    yield lbry_file_creator.stop()
+    yield lbry_file_creator.create_stream(file_handle)
 
     log.debug("making the sd blob")
     sd_info = lbry_file_creator.sd_info
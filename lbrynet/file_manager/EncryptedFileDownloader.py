@@ -47,6 +47,9 @@ class ManagedEncryptedFileDownloader(EncryptedFileSaver):
         self.suggested_file_name = binascii.unhexlify(suggested_file_name)
         self.lbry_file_manager = lbry_file_manager
         self._saving_status = False
+        # fired by _start when a download resumed by restore has started
+        self._started_deferred = None
+        self._blob_infos = None
         self.claim_id = None
         self.outpoint = None
         self.claim_name = None
@@ -59,6 +62,10 @@ class ManagedEncryptedFileDownloader(EncryptedFileSaver):
     @defer.inlineCallbacks
     def get_claim_info(self, include_supports=True):
         claim_info = yield self.storage.get_content_claim(self.stream_hash, include_supports)
+        self.set_claim_info(claim_info)
+        defer.returnValue(claim_info)
+
+    def set_claim_info(self, claim_info):
         if claim_info:
             self.claim_id = claim_info['claim_id']
             self.txid = claim_info['txid']
@@ -68,25 +75,34 @@ class ManagedEncryptedFileDownloader(EncryptedFileSaver):
             self.claim_name = claim_info['name']
             self.channel_name = claim_info['channel_name']
             self.metadata = claim_info['value']['stream']['metadata']
-
-        defer.returnValue(claim_info)
+            self.lbry_file_manager.lbry_files.reindex(self)
 
     @property
     def saving_status(self):
         return self._saving_status
 
     def restore(self, status):
+        """
+        Restore the file to its saved status
+
+        @return: Deferred which fires once the download of a running file has been started
+        """
         if status == ManagedEncryptedFileDownloader.STATUS_RUNNING:
             # start returns self.finished_deferred
             # which fires when we've finished downloading the file
             # and we don't want to wait for the entire download
-            self.start()
+            self._started_deferred = defer.Deferred()
+            d = self.start()
+            d.addErrback(lambda err: log.warning("Failed to resume stream %s: %s",
+                                                 short_hash(self.sd_hash), err.getErrorMessage()))
+            return self._started_deferred
         elif status == ManagedEncryptedFileDownloader.STATUS_STOPPED:
             pass
         elif status == ManagedEncryptedFileDownloader.STATUS_FINISHED:
             self.completed = True
         else:
             raise Exception("Unknown status for stream %s: %s" % (self.stream_hash, status))
+        return defer.succeed(True)
 
     @defer.inlineCallbacks
     def stop(self, err=None, change_status=True):
@@ -97,9 +113,21 @@ class ManagedEncryptedFileDownloader(EncryptedFileSaver):
             status = yield self._save_status()
         defer.returnValue(status)
 
+    @defer.inlineCallbacks
+    def get_blobs(self):
+        """Get the blob infos of the stream, they are only loaded from the database once"""
+        if self._blob_infos is None:
+            self._blob_infos = yield self.storage.get_blobs_for_stream(self.stream_hash)
+        defer.returnValue(self._blob_infos)
+
+    @defer.inlineCallbacks
+    def get_total_bytes(self):
+        blobs = yield self.get_blobs()
+        defer.returnValue(sum([b.length for b in blobs]))
+
     @defer.inlineCallbacks
     def status(self):
-        blobs = yield self.storage.get_blobs_for_stream(self.stream_hash)
+        blobs = yield self.get_blobs()
         blob_hashes = [b.blob_hash for b in blobs if b.blob_hash is not None]
         completed_blobs = yield self.blob_manager.completed_blobs(blob_hashes)
         num_blobs_completed = len(completed_blobs)
@@ -117,11 +145,21 @@ class ManagedEncryptedFileDownloader(EncryptedFileSaver):
 
     @defer.inlineCallbacks
     def _start(self):
-        yield EncryptedFileSaver._start(self)
-        status = yield self._save_status()
+        try:
+            yield EncryptedFileSaver._start(self)
+            status = yield self._save_status()
+        finally:
+            if self._started_deferred is not None:
+                started, self._started_deferred = self._started_deferred, None
+                started.callback(True)
         log_status(self.sd_hash, status)
         defer.returnValue(status)
 
+    def _blob_downloaded(self, blob, blob_num):
+        EncryptedFileSaver._blob_downloaded(self, blob, blob_num)
+        self.lbry_file_manager.notify_progress(self, 'blob_downloaded', blob_hash=blob.blob_hash,
+                                               blob_num=blob_num)
+
     def _get_finished_deferred_callback_value(self):
         if self.completed is True:
             return "Download successful"
@@ -11,6 +11,7 @@ from lbrynet.reflector.reupload import reflect_stream
 from lbrynet.core.PaymentRateManager import NegotiatedPaymentRateManager
 from lbrynet.file_manager.EncryptedFileDownloader import ManagedEncryptedFileDownloader
 from lbrynet.file_manager.EncryptedFileDownloader import ManagedEncryptedFileDownloaderFactory
+from lbrynet.file_manager.EncryptedFileRegistry import EncryptedFileRegistry
 from lbrynet.core.StreamDescriptor import EncryptedFileStreamType, get_sd_info
 from lbrynet.cryptstream.client.CryptStreamDownloader import AlreadyStoppedError
 from lbrynet.cryptstream.client.CryptStreamDownloader import CurrentlyStoppingError
@@ -28,6 +29,8 @@ class EncryptedFileManager(object):
     """
     # when reflecting files, reflect up to this many files at a time
     CONCURRENT_REFLECTS = 5
+    # when starting up, resume up to this many running files at a time
+    CONCURRENT_RESUMES = 10
 
     def __init__(self, session, sd_identifier):
 
@@ -38,8 +41,13 @@ class EncryptedFileManager(object):
         # TODO: why is sd_identifier part of the file manager?
         self.sd_identifier = sd_identifier
         assert sd_identifier
-        self.lbry_files = []
+        self.lbry_files = EncryptedFileRegistry(self._load_lbry_file)
         self.lbry_file_reflector = task.LoopingCall(self.reflect_lbry_files)
+        # the payment rate manager of restored files
+        self._payment_rate_manager = None
+        # called with a progress event dict when a blob of a file is downloaded or
+        # the status of a file changes
+        self.progress_listeners = []
 
     @defer.inlineCallbacks
     def setup(self):
@@ -47,6 +55,12 @@ class EncryptedFileManager(object):
         yield self._start_lbry_files()
         log.info("Started file manager")
 
+    def _get_payment_rate_manager(self):
+        if self._payment_rate_manager is None:
+            self._payment_rate_manager = NegotiatedPaymentRateManager(
+                self.session.base_payment_rate_manager, self.session.blob_tracker)
+        return self._payment_rate_manager
+
     def get_lbry_file_status(self, lbry_file):
         return self.session.storage.get_lbry_file_status(lbry_file.rowid)
 
@@ -55,8 +69,33 @@ class EncryptedFileManager(object):
 
     def change_lbry_file_status(self, lbry_file, status):
         log.debug("Changing status of %s to %s", lbry_file.stream_hash, status)
+        self.notify_progress(lbry_file, 'status', status=status)
         return self.session.storage.change_file_status(lbry_file.rowid, status)
 
+    def add_progress_listener(self, listener):
+        self.progress_listeners.append(listener)
+
+    def remove_progress_listener(self, listener):
+        if listener in self.progress_listeners:
+            self.progress_listeners.remove(listener)
+
+    def notify_progress(self, lbry_file, event, **info):
+        if not self.progress_listeners:
+            return
+        progress = {
+            'event': event,
+            'sd_hash': lbry_file.sd_hash,
+            'stream_hash': lbry_file.stream_hash,
+            'file_name': lbry_file.file_name,
+            'written_bytes': lbry_file.get_written_bytes(),
+        }
+        progress.update(info)
+        for listener in list(self.progress_listeners):
+            try:
+                listener(progress)
+            except Exception as err:
+                log.exception("Error in progress listener: %s", err)
+
     def get_lbry_file_status_reports(self):
         ds = []
 
@@ -96,34 +135,52 @@ class EncryptedFileManager(object):
             suggested_file_name=suggested_file_name
         )
 
+    def _load_lbry_file(self, file_info):
+        lbry_file = self._get_lbry_file(
+            file_info['row_id'], file_info['stream_hash'], self._get_payment_rate_manager(),
+            file_info['sd_hash'], file_info['key'], file_info['stream_name'], file_info['file_name'],
+            file_info['download_directory'], file_info['suggested_file_name']
+        )
+        lbry_file.set_claim_info(file_info['claim'])
+        if file_info['status'] == ManagedEncryptedFileDownloader.STATUS_FINISHED:
+            lbry_file.restore(file_info['status'])
+        return lbry_file
+
     @defer.inlineCallbacks
     def _start_lbry_files(self):
         files = yield self.session.storage.get_all_lbry_files()
-        b_prm = self.session.base_payment_rate_manager
-        payment_rate_manager = NegotiatedPaymentRateManager(b_prm, self.session.blob_tracker)
+        statuses = (ManagedEncryptedFileDownloader.STATUS_RUNNING,
+                    ManagedEncryptedFileDownloader.STATUS_STOPPED,
+                    ManagedEncryptedFileDownloader.STATUS_FINISHED)
 
         log.info("Trying to start %i files", len(files))
-        for i, file_info in enumerate(files):
-            if len(files) > 500 and i % 500 == 0:
-                log.info("Started %i/%i files", i, len(files))
-
-            lbry_file = self._get_lbry_file(
-                file_info['row_id'], file_info['stream_hash'], payment_rate_manager, file_info['sd_hash'],
-                file_info['key'], file_info['stream_name'], file_info['file_name'], file_info['download_directory'],
-                file_info['suggested_file_name']
-            )
-            yield lbry_file.get_claim_info()
-            try:
-                # restore will raise an Exception if status is unknown
-                lbry_file.restore(file_info['status'])
-                self.lbry_files.append(lbry_file)
-            except Exception:
-                log.warning("Failed to start %i", file_info['rowid'])
+        to_resume = []
+        for file_info in files:
+            if file_info['status'] not in statuses:
+                log.warning("Failed to start %i, unknown status %s", file_info['row_id'],
+                            file_info['status'])
                 continue
-        log.info("Started %i lbry files", len(self.lbry_files))
+            self.lbry_files.add_file_info(file_info)
+            if file_info['status'] == ManagedEncryptedFileDownloader.STATUS_RUNNING:
+                # running files are made and resumed now, the others when they're first used
+                to_resume.extend(self.lbry_files.find(rowid=file_info['row_id']))
+
+        sem = defer.DeferredSemaphore(self.CONCURRENT_RESUMES)
+        ds = []
+        for lbry_file in to_resume:
+            d = sem.run(lbry_file.restore, ManagedEncryptedFileDownloader.STATUS_RUNNING)
+            d.addErrback(self._resume_failed, lbry_file)
+            ds.append(d)
+        yield defer.DeferredList(ds)
+        log.info("Started %i lbry files, resumed %i of them", len(self.lbry_files), len(to_resume))
         if self.auto_re_reflect is True:
             safe_start_looping_call(self.lbry_file_reflector, self.auto_re_reflect_interval)
 
+    @staticmethod
+    def _resume_failed(err, lbry_file):
+        # start raises before the download has begun if the file is already starting or running
+        log.warning("Failed to resume %i: %s", lbry_file.rowid, err.getErrorMessage())
+
     @defer.inlineCallbacks
     def _stop_lbry_file(self, lbry_file):
         def wait_for_finished(lbry_file, count=2):
@@ -141,8 +198,9 @@ class EncryptedFileManager(object):
             defer.returnValue(None)
 
     def _stop_lbry_files(self):
-        log.info("Stopping %i lbry files", len(self.lbry_files))
-        lbry_files = self.lbry_files
+        # files which haven't been made were never started
+        lbry_files = self.lbry_files.loaded()
+        log.info("Stopping %i lbry files", len(lbry_files))
         for lbry_file in lbry_files:
             yield self._stop_lbry_file(lbry_file)
 
@@ -220,9 +278,8 @@ class EncryptedFileManager(object):
 
     def toggle_lbry_file_running(self, lbry_file):
         """Toggle whether a stream reader is currently running"""
-        for l in self.lbry_files:
-            if l == lbry_file:
-                return l.toggle_running()
+        if lbry_file in self.lbry_files:
+            return lbry_file.toggle_running()
         return defer.fail(Failure(ValueError("Could not find that LBRY file")))
 
     @defer.inlineCallbacks
@@ -0,0 +1,122 @@
+"""
+Keep the lbry files of the file manager indexed by the fields they are looked up by
+"""
+from collections import OrderedDict
+
+
+class EncryptedFileRegistry(object):
+    """
+    The lbry files of the file manager, in the order they were added, indexed by their sd hash,
+    stream hash, row id, claim id, claim outpoint, channel claim id and channel name
+
+    Files restored from the database are kept as the file info dicts they were loaded from
+    (see SQLiteStorage.get_all_lbry_files), and the downloader of a file is only made the first
+    time the file is accessed.
+    """
+
+    INDEXED_FIELDS = ('sd_hash', 'stream_hash', 'rowid', 'claim_id', 'outpoint',
+                      'channel_claim_id', 'channel_name')
+
+    def __init__(self, make_lbry_file):
+        self._make_lbry_file = make_lbry_file
+        self._next_key = 0
+        # {key: lbry file, or the file info of a file which hasn't been made yet}
+        self._files = OrderedDict()
+        self._keys = {}  # {id(lbry file): key}
+        self._indexed_values = {}  # {key: {field: value}}
+        self._indexes = {field: {} for field in self.INDEXED_FIELDS}  # {field: {value: {key}}}
+
+    def add_file_info(self, file_info):
+        self._add(file_info)
+
+    def append(self, lbry_file):
+        self._keys[id(lbry_file)] = self._add(lbry_file)
+
+    def remove(self, lbry_file):
+        key = self._keys.pop(id(lbry_file), None)
+        if key is None:
+            raise ValueError("%s is not in the list of lbry files" % lbry_file)
+        del self._files[key]
+        self._unindex(key)
+
+    def reindex(self, lbry_file):
+        """Update the indexes after the claim of a file has changed"""
+        key = self._keys.get(id(lbry_file))
+        if key is not None:
+            self._unindex(key)
+            self._index(key, lbry_file)
+
+    def loaded(self):
+        """Get the files which have been made, without making the others"""
+        return [l_f for l_f in self._files.itervalues() if not isinstance(l_f, dict)]
+
+    def find(self, start=0, stop=None, **search):
+        """
+        Get the files whose attributes match the given values, only the files in the results
+        (from start to stop) are made if all of the searched fields are indexed
+        """
+        keys = None
+        for field, value in search.iteritems():
+            if field in self._indexes:
+                matches = self._indexes[field].get(value, set())
+                keys = matches if keys is None else keys & matches
+        # keys increase in the order the files were added
+        keys = self._files.keys() if keys is None else sorted(keys)
+        unindexed = [(field, value) for field, value in search.iteritems()
+                     if field not in self._indexes]
+        if not unindexed:
+            return [self._get(key) for key in keys[start:stop]]
+        lbry_files = [self._get(key) for key in keys]
+        for field, value in unindexed:
+            lbry_files = [l_f for l_f in lbry_files if getattr(l_f, field) == value]
+        return lbry_files[start:stop]
+
+    def _add(self, item):
+        key = self._next_key
+        self._next_key += 1
+        self._files[key] = item
+        self._index(key, item)
+        return key
+
+    def _get(self, key):
+        lbry_file = self._files[key]
+        if isinstance(lbry_file, dict):
+            lbry_file = self._files[key] = self._make_lbry_file(lbry_file)
+            self._keys[id(lbry_file)] = key
+        return lbry_file
+
+    def _index(self, key, item):
+        if isinstance(item, dict):
+            claim = item['claim'] or {}
+            values = {
+                'sd_hash': item['sd_hash'],
+                'stream_hash': item['stream_hash'],
+                'rowid': item['row_id'],
+                'claim_id': claim.get('claim_id'),
+                'outpoint': "%s:%i" % (claim['txid'], claim['nout']) if claim else None,
+                'channel_claim_id': claim.get('channel_claim_id'),
+                'channel_name': claim.get('channel_name'),
+            }
+        else:
+            values = {field: getattr(item, field) for field in self.INDEXED_FIELDS}
+        self._indexed_values[key] = values
+        for field, value in values.iteritems():
+            self._indexes[field].setdefault(value, set()).add(key)
+
+    def _unindex(self, key):
+        for field, value in self._indexed_values.pop(key).iteritems():
+            keys = self._indexes[field][value]
+            keys.discard(key)
+            if not keys:
+                del self._indexes[field][value]
+
+    def __len__(self):
+        return len(self._files)
+
+    def __iter__(self):
+        for key in self._files.keys():
+            if key in self._files:
+                yield self._get(key)
+
+    def __contains__(self, lbry_file):
+        return id(lbry_file) in self._keys
@@ -40,7 +40,9 @@ class IRequestSender(Interface):
 
         This will cause the protocol to call blob_request.write(data)
         for all incoming data, after the response message has been
-        parsed out, until blob_request.finished_deferred fires.
+        parsed out, until blob_request.finished_deferred fires. If the
+        peer supports pipelined requests, only the number of bytes given
+        in the response is written and the rest is the next response.
 
         @param blob_request: the request for the blob
         @type blob_request: ClientBlobRequest
@@ -49,6 +51,16 @@ class IRequestSender(Interface):
         @rtype: Deferred which fires with dict
         """
 
+    def can_add_blob_request(self):
+        """Check whether another request for a blob can be added.
+
+        Peers that support pipelined requests can have several blob requests outstanding,
+        otherwise only one blob can be requested until the previous one has finished.
+
+        @return: True if add_blob_request can be called
+        @rtype: bool
+        """
+
 
 class IRequestCreator(Interface):
     """
@@ -157,7 +169,7 @@ class IDownloadManager(Interface):
 
     def needed_blobs(self):
         """Returns a list of BlobInfos representing all of the blobs that the
-        stream still needs to download.
+        stream still needs to download, in stream order.
 
         @return: the list of BlobInfos representing blobs that the stream still needs to download.
         @rtype: [BlobInfo]
@@ -241,7 +253,7 @@ class IProgressManager(Interface):
 
     def needed_blobs(self):
         """Returns a list of BlobInfos representing all of the blobs that the
-        stream still needs to download.
+        stream still needs to download, in stream order.
 
         @return: the list of BlobInfos representing blobs that the stream still needs to download.
         @rtype: [BlobInfo]
@@ -319,33 +331,45 @@ class IRateLimiter(Interface):
     Can keep track of download and upload rates and can throttle objects which implement the
     IRateLimited interface.
     """
-    def report_dl_bytes(self, num_bytes):
+    def report_dl_bytes(self, num_bytes, protocol=None):
         """
         Inform the IRateLimiter that num_bytes have been downloaded.
 
         @param num_bytes: the number of bytes that have been downloaded
         @type num_bytes: integer
 
+        @param protocol: the registered IRateLimited object that downloaded the bytes, or None
+            if they should only count against the total
+        @type protocol: Object implementing IRateLimited
+
         @return: None
         """
 
-    def report_ul_bytes(self, num_bytes):
+    def report_ul_bytes(self, num_bytes, protocol=None):
         """
         Inform the IRateLimiter that num_bytes have been uploaded.
 
         @param num_bytes: the number of bytes that have been uploaded
         @type num_bytes: integer
 
+        @param protocol: the registered IRateLimited object that uploaded the bytes, or None
+            if they should only count against the total
+        @type protocol: Object implementing IRateLimited
+
         @return: None
         """
 
-    def register_protocol(self, protocol):
+    def register_protocol(self, protocol, stream=None):
         """Register an IRateLimited object with the IRateLimiter so that the
         IRateLimiter can throttle it
 
         @param protocol: An object implementing the interface IRateLimited
         @type protocol: Object implementing IRateLimited
 
+        @param stream: the stream the protocol transfers data for, the bandwidth is
+            shared equally between streams and then between the protocols of each stream
+        @type stream: any hashable object
+
         @return: None
 
         """
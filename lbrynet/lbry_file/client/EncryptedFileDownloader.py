@@ -134,10 +134,18 @@ class EncryptedFileSaver(EncryptedFileDownloader):
         self.download_directory = binascii.unhexlify(download_directory)
         self.file_written_to = os.path.join(self.download_directory, binascii.unhexlify(file_name))
         self.file_handle = None
+        # bytes written to the file, counted as they're written once the size on disk is known
+        self._written_bytes = None
 
     def __str__(self):
         return str(self.file_written_to)
 
+    def get_written_bytes(self):
+        if self._written_bytes is None:
+            full_path = os.path.join(self.download_directory, self.file_name)
+            self._written_bytes = os.path.getsize(full_path) if os.path.isfile(full_path) else 0
+        return self._written_bytes
+
     def stop(self, err=None):
         d = EncryptedFileDownloader.stop(self, err=err)
         return d
@@ -154,6 +162,7 @@ class EncryptedFileSaver(EncryptedFileDownloader):
                 try:
                     self.file_handle = open(file_written_to, 'wb')
                     self.file_written_to = file_written_to
+                    self._written_bytes = 0
                 except IOError:
                     log.error(traceback.format_exc())
                     raise ValueError(
@@ -171,6 +180,7 @@ class EncryptedFileSaver(EncryptedFileDownloader):
                 file_handle.close()
                 if self.completed is False:
                     os.remove(name)
+                    self._written_bytes = 0
 
         return threads.deferToThread(close_file)
 
@@ -178,6 +188,7 @@ class EncryptedFileSaver(EncryptedFileDownloader):
         def write_func(data):
             if self.stopped is False and self.file_handle is not None:
                 self.file_handle.write(data)
+                self._written_bytes += len(data)
         return write_func
 
 
@@ -68,31 +68,29 @@ class ReflectorServer(Protocol):
     @defer.inlineCallbacks
     def check_head_blob_announce(self, stream_hash):
         head_blob_hash = yield self.storage.get_stream_blob_by_position(stream_hash, 0)
-        if head_blob_hash in self.blob_manager.blobs:
-            head_blob = self.blob_manager.blobs[head_blob_hash]
-            if head_blob.get_is_verified():
-                should_announce = yield self.blob_manager.get_should_announce(head_blob_hash)
-                if should_announce == 0:
-                    yield self.blob_manager.set_should_announce(head_blob_hash, 1)
-                    log.info("Discovered previously completed head blob (%s), "
-                             "setting it to be announced", head_blob_hash[:8])
+        head_blob = yield self.blob_manager.get_known_blob(head_blob_hash)
+        if head_blob is not None and head_blob.get_is_verified():
+            should_announce = yield self.blob_manager.get_should_announce(head_blob_hash)
+            if should_announce == 0:
+                yield self.blob_manager.set_should_announce(head_blob_hash, 1)
+                log.info("Discovered previously completed head blob (%s), "
+                         "setting it to be announced", head_blob_hash[:8])
         defer.returnValue(None)
 
     @defer.inlineCallbacks
     def check_sd_blob_announce(self, sd_hash):
-        if sd_hash in self.blob_manager.blobs:
-            sd_blob = self.blob_manager.blobs[sd_hash]
-            if sd_blob.get_is_verified():
-                should_announce = yield self.blob_manager.get_should_announce(sd_hash)
-                if should_announce == 0:
-                    yield self.blob_manager.set_should_announce(sd_hash, 1)
-                    log.info("Discovered previously completed sd blob (%s), "
-                             "setting it to be announced", sd_hash[:8])
-                    stream_hash = yield self.storage.get_stream_hash_for_sd_hash(sd_hash)
-                    if not stream_hash:
-                        log.info("Adding blobs to stream")
-                        sd_info = yield BlobStreamDescriptorReader(sd_blob).get_info()
-                        yield save_sd_info(self.blob_manager, sd_hash, sd_info)
+        sd_blob = yield self.blob_manager.get_known_blob(sd_hash)
+        if sd_blob is not None and sd_blob.get_is_verified():
+            should_announce = yield self.blob_manager.get_should_announce(sd_hash)
+            if should_announce == 0:
+                yield self.blob_manager.set_should_announce(sd_hash, 1)
+                log.info("Discovered previously completed sd blob (%s), "
+                         "setting it to be announced", sd_hash[:8])
+                stream_hash = yield self.storage.get_stream_hash_for_sd_hash(sd_hash)
+                if not stream_hash:
+                    log.info("Adding blobs to stream")
+                    sd_info = yield BlobStreamDescriptorReader(sd_blob).get_info()
+                    yield save_sd_info(self.blob_manager, sd_hash, sd_info)
         defer.returnValue(None)
 
     @defer.inlineCallbacks
@@ -152,6 +152,9 @@ class Announcer(object):
     def hash_queue_size(self):
         return 0
 
+    def announces_per_minute(self):
+        return 0
+
     def add_supplier(self, supplier):
         pass
 
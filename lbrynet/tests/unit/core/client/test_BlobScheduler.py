@@ -0,0 +1,75 @@
+from twisted.trial import unittest
+
+from lbrynet.core.Peer import Peer
+from lbrynet.core.client.BlobScheduler import BlobScheduler
+
+
+class FakeBlob(object):
+    def __init__(self, blob_hash):
+        self.blob_hash = blob_hash
+        self.writers = {}
+
+
+class BlobSchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = BlobScheduler()
+        self.peers = [Peer('1.2.3.%i' % i, 3333) for i in range(4)]
+        self.blobs = [FakeBlob('%02i' % i) for i in range(10)]
+        self.all_hashes = set(b.blob_hash for b in self.blobs)
+
+    def _hashes(self, blobs):
+        return [b.blob_hash for b in blobs]
+
+    def test_read_ahead_blobs_first(self):
+        ordered = self.scheduler.blobs_for_peer(self.peers[0], self.blobs, self.all_hashes)
+        self.assertEqual(['00', '01', '02', '03'], self._hashes(ordered[:4]))
+        self.assertEqual(10, len(ordered))
+
+    def test_distinct_blobs_per_peer(self):
+        for peer in self.peers:
+            blob = self.scheduler.blobs_for_peer(peer, self.blobs, self.all_hashes)[0]
+            blob.writers[peer] = None
+        self.assertEqual(['00', '01', '02', '03'],
+                         self._hashes(b for b in self.blobs if b.writers))
+        self.assertTrue(all(len(b.writers) <= 1 for b in self.blobs))
+
+    def test_rarest_blobs_after_read_ahead(self):
+        for blob in self.blobs:
+            for peer in self.peers:
+                self.scheduler.blob_available(blob.blob_hash, peer)
+        self.scheduler._sources['07'].clear()
+        self.scheduler.blob_available('07', self.peers[0])
+        self.scheduler._sources['05'].remove(self.peers[3])
+        ordered = self.scheduler.blobs_for_peer(self.peers[0], self.blobs, self.all_hashes)
+        self.assertEqual(['00', '01', '02', '03', '07', '05', '04', '06', '08', '09'],
+                         self._hashes(ordered))
+
+    def test_prioritized_blobs_first(self):
+        self.scheduler.prioritize_blobs(['07', '06'])
+        ordered = self.scheduler.blobs_for_peer(self.peers[0], self.blobs, self.all_hashes)
+        self.assertEqual(['07', '06', '00', '01'], self._hashes(ordered[:4]))
+        self.scheduler.prioritize_blobs(['09'])
+        ordered = self.scheduler.blobs_for_peer(self.peers[0], self.blobs, self.all_hashes)
+        self.assertEqual(['09', '00'], self._hashes(ordered[:2]))
+        self.assertFalse(self.scheduler.is_prioritized('07'))
+
+    def test_only_blobs_on_the_peer(self):
+        ordered = self.scheduler.blobs_for_peer(self.peers[0], self.blobs, {'03', '08'})
+        self.assertEqual(['03', '08'], self._hashes(ordered))
+
+    def test_no_duplicates_before_endgame(self):
+        for blob in self.blobs:
+            blob.writers[self.peers[1]] = None
+        self.assertEqual(
+            [], self.scheduler.blobs_for_peer(self.peers[0], self.blobs, self.all_hashes))
+
+    def test_endgame(self):
+        blobs = self.blobs[:BlobScheduler.ENDGAME_BLOBS]
+        for blob in blobs:
+            blob.writers[self.peers[1]] = None
+        blobs[0].writers[self.peers[2]] = None
+        ordered = self.scheduler.blobs_for_peer(self.peers[0], blobs, self.all_hashes)
+        # the blob already downloading from two peers isn't requested a third time
+        self.assertEqual(self._hashes(blobs[1:]), self._hashes(ordered))
+        # and the peer that is already downloading every blob doesn't get any of them again
+        self.assertEqual([], self.scheduler.blobs_for_peer(self.peers[1], blobs, self.all_hashes))
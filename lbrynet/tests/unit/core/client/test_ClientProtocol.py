@@ -0,0 +1,155 @@
+import json
+
+from twisted.trial import unittest
+from twisted.internet import defer, task
+from twisted.test import proto_helpers
+
+from lbrynet import conf
+from lbrynet.core import utils
+from lbrynet.core.Peer import Peer
+from lbrynet.core.RateLimiter import DummyRateLimiter
+from lbrynet.core.client.ClientProtocol import ClientProtocol, ClientProtocolFactory
+from lbrynet.core.client.ClientRequest import ClientBlobRequest
+
+
+class MocBlob(object):
+    def __init__(self, blob_hash):
+        self.blob_hash = blob_hash
+        self.length = None
+
+
+class MocBlobDownload(object):
+    def __init__(self, blob_hash, length):
+        self.length = length
+        self.data = ''
+        self.finished_deferred = defer.Deferred()
+        self.request = ClientBlobRequest({'requested_blob': blob_hash}, 'incoming_blob',
+                                         self.write, self.finished_deferred, self.cancel,
+                                         MocBlob(blob_hash))
+        self.response = None
+        self.request_deferred = None
+
+    def write(self, data):
+        self.data += data
+        if len(self.data) == self.length:
+            self.finished_deferred.callback(True)
+
+    def cancel(self, err):
+        if not self.finished_deferred.called:
+            self.finished_deferred.errback(err)
+
+    def response_message(self):
+        return json.dumps({'incoming_blob': {'blob_hash': self.request.blob.blob_hash,
+                                             'length': self.length}})
+
+
+class MocConnectionManager(object):
+    """Requests the given blobs, as many at a time as the protocol allows"""
+    def __init__(self, downloads):
+        self.downloads = list(downloads)
+
+    def get_next_request(self, peer, protocol):
+        sent = False
+        while self.downloads and protocol.can_add_blob_request():
+            download = self.downloads.pop(0)
+            download.request_deferred = protocol.add_blob_request(download.request)
+            download.request_deferred.addCallback(self._got_response, download)
+            sent = True
+        return defer.succeed(sent)
+
+    def _got_response(self, response, download):
+        download.response = response
+
+
+class ClientProtocolTest(unittest.TestCase):
+    def setUp(self):
+        conf.initialize_settings()
+        self.clock = task.Clock()
+        self._call_later = utils.call_later
+        utils.call_later = self.clock.callLater
+        self.downloads = [MocBlobDownload(c * 96, i + 1) for i, c in enumerate('abcdef')]
+        self.factory = ClientProtocolFactory(Peer('1.2.3.4', 3333), DummyRateLimiter(),
+                                             MocConnectionManager(self.downloads))
+        self.transport = proto_helpers.StringTransport()
+
+    def tearDown(self):
+        utils.call_later = self._call_later
+        conf.settings = None
+
+    def _connect(self):
+        self.protocol = self.factory.buildProtocol(None)
+        self.protocol.makeConnection(self.transport)
+
+    def _sent_requests(self):
+        sent = self.transport.value()
+        self.transport.clear()
+        decoder = json.JSONDecoder()
+        requests = []
+        while sent:
+            request, end = decoder.raw_decode(sent)
+            requests.append(request)
+            sent = sent[end:]
+        return requests
+
+    def _response(self, download, extra=None):
+        response = json.loads(download.response_message())
+        response.update(extra or {})
+        return json.dumps(response) + 'x' * download.length
+
+    def test_pipelined_blob_requests(self):
+        self._connect()
+        max_requests = ClientProtocol.MAX_PIPELINED_REQUESTS
+        self.assertEqual(self._sent_requests(), [
+            {'requested_blob': 'a' * 96, 'pipelined_requests': max_requests}
+        ])
+        # the peer accepts pipelining, the next request is sent while the blob downloads
+        response = self._response(self.downloads[0], {'pipelined_requests': 2})
+        self.protocol.dataReceived(response[:-self.downloads[0].length])
+        self.assertEqual(self._sent_requests(), [{'requested_blob': 'b' * 96}])
+        self.protocol.dataReceived(response[-self.downloads[0].length:])
+        self.assertEqual(self._sent_requests(), [{'requested_blob': 'c' * 96}])
+        # several responses and blobs in one chunk are split at the blob lengths
+        self.protocol.dataReceived(self._response(self.downloads[1]) +
+                                   self._response(self.downloads[2]))
+        self.assertEqual(self._sent_requests(),
+                         [{'requested_blob': 'd' * 96}, {'requested_blob': 'e' * 96}])
+        for download in self.downloads[:3]:
+            self.assertEqual(download.data, 'x' * download.length)
+            self.assertEqual(download.response['incoming_blob']['length'], download.length)
+        self.assertFalse(self.transport.disconnecting)
+
+    def test_peer_without_pipelining(self):
+        self._connect()
+        self._sent_requests()
+        self.assertFalse(self.protocol.can_add_blob_request())
+        response = self._response(self.downloads[0])
+        # the first byte arrives with the response and the rest separately
+        self.protocol.dataReceived(response[:-self.downloads[0].length + 1])
+        self.assertEqual(self._sent_requests(), [])
+        self.protocol.dataReceived(response[-self.downloads[0].length + 1:])
+        self.assertEqual(self.downloads[0].data, 'x' * self.downloads[0].length)
+        self.assertFalse(self.protocol.can_add_blob_request())
+        self.assertEqual(self._sent_requests(), [{'requested_blob': 'b' * 96}])
+
+    def test_unavailable_blob_in_pipeline(self):
+        self._connect()
+        self._sent_requests()
+        self.protocol.dataReceived(self._response(self.downloads[0], {'pipelined_requests': 4}))
+        self._sent_requests()
+        error = json.dumps({'incoming_blob': {'error': 'BLOB_UNAVAILABLE'}})
+        self.protocol.dataReceived(error + self._response(self.downloads[2]))
+        self.assertTrue(self.downloads[1].finished_deferred.called)
+        self.assertEqual(self.downloads[1].data, '')
+        self.assertEqual(self.downloads[2].data, 'x' * self.downloads[2].length)
+        # the canceled download closes the connection, as it does without pipelining
+        self.assertTrue(self.transport.disconnecting)
+
+    def test_response_and_large_blob_chunk(self):
+        # the response size limit only applies while the response is incomplete
+        download = MocBlobDownload('g' * 96, conf.settings['MAX_RESPONSE_INFO_SIZE'] * 2)
+        self.factory.connection_manager.downloads.insert(0, download)
+        self._connect()
+        self._sent_requests()
+        self.protocol.dataReceived(self._response(download, {'pipelined_requests': 4}))
+        self.assertEqual(download.data, 'x' * download.length)
+        self.assertFalse(self.transport.disconnecting)
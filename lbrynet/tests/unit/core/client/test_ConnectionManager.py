@@ -267,3 +267,118 @@ class TestIntegrationConnectionManager(unittest.TestCase):
         self.assertEqual(0, self.TEST_PEER.down_count)
 
 
+
+
+class MocProtocol(object):
+    def __init__(self):
+        self.canceled = False
+
+    def cancel_requests(self):
+        self.canceled = True
+        return defer.succeed(True)
+
+
+class MocConnection(object):
+    def __init__(self):
+        self.disconnected = False
+
+    def disconnect(self):
+        self.disconnected = True
+
+
+class TestAdaptiveConnections(unittest.TestCase):
+    def setUp(self):
+        conf.initialize_settings()
+        from lbrynet.core.client.ConnectionManager import ConnectionManager
+        self.connection_manager = ConnectionManager(MocDownloader(), RateLimiter(),
+                                                    [MocRequestCreator([])], [])
+        self.peers = [Peer('1.2.3.%i' % i, 3333) for i in range(30)]
+
+    def tearDown(self):
+        conf.settings = None
+
+    def _connect(self, peers):
+        from lbrynet.core.client.ClientProtocol import ClientProtocolFactory
+        from lbrynet.core.client.ConnectionManager import PeerConnectionHandler
+        for peer in peers:
+            factory = ClientProtocolFactory(peer, None, self.connection_manager)
+            factory.p = MocProtocol()
+            handler = PeerConnectionHandler([], factory)
+            handler.connection = MocConnection()
+            self.connection_manager._peer_connections[peer] = handler
+
+    def _fill_connections(self):
+        connected = len(self.connection_manager._peer_connections)
+        needed = self.connection_manager.max_connections_per_stream - connected
+        self._connect(self.peers[connected:connected + needed])
+
+    def test_choose_fast_and_new_peers_first(self):
+        fast, new, slow = self.peers[:3]
+        fast.download_rate = 10 * 2 ** 20
+        slow.download_rate = 2 ** 20
+        slow.latency = 1.0
+        for _ in range(10):
+            self.assertEqual(
+                [fast, new, slow],
+                self.connection_manager.return_shuffled_peers_not_connected_to(
+                    [slow, new, fast], 3))
+        self._connect([fast])
+        self.assertEqual([new],
+                         self.connection_manager.return_shuffled_peers_not_connected_to(
+                             [slow, new, fast], 1))
+
+    def test_add_connections_until_bandwidth_stops_improving(self):
+        manager = self.connection_manager
+        start = manager.max_connections_per_stream
+        self.assertTrue(start < 8)
+        # bandwidth grows by 1MB/s per connection up to 8 connections
+        for _ in range(9 - start):
+            self._fill_connections()
+            manager._adjust_max_connections(
+                min(manager.max_connections_per_stream, 8) * 2 ** 20)
+        self.assertEqual(9, manager.max_connections_per_stream)
+        # the ninth connection doesn't help, so it is backed out and the limit holds still
+        self._fill_connections()
+        manager._adjust_max_connections(8 * 2 ** 20)
+        self.assertEqual(8, manager.max_connections_per_stream)
+        for _ in range(manager.CONNECTION_CHANGE_HOLD):
+            manager._adjust_max_connections(8 * 2 ** 20)
+            self.assertEqual(8, manager.max_connections_per_stream)
+        # then fewer connections are tried, and the limit goes back up when that is worse
+        manager._adjust_max_connections(8 * 2 ** 20)
+        self.assertEqual(7, manager.max_connections_per_stream)
+        manager._adjust_max_connections(7 * 2 ** 20)
+        self.assertEqual(8, manager.max_connections_per_stream)
+
+    def test_remove_connections_that_dont_help(self):
+        manager = self.connection_manager
+        manager.max_connections_per_stream = 10
+        manager._last_bandwidth = 4 * 2 ** 20
+        manager._connection_step = 0
+        self._fill_connections()
+        for _ in range(20):
+            manager._adjust_max_connections(4 * 2 ** 20)
+        self.assertEqual(manager.MIN_CONNECTIONS_PER_STREAM, manager.max_connections_per_stream)
+
+    def test_no_change_without_enough_peers(self):
+        manager = self.connection_manager
+        start = manager.max_connections_per_stream
+        self._connect(self.peers[:start - 1])
+        manager._adjust_max_connections(2 ** 20)
+        manager._adjust_max_connections(10 * 2 ** 20)
+        self.assertEqual(start, manager.max_connections_per_stream)
+
+    def test_close_slow_peer(self):
+        self._connect(self.peers[:4])
+        for peer in self.peers[:4]:
+            peer.download_rate = 4 * 2 ** 20
+        self.connection_manager._close_slow_peer()
+        self.assertFalse(any(handler.connection.disconnected
+                             for handler in self.connection_manager._peer_connections.values()))
+        self.peers[2].download_rate = 2 ** 19
+        self.connection_manager._close_slow_peer()
+        handler = self.connection_manager._peer_connections[self.peers[2]]
+        self.assertTrue(handler.factory.p.canceled)
+        self.assertTrue(handler.connection.disconnected)
+        self.assertEqual(1, len([h for h in self.connection_manager._peer_connections.values()
+                                 if h.connection.disconnected]))
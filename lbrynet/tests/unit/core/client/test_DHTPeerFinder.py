@@ -0,0 +1,101 @@
+import binascii
+
+from twisted.trial import unittest
+from twisted.internet import defer, task
+
+from lbrynet.core.PeerManager import PeerManager
+from lbrynet.core.client.DHTPeerFinder import DHTPeerFinder
+from lbrynet.tests.util import random_lbry_hash
+
+
+class MocDHTNode(object):
+    def __init__(self):
+        self.externalIP = '127.0.0.1'
+        self.peerPort = 3333
+        self.searches = []
+
+    def getPeersForBlob(self, blob_hash):
+        d = defer.Deferred()
+        self.searches.append((binascii.hexlify(blob_hash), d))
+        return d
+
+
+class DHTPeerFinderTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = task.Clock()
+        self.dht_node = MocDHTNode()
+        self.peer_finder = DHTPeerFinder(self.dht_node, PeerManager(), clock=self.clock)
+        self.blob_hash = random_lbry_hash()
+        self.peers = [('1.2.3.4', 3333), ('1.2.3.5', 3333)]
+
+    def _finish_search(self, peers, index=-1):
+        self.dht_node.searches[index][1].callback(peers)
+
+    def _addresses(self, peers):
+        return sorted((peer.host, peer.port) for peer in peers)
+
+    def test_concurrent_searches_are_coalesced(self):
+        d1 = self.peer_finder.find_peers_for_blob(self.blob_hash)
+        d2 = self.peer_finder.find_peers_for_blob(self.blob_hash)
+        self.assertEqual(len(self.dht_node.searches), 1)
+        self._finish_search(self.peers)
+        self.assertEqual(self._addresses(self.successResultOf(d1)), self.peers)
+        self.assertEqual(self._addresses(self.successResultOf(d2)), self.peers)
+
+    def test_cached_until_ttl(self):
+        self.peer_finder.find_peers_for_blob(self.blob_hash)
+        self._finish_search(self.peers)
+        self.clock.advance(self.peer_finder.PEER_CACHE_TTL - self.peer_finder.PEER_CACHE_REFRESH - 1)
+        d = self.peer_finder.find_peers_for_blob(self.blob_hash)
+        self.assertEqual(self._addresses(self.successResultOf(d)), self.peers)
+        self.assertEqual(len(self.dht_node.searches), 1)
+        self.clock.advance(self.peer_finder.PEER_CACHE_REFRESH + 1)
+        d = self.peer_finder.find_peers_for_blob(self.blob_hash)
+        self.assertNoResult(d)
+        self.assertEqual(len(self.dht_node.searches), 2)
+
+    def test_refresh_before_expiring(self):
+        self.peer_finder.find_peers_for_blob(self.blob_hash)
+        self._finish_search(self.peers)
+        self.clock.advance(self.peer_finder.PEER_CACHE_TTL - self.peer_finder.PEER_CACHE_REFRESH)
+        # the cached peers are returned while a refresh runs in the background
+        d = self.peer_finder.find_peers_for_blob(self.blob_hash)
+        self.assertEqual(self._addresses(self.successResultOf(d)), self.peers)
+        self.assertEqual(len(self.dht_node.searches), 2)
+        self.peer_finder.find_peers_for_blob(self.blob_hash)
+        self.assertEqual(len(self.dht_node.searches), 2)
+        new_peers = [('1.2.3.6', 3333)]
+        self._finish_search(new_peers)
+        self.clock.advance(self.peer_finder.PEER_CACHE_REFRESH)
+        d = self.peer_finder.find_peers_for_blob(self.blob_hash)
+        self.assertEqual(self._addresses(self.successResultOf(d)), new_peers)
+        self.assertEqual(len(self.dht_node.searches), 2)
+
+    def test_empty_result_cached_briefly(self):
+        self.peer_finder.find_peers_for_blob(self.blob_hash)
+        self._finish_search([])
+        self.clock.advance(self.peer_finder.EMPTY_PEER_CACHE_TTL)
+        self.peer_finder.find_peers_for_blob(self.blob_hash)
+        self.assertEqual(len(self.dht_node.searches), 2)
+
+    def test_timeout_caches_late_result(self):
+        d = self.peer_finder.find_peers_for_blob(self.blob_hash, timeout=5)
+        self.clock.advance(5)
+        self.assertEqual(self.successResultOf(d), [])
+        self._finish_search(self.peers)
+        d = self.peer_finder.find_peers_for_blob(self.blob_hash, timeout=5)
+        self.assertEqual(self._addresses(self.successResultOf(d)), self.peers)
+        self.assertEqual(len(self.dht_node.searches), 1)
+
+    def test_cache_size_is_limited(self):
+        self.peer_finder.PEER_CACHE_SIZE = 10
+        blob_hashes = [random_lbry_hash() for _ in range(20)]
+        for blob_hash in blob_hashes:
+            self.peer_finder.find_peers_for_blob(blob_hash)
+            self._finish_search(self.peers)
+        self.assertEqual(list(self.peer_finder._peer_cache), blob_hashes[10:])
+
+    def test_filter_self(self):
+        d = self.peer_finder.find_peers_for_blob(self.blob_hash, filter_self=True)
+        self._finish_search(self.peers + [('127.0.0.1', 3333)])
+        self.assertEqual(self._addresses(self.successResultOf(d)), self.peers)
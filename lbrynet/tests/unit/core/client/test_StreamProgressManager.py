@@ -0,0 +1,93 @@
+from twisted.trial import unittest
+
+from lbrynet.core.client.StreamProgressManager import BlobNumSet, FullStreamProgressManager
+
+
+class FakeBlob(object):
+    def __init__(self, blob_num, verified=False):
+        self.blob_hash = 'blob%i' % blob_num
+        self.verified = verified
+
+    def get_is_verified(self):
+        return self.verified
+
+
+class FakeDownloadManager(object):
+    def __init__(self):
+        self.blobs = {}
+
+
+class BlobNumSetTest(unittest.TestCase):
+    def test_add_and_discard(self):
+        blob_nums = BlobNumSet()
+        self.assertEqual(0, blob_nums.lowest_missing())
+        for blob_num in (1, 2, 20):
+            blob_nums.add(blob_num)
+        self.assertEqual(0, blob_nums.lowest_missing())
+        blob_nums.add(0)
+        blob_nums.add(0)
+        self.assertEqual(3, blob_nums.lowest_missing())
+        self.assertEqual(4, len(blob_nums))
+        self.assertIn(20, blob_nums)
+        self.assertNotIn(19, blob_nums)
+        self.assertNotIn(1000, blob_nums)
+        blob_nums.discard(1)
+        blob_nums.discard(1000)
+        self.assertEqual(1, blob_nums.lowest_missing())
+        self.assertEqual(3, len(blob_nums))
+
+
+class FullStreamProgressManagerTest(unittest.TestCase):
+    def setUp(self):
+        self.download_manager = FakeDownloadManager()
+        self.progress_manager = FullStreamProgressManager(None, None, self.download_manager)
+        self.progress_manager.stopped = True
+
+    def _add_blobs(self, *blob_nums, **kwargs):
+        for blob_num in blob_nums:
+            self.download_manager.blobs[blob_num] = FakeBlob(blob_num, **kwargs)
+
+    def _downloaded(self, blob_num):
+        blob = self.download_manager.blobs[blob_num]
+        blob.verified = True
+        self.progress_manager.blob_downloaded(blob, blob_num)
+
+    def _needed(self):
+        return [b.blob_hash for b in self.progress_manager.needed_blobs()]
+
+    def test_stream_position(self):
+        self.assertEqual(0, self.progress_manager.stream_position())
+        self._add_blobs(0, 1, 2, 3)
+        self._add_blobs(4, verified=True)
+        self.assertEqual(0, self.progress_manager.stream_position())
+        self._downloaded(1)
+        self._downloaded(0)
+        self.assertEqual(2, self.progress_manager.stream_position())
+        self._downloaded(3)
+        self._downloaded(2)
+        self.assertEqual(5, self.progress_manager.stream_position())
+        self._add_blobs(5)
+        self.assertEqual(5, self.progress_manager.stream_position())
+
+    def test_needed_blobs(self):
+        self._add_blobs(0, 1, 2, 3)
+        self._add_blobs(2, verified=True)
+        needed = self.progress_manager.needed_blobs()
+        self.assertEqual(['blob0', 'blob1', 'blob3'], self._needed())
+        # the list is only rebuilt after it has changed
+        self.assertIs(needed, self.progress_manager.needed_blobs())
+        self.progress_manager.provided_blob_nums.add(0)
+        self.progress_manager._blob_done(0)
+        self._downloaded(3)
+        self.assertEqual(['blob1'], self._needed())
+        self.assertTrue(self.progress_manager.is_blob_needed(1))
+        self.assertFalse(self.progress_manager.is_blob_needed(3))
+        self.assertFalse(self.progress_manager.is_blob_needed(4))
+        self.assertEqual(1, self.progress_manager.num_needed_blobs())
+        self._add_blobs(4)
+        self.assertEqual(['blob1', 'blob4'], self._needed())
+        # verified without a download event
+        self.download_manager.blobs[4].verified = True
+        self._downloaded(1)
+        self.assertEqual([], self._needed())
+        self.assertEqual(5, self.progress_manager.stream_position())
@@ -1,4 +1,5 @@
 import StringIO
+import tempfile
 
 import mock
 from twisted.internet import defer
@@ -128,3 +129,22 @@ class TestBlobRequestHandlerSender(unittest.TestCase):
         while consumer.producer:
             consumer.producer.resumeProducing()
         self.assertEqual(consumer.value(), 'test')
+
+    def test_mapped_file_is_sent_to_consumer(self):
+        mock_conf_settings(self)
+        consumer = proto_helpers.StringTransport()
+        chunk_size = BlobRequestHandler.MappedFileSender.CHUNK_SIZE
+        content = ''.join(chr(i % 256) for i in range(chunk_size * 2 + 7))
+        test_file = tempfile.TemporaryFile()
+        test_file.write(content)
+        test_file.seek(0)
+        handler = BlobRequestHandler.BlobRequestHandler(None, None, None, None)
+        handler.peer = mock.create_autospec(Peer.Peer)
+        handler.currently_uploading = mock.Mock()
+        handler.read_handle = test_file
+        handler.send_blob_if_requested(consumer)
+        self.assertIsInstance(handler.file_sender, BlobRequestHandler.MappedFileSender)
+        while consumer.producer:
+            consumer.producer.resumeProducing()
+        self.assertEqual(consumer.value(), content)
+        self.assertEqual(handler.blob_bytes_uploaded, len(content))
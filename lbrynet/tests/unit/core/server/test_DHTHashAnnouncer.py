@@ -1,16 +1,33 @@
+import binascii
+
 from twisted.trial import unittest
 from twisted.internet import defer, task
 
 from lbrynet.core import utils
+from lbrynet.dht import constants
+from lbrynet.dht.contact import Contact
 from lbrynet.tests.util import random_lbry_hash
 
+
 class MocDHTNode(object):
-    def __init__(self):
+    def __init__(self, clock, contacts=None):
+        self.clock = clock
+        self.contacts = contacts or []
         self.blobs_announced = 0
+        self.lookups = []
+        self.announced_batches = []
+
+    def iterativeFindNode(self, key):
+        self.lookups.append(binascii.hexlify(key))
+        d = defer.Deferred()
+        self.clock.callLater(1, d.callback, self.contacts)
+        return d
+
+    def announceHaveBlobs(self, blob_hashes, contacts):
+        self.blobs_announced += len(blob_hashes)
+        self.announced_batches.append(sorted(binascii.hexlify(h) for h in blob_hashes))
+        return defer.succeed([len(contacts)] * len(blob_hashes))
 
-    def announceHaveBlob(self, blob):
-        self.blobs_announced += 1
-        return defer.succeed(True)
 
 class MocSupplier(object):
     def __init__(self, blobs_to_announce):
@@ -23,6 +40,11 @@ class MocSupplier(object):
         else:
             return defer.succeed([])
 
+
+def xor_hash(blob_hash, value):
+    return ('%x' % (long(blob_hash, 16) ^ value)).zfill(len(blob_hash))
+
+
 class DHTHashAnnouncerTest(unittest.TestCase):
 
     def setUp(self):
@@ -31,7 +53,7 @@ class DHTHashAnnouncerTest(unittest.TestCase):
         for i in range(0, self.num_blobs):
             self.blobs_to_announce.append(random_lbry_hash())
         self.clock = task.Clock()
-        self.dht_node = MocDHTNode()
+        self.dht_node = MocDHTNode(self.clock)
         utils.call_later = self.clock.callLater
         from lbrynet.core.server.DHTHashAnnouncer import DHTHashAnnouncer
         self.announcer = DHTHashAnnouncer(self.dht_node, peer_port=3333)
@@ -44,6 +66,7 @@ class DHTHashAnnouncerTest(unittest.TestCase):
         self.clock.advance(1)
         self.assertEqual(self.dht_node.blobs_announced, self.num_blobs)
         self.assertEqual(self.announcer.hash_queue_size(), 0)
+        self.assertEqual(self.announcer.announces_per_minute(), self.num_blobs)
 
     def test_immediate_announce(self):
         # Test that immediate announce puts a hash at the front of the queue
@@ -53,3 +76,35 @@ class DHTHashAnnouncerTest(unittest.TestCase):
         self.assertEqual(self.announcer.hash_queue_size(), self.announcer.CONCURRENT_ANNOUNCERS+1)
         self.assertEqual(blob_hash, self.announcer.hash_queue[0][0])
 
+    def test_nearby_hashes_share_lookup(self):
+        # contacts within 2**20 of the first blob, so hashes sharing all but the last
+        # 20 bits with it have the same closest nodes
+        key = self.blobs_to_announce[0]
+        self.dht_node.contacts = [
+            Contact(binascii.unhexlify(xor_hash(key, 2 ** 19 + i)), '127.0.0.1', 4444, None)
+            for i in range(constants.k)
+        ]
+        near = xor_hash(key, 1)
+        far = xor_hash(key, 2 ** 200)
+        self.announcer.concurrent_announcers = 1
+        d = self.announcer._announce_hashes([key, far, near])
+        self.clock.advance(1)
+        self.assertEqual(self.dht_node.lookups, [key, far])
+        self.assertEqual(self.dht_node.announced_batches, [sorted([key, near])])
+        self.clock.advance(1)
+        self.assertEqual(self.dht_node.announced_batches, [sorted([key, near]), [far]])
+        self.assertEqual(self.announcer.hash_queue_size(), 0)
+        self.assertTrue(d.called)
+
+    def test_concurrency_follows_lookup_time(self):
+        self.announcer._update_concurrency(10)
+        self.assertEqual(self.announcer.concurrent_announcers,
+                         10 * self.announcer.TARGET_LOOKUPS_PER_SECOND)
+        for _ in range(50):
+            self.announcer._update_concurrency(0.1)
+        self.assertEqual(self.announcer.concurrent_announcers,
+                         self.announcer.MIN_CONCURRENT_ANNOUNCERS)
+        for _ in range(50):
+            self.announcer._update_concurrency(1000)
+        self.assertEqual(self.announcer.concurrent_announcers,
+                         self.announcer.MAX_CONCURRENT_ANNOUNCERS)
@@ -0,0 +1,124 @@
+import json
+
+from twisted.trial import unittest
+from twisted.internet import defer
+
+from lbrynet.core.server.ServerRequestHandler import ServerRequestHandler
+
+
+class MocConsumer(object):
+    def __init__(self):
+        self.written = []
+        self.producer = None
+
+    def registerProducer(self, producer, streaming):
+        self.producer = producer
+
+    def unregisterProducer(self):
+        self.producer = None
+
+    def write(self, data):
+        self.written.append(data)
+
+
+class MocPullProducer(object):
+    def __init__(self, consumer, chunks):
+        self.consumer = consumer
+        self.chunks = list(chunks)
+
+    def resumeProducing(self):
+        if self.chunks:
+            self.consumer.write(self.chunks.pop(0))
+        else:
+            self.consumer.unregisterProducer()
+
+    def stopProducing(self):
+        pass
+
+
+class ServerRequestHandlerTest(unittest.TestCase):
+    def setUp(self):
+        self.consumer = MocConsumer()
+        self.handler = ServerRequestHandler(self.consumer)
+
+    def test_response_is_written_before_blob_data(self):
+        self.handler.send_response({'incoming_blob': {}})
+        self.handler.registerProducer(MocPullProducer(self.handler, ['a', 'b']), False)
+        self.assertEqual(['{"incoming_blob": {}}', 'a', 'b'], self.consumer.written)
+        self.assertIsNone(self.handler.producer)
+
+    def test_paused_by_rate_limiter(self):
+        self.handler.pauseProducing()
+        self.handler.send_response({})
+        self.handler.registerProducer(MocPullProducer(self.handler, ['a', 'b']), False)
+        self.assertEqual([], self.consumer.written)
+        self.handler.resumeProducing()
+        self.assertEqual(['{}', 'a', 'b'], self.consumer.written)
+
+    def test_paused_by_transport(self):
+        producer = MocPullProducer(self.handler, ['a', 'b', 'c'])
+        self.handler.pause_writing()
+        self.handler.registerProducer(producer, False)
+        self.assertEqual([], self.consumer.written)
+        self.assertEqual(['a', 'b', 'c'], producer.chunks)
+        self.handler.resume_writing()
+        self.assertEqual(['a', 'b', 'c'], self.consumer.written)
+
+    def test_both_pauses_must_be_lifted(self):
+        self.handler.pauseProducing()
+        self.handler.pause_writing()
+        self.handler.send_response({})
+        self.handler.resume_writing()
+        self.assertEqual([], self.consumer.written)
+        self.handler.resumeProducing()
+        self.assertEqual(['{}'], self.consumer.written)
+
+
+class MocQueryHandler(object):
+    def handle_queries(self, queries):
+        if 'requested_blob' in queries:
+            return defer.succeed({'incoming_blob': {'blob_hash': queries['requested_blob']}})
+        return defer.succeed({})
+
+
+class MocBlobSender(object):
+    """Sends each requested blob as two chunks, finishing when the test says so"""
+    def __init__(self):
+        self.producers = []
+        self.finished = []
+
+    def send_blob_if_requested(self, consumer):
+        producer = MocPullProducer(consumer, ['blob', 'data'])
+        d = defer.Deferred()
+        self.producers.append(producer)
+        self.finished.append(d)
+        consumer.registerProducer(producer, False)
+        return d
+
+
+class PipelinedRequestsTest(unittest.TestCase):
+    def setUp(self):
+        self.consumer = MocConsumer()
+        self.handler = ServerRequestHandler(self.consumer)
+        self.handler.register_query_handler(MocQueryHandler(), ['requested_blob'])
+        self.blob_sender = MocBlobSender()
+        self.handler.register_blob_sender(self.blob_sender)
+
+    def test_requests_are_answered_in_order(self):
+        self.handler.data_received(
+            '{"requested_blob": "a", "pipelined_requests": 4}{"requested_blob": "b"}{"requested')
+        self.assertEqual({'incoming_blob': {'blob_hash': 'a'}, 'pipelined_requests': 4},
+                         json.loads(self.consumer.written[0]))
+        self.assertEqual(['blob', 'data'], self.consumer.written[1:])
+        self.handler.data_received('_blob": "c"}')
+        self.assertEqual(1, len(self.blob_sender.finished))
+        self.blob_sender.finished[0].callback(True)
+        self.assertEqual('{"incoming_blob": {"blob_hash": "b"}}', self.consumer.written[3])
+        self.blob_sender.finished[1].callback(True)
+        self.assertEqual('{"incoming_blob": {"blob_hash": "c"}}', self.consumer.written[6])
+        self.blob_sender.finished[2].callback(True)
+        self.assertEqual(9, len(self.consumer.written))
+
+    def test_too_many_queued_requests(self):
+        self.handler.data_received('{"requested_blob": "a"}' * 10)
+        self.assertIsNone(self.consumer.producer)
@@ -0,0 +1,73 @@
+from twisted.trial import unittest
+
+from lbrynet.blob import BlobFile, BlobCache
+from lbrynet.tests.util import mk_db_and_blob_dir, rm_db_and_blob_dir, random_lbry_hash
+
+
+class BlobCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.db_dir, self.blob_dir = mk_db_and_blob_dir()
+        self.cache = BlobCache(3)
+
+    def tearDown(self):
+        rm_db_and_blob_dir(self.db_dir, self.blob_dir)
+
+    def _add_blobs(self, count):
+        blob_hashes = []
+        for i in range(count):
+            blob_hash = random_lbry_hash()
+            self.cache[blob_hash] = BlobFile(self.blob_dir, blob_hash)
+            blob_hashes.append(blob_hash)
+        return blob_hashes
+
+    def test_evicts_least_recently_used(self):
+        blob_hashes = self._add_blobs(3)
+        self.cache.get(blob_hashes[0])
+        self._add_blobs(1)
+        self.assertEqual(3, len(self.cache))
+        self.assertEqual(1, self.cache.evictions)
+        self.assertIn(blob_hashes[0], self.cache.keys())
+        self.assertNotIn(blob_hashes[1], self.cache.keys())
+
+    def test_does_not_evict_open_blobs(self):
+        blob_hashes = self._add_blobs(3)
+        self.cache.get(blob_hashes[0]).open_for_writing(peer=1)
+        self._add_blobs(5)
+        self.assertIn(blob_hashes[0], self.cache.keys())
+        self.assertEqual(3, len(self.cache))
+
+    def test_grows_when_every_blob_is_open(self):
+        blob_hashes = []
+        for i in range(4):
+            blob_hash = random_lbry_hash()
+            blob = BlobFile(self.blob_dir, blob_hash)
+            blob.open_for_writing(peer=1)
+            self.cache[blob_hash] = blob
+            blob_hashes.append(blob_hash)
+        self.assertEqual(4, len(self.cache))
+        self.assertEqual(0, self.cache.evictions)
+        self.assertEqual(blob_hashes, self.cache.keys())
+
+    def test_referenced_blob_is_not_duplicated(self):
+        blob_hashes = self._add_blobs(1)
+        blob = self.cache.get(blob_hashes[0])
+        self._add_blobs(3)
+        self.assertNotIn(blob_hashes[0], self.cache.keys())
+        self.assertIn(blob_hashes[0], self.cache)
+        self.assertIs(blob, self.cache.get(blob_hashes[0]))
+
+    def test_stats(self):
+        blob_hashes = self._add_blobs(4)
+        self.cache.get(blob_hashes[-1])
+        self.cache.get(random_lbry_hash())
+        stats = self.cache.get_stats()
+        self.assertEqual(1, stats['hits'])
+        self.assertEqual(1, stats['misses'])
+        self.assertEqual(1, stats['evictions'])
+        self.assertEqual(3, stats['cached_blobs'])
+
+    def test_delete(self):
+        blob_hashes = self._add_blobs(1)
+        del self.cache[blob_hashes[0]]
+        self.assertNotIn(blob_hashes[0], self.cache)
+        self.assertRaises(KeyError, self.cache.__delitem__, blob_hashes[0])
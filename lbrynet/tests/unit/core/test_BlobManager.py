@@ -138,3 +138,52 @@ class BlobManagerTest(unittest.TestCase):
         count = yield self.bm.count_should_announce_blobs()
         self.assertEqual(0, count)
 
+    @defer.inlineCallbacks
+    def test_should_announce_unknown_blob(self):
+        blob_hash = random_lbry_hash()
+        out = yield self.bm.set_should_announce(blob_hash, should_announce=True)
+        self.assertFalse(out)
+        self.assertNotIn(blob_hash, self.bm.blobs)
+        blob = yield self.bm.get_known_blob(blob_hash)
+        self.assertIsNone(blob)
+
+    @defer.inlineCallbacks
+    def test_completed_blobs(self):
+        blob_hashes = []
+        for i in range(0, 3):
+            blob_hash = yield self._create_and_add_blob()
+            blob_hashes.append(blob_hash)
+        unknown_blob_hash = random_lbry_hash()
+        completed = yield self.bm.completed_blobs(blob_hashes + [unknown_blob_hash])
+        self.assertEqual(blob_hashes, completed)
+
+        yield self.bm.delete_blobs([blob_hashes[0]])
+        completed = yield self.bm.completed_blobs(blob_hashes)
+        self.assertEqual(blob_hashes[1:], completed)
+
+        # the finished blobs are loaded from storage on startup
+        bm = DiskBlobManager(DummyHashAnnouncer(), self.blob_dir, self.bm.storage)
+        yield bm.setup()
+        completed = yield bm.completed_blobs(blob_hashes)
+        self.assertEqual(blob_hashes[1:], completed)
+
+    @defer.inlineCallbacks
+    def test_wait_for_blob(self):
+        yield self.bm.setup()
+        data = 'some blob data'
+        hashobj = get_lbry_hash_obj()
+        hashobj.update(data)
+        blob_hash = hashobj.hexdigest()
+        waiting = self.bm.wait_for_blob(blob_hash)
+        cancelled = self.bm.wait_for_blob(blob_hash)
+        cancelled.addErrback(lambda err: err.trap(defer.CancelledError))
+        cancelled.cancel()
+        self.assertFalse(waiting.called)
+
+        blob = yield self.bm.get_blob(blob_hash, len(data))
+        writer, finished_d = yield blob.open_for_writing(self.peer)
+        yield writer.write(data)
+        yield self.bm.blob_completed(blob)
+        self.assertTrue(waiting.called)
+        self.assertEqual({}, self.bm._blob_waiters)
+        self.assertTrue(self.bm.wait_for_blob(blob_hash).called)
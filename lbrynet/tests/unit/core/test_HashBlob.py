@@ -1,3 +1,4 @@
+import os
 from lbrynet.blob import BlobFile
 from lbrynet.core.Error import DownloadCanceledError, InvalidDataError
 
@@ -154,3 +155,37 @@ class BlobFileTest(unittest.TestCase):
         # second write should fail to save
         yield self.assertFailure(blob_file.save_verified_blob(writer_2), DownloadCanceledError)
 
+
+    @defer.inlineCallbacks
+    def test_temp_files_are_removed(self):
+        # a failed writer should remove its temporary file, a successful one should
+        # leave only the blob file in the blob directory
+        blob_file = BlobFile(self.blob_dir, self.fake_content_hash, self.fake_content_len)
+        writer_1, finished_d_1 = blob_file.open_for_writing(peer=1)
+        writer_2, finished_d_2 = blob_file.open_for_writing(peer=2)
+        self.assertEqual(2, len(os.listdir(self.blob_dir)))
+        writer_1.write(self.fake_content[:self.fake_content_len/2])
+        writer_1.close()
+        yield self.assertFailure(finished_d_1, DownloadCanceledError)
+        self.assertEqual(1, len(os.listdir(self.blob_dir)))
+        writer_2.write(self.fake_content)
+        yield finished_d_2
+        self.assertEqual([self.fake_content_hash], os.listdir(self.blob_dir))
+
+    @defer.inlineCallbacks
+    def test_verified_callbacks(self):
+        blob_file = BlobFile(self.blob_dir, self.fake_content_hash, self.fake_content_len)
+        verified, removed = [], []
+        blob_file.add_verified_callback(verified.append)
+        blob_file.add_verified_callback(removed.append)
+        blob_file.remove_verified_callback(removed.append)
+        writer_1, finished_d_1 = blob_file.open_for_writing(peer=1)
+        writer_1.write(self.fake_content[:self.fake_content_len/2])
+        writer_1.close()
+        yield self.assertFailure(finished_d_1, DownloadCanceledError)
+        self.assertEqual([], verified)
+        writer_2, finished_d_2 = blob_file.open_for_writing(peer=2)
+        writer_2.write(self.fake_content)
+        yield finished_d_2
+        self.assertEqual([blob_file], verified)
+        self.assertEqual([], removed)
@@ -0,0 +1,122 @@
+from twisted.internet import task
+from twisted.trial import unittest
+
+from lbrynet.core.RateLimiter import RateLimiter
+
+
+class FakeProtocol(object):
+    def __init__(self, chunk_size):
+        self.chunk_size = chunk_size
+        self.received = 0
+        self.paused = False
+        self.pauses = 0
+
+    def throttle_download(self):
+        self.assertNotPaused()
+        self.paused = True
+        self.pauses += 1
+
+    def unthrottle_download(self):
+        self.paused = False
+
+    def throttle_upload(self):
+        pass
+
+    def unthrottle_upload(self):
+        pass
+
+    def assertNotPaused(self):
+        assert not self.paused, "paused twice"
+
+
+class RateLimiterTest(unittest.TestCase):
+    MAX_BYTES = 1000000
+    STEP = 0.002
+
+    def setUp(self):
+        self.clock = task.Clock()
+        self.rate_limiter = RateLimiter(max_dl_bytes=self.MAX_BYTES, clock=self.clock)
+        self.rate_limiter.start()
+
+    def tearDown(self):
+        self.rate_limiter.stop()
+
+    def _add_protocols(self, count, stream=None):
+        # connections with very different read sizes, some of them bigger than their share
+        protocols = [FakeProtocol(200 + 300 * (i % 10)) for i in range(count)]
+        for protocol in protocols:
+            self.rate_limiter.register_protocol(protocol, stream)
+        return protocols
+
+    def _download(self, protocols, seconds):
+        """Every connection that isn't paused reads as much as it can each step"""
+        for _ in range(int(seconds / self.STEP)):
+            for protocol in protocols:
+                if not protocol.paused:
+                    protocol.received += protocol.chunk_size
+                    self.rate_limiter.report_dl_bytes(protocol.chunk_size, protocol)
+            self.clock.advance(self.STEP)
+
+    def test_fair_share_of_100_connections(self):
+        seconds = 5
+        protocols = self._add_protocols(100)
+        self._download(protocols, seconds)
+        total = sum(p.received for p in protocols)
+        self.assertTrue(total <= self.MAX_BYTES * (seconds + RateLimiter.BURST_SECONDS), total)
+        self.assertTrue(total >= self.MAX_BYTES * seconds * 0.95, total)
+        received = [p.received for p in protocols]
+        self.assertTrue(float(max(received)) / min(received) <= 1.25,
+                        (min(received), max(received)))
+
+    def test_streams_share_equally(self):
+        seconds = 5
+        big_stream = self._add_protocols(90, 'big')
+        small_stream = self._add_protocols(10, 'small')
+        self._download(big_stream + small_stream, seconds)
+        big = sum(p.received for p in big_stream)
+        small = sum(p.received for p in small_stream)
+        self.assertTrue(0.9 <= float(big) / small <= 1.1, (big, small))
+
+    def test_spare_bandwidth_is_used(self):
+        protocols = self._add_protocols(3)
+        # one connection is idle and one only reads a little, the last one gets the rest
+        protocols[1].chunk_size = 100
+        protocols[2].chunk_size = 20000
+        self._download(protocols[1:], 2)
+        self.assertTrue(protocols[1].received >= 2 * 100 / self.STEP * 0.9)
+        self.assertTrue(protocols[2].received >= (self.MAX_BYTES - 100 / self.STEP) * 2 * 0.95)
+
+    def test_least_served_protocol_is_resumed_first(self):
+        protocols = self._add_protocols(2)
+        capacity = self.MAX_BYTES * RateLimiter.BURST_SECONDS
+        self.rate_limiter.report_dl_bytes(capacity, protocols[0])
+        self.assertFalse(protocols[0].paused)
+        self.rate_limiter.report_dl_bytes(100000, protocols[1])
+        self.assertTrue(protocols[1].paused)
+        self.rate_limiter.report_dl_bytes(50000, protocols[0])
+        self.assertTrue(protocols[0].paused)
+        # the debt is paid after 0.15 seconds, the second connection is resumed first
+        self.clock.advance(0.149)
+        self.assertTrue(protocols[1].paused)
+        self.clock.advance(0.001)
+        self.assertFalse(protocols[1].paused)
+        self.assertTrue(protocols[0].paused)
+        # and the first one once the tokens for the second one's last read have been refilled
+        self.clock.advance(0.1)
+        self.assertFalse(protocols[0].paused)
+        self.assertEqual([], self.clock.getDelayedCalls())
+
+    def test_unregistered_protocol_is_not_resumed(self):
+        protocols = self._add_protocols(2)
+        self.rate_limiter.report_dl_bytes(self.MAX_BYTES, protocols[0])
+        self.assertTrue(protocols[0].paused)
+        self.rate_limiter.unregister_protocol(protocols[0])
+        self.clock.advance(1)
+        self.assertTrue(protocols[0].paused)
+
+    def test_no_limit(self):
+        self.rate_limiter.set_dl_limit(None)
+        protocols = self._add_protocols(2)
+        self.rate_limiter.report_dl_bytes(self.MAX_BYTES * 10, protocols[0])
+        self.assertFalse(protocols[0].paused)
+        self.assertEqual(self.MAX_BYTES * 10, self.rate_limiter.total_dl_bytes)
@@ -0,0 +1,77 @@
+from twisted.internet import defer, task
+from twisted.trial import unittest
+
+from lbrynet.core.StartupGraph import StartupGraph
+
+
+class StartupGraphTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = task.Clock()
+        self.graph = StartupGraph(self.clock)
+        self.started = []
+
+    def _add(self, name, delay=0, dependencies=()):
+        def start():
+            self.started.append(name)
+            return task.deferLater(self.clock, delay, lambda: None)
+        self.graph.add_component(name, start, dependencies)
+
+    def test_independent_components_start_together(self):
+        self._add('a', 5)
+        self._add('b', 3)
+        self._add('c', 1, ['a', 'b'])
+        d = self.graph.start()
+        self.assertEqual(['a', 'b'], self.started)
+        self.clock.advance(3)
+        self.assertEqual(['a', 'b'], self.started)
+        self.clock.advance(2)
+        self.assertEqual(['a', 'b', 'c'], self.started)
+        self.assertFalse(d.called)
+        self.clock.advance(1)
+        self.assertTrue(d.called)
+        status = self.graph.get_status()
+        self.assertEqual({'status': 'started', 'start_time': 0, 'duration': 3}, status['b'])
+        self.assertEqual({'status': 'started', 'start_time': 5, 'duration': 1}, status['c'])
+
+    def test_component_waits_only_for_its_dependencies(self):
+        self._add('wallet', 10)
+        self._add('dht', 1)
+        self._add('server', 1, ['dht'])
+        self.graph.start()
+        self.clock.pump([1, 1])
+        self.assertTrue(self.graph.is_started('server'))
+        self.assertFalse(self.graph.is_started('wallet'))
+        self.assertEqual('starting', self.graph.get_status()['wallet']['status'])
+
+    def test_wait_for(self):
+        self._add('a', 1)
+        self._add('b', 2, ['a'])
+        self.graph.start()
+        d = self.graph.wait_for('b')
+        self.clock.advance(1)
+        self.assertFalse(d.called)
+        self.clock.advance(2)
+        self.assertTrue(d.called)
+        self.assertTrue(self.graph.wait_for('a').called)
+
+    def test_failure(self):
+        self._add('a', 1)
+        self.graph.add_component('b', lambda: defer.fail(IOError("no disk")))
+        self._add('c', 1, ['b'])
+        d = self.graph.start()
+        self.assertFailure(d, IOError)
+        self.clock.advance(1)
+        self.assertEqual(['a'], self.started)
+        status = self.graph.get_status()
+        self.assertEqual('failed', status['b']['status'])
+        self.assertEqual('waiting', status['c']['status'])
+        self.assertEqual(None, status['c']['start_time'])
+        return d
+
+    def test_invalid_graphs(self):
+        self._add('a')
+        self.assertRaises(ValueError, self._add, 'a')
+        self._add('b', dependencies=['c'])
+        self.assertRaises(ValueError, self.graph.start)
+        self._add('c', dependencies=['b'])
+        self.assertRaises(ValueError, self.graph.start)
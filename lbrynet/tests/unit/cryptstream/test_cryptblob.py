@@ -62,18 +62,24 @@ class TestCryptBlob(unittest.TestCase):
         else:
             self.assertTrue(done)
         self.data_buf = ''
+        self.largest_write = 0
 
         def write_func(data):
             self.data_buf += data
+            self.largest_write = max(self.largest_write, len(data))
 
         # decrypt string
         decryptor = CryptBlob.StreamBlobDecryptor(blob, key, iv, size_of_data)
         yield decryptor.decrypt(write_func)
         self.assertEqual(self.data_buf, string_to_encrypt)
+        # the blob is decrypted a chunk at a time
+        self.assertTrue(self.largest_write <= CryptBlob.StreamBlobDecryptor.CHUNK_SIZE)
 
     @defer.inlineCallbacks
     def test_encrypt_decrypt(self):
         yield self._test_encrypt_decrypt(1)
         yield self._test_encrypt_decrypt(16*2)
+        yield self._test_encrypt_decrypt(CryptBlob.StreamBlobDecryptor.CHUNK_SIZE - 1)
+        yield self._test_encrypt_decrypt(CryptBlob.StreamBlobDecryptor.CHUNK_SIZE)
         yield self._test_encrypt_decrypt(2000)
         yield self._test_encrypt_decrypt(2*2**20-1)
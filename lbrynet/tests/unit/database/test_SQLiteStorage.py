@@ -1,12 +1,15 @@
 import os
 import shutil
+import sqlite3
 import tempfile
+import threading
 import logging
+import mock
 from copy import deepcopy
 from twisted.internet import defer
 from twisted.trial import unittest
 from lbrynet import conf
-from lbrynet.database.storage import SQLiteStorage, open_file_for_writing
+from lbrynet.database.storage import SQLiteStorage, SqliteWriter, open_file_for_writing
 from lbrynet.core.StreamDescriptor import StreamDescriptorIdentifier
 from lbrynet.file_manager.EncryptedFileDownloader import ManagedEncryptedFileDownloader
 from lbrynet.file_manager.EncryptedFileManager import EncryptedFileManager
@@ -135,6 +138,63 @@ class StorageTest(unittest.TestCase):
             yield self.store_fake_stream_blob(stream_hash, blob, pos)
 
 
+class SqliteWriterTests(unittest.TestCase):
+    def setUp(self):
+        self.db_dir = tempfile.mkdtemp()
+        self.writer = SqliteWriter(os.path.join(self.db_dir, "test.sqlite"), batch_interval=0.2)
+        return self.writer.runScript("create table item (value integer);")
+
+    def tearDown(self):
+        self.writer.stop()
+        shutil.rmtree(self.db_dir)
+
+    def _insert(self, value):
+        return self.writer.runOperation("insert into item values (?)", (value, ))
+
+    @defer.inlineCallbacks
+    def test_writes_queued_within_the_interval_share_a_transaction(self):
+        released = threading.Event()
+        blocked = self.writer.runInteraction(lambda transaction: released.wait(5))
+        # queue up writes while the writer is busy, and one more shortly after it is free
+        queued = [self._insert(1), self._insert(2)]
+        blocked.addCallback(lambda _: queued.append(self._insert(3)))
+        released.set()
+        yield blocked
+        yield defer.DeferredList(queued)
+        # the blocking interaction, and then the three inserts
+        self.assertEqual(2, self.writer.transactions)
+        count = yield self.writer.runInteraction(
+            lambda transaction: transaction.execute("select count(*) from item").fetchone()[0])
+        self.assertEqual(3, count)
+
+    @defer.inlineCallbacks
+    def _assert_writes_still_complete(self):
+        yield self._insert(1)
+        count = yield self.writer.runInteraction(
+            lambda transaction: transaction.execute("select count(*) from item").fetchone()[0])
+        self.assertEqual(1, count)
+
+    @defer.inlineCallbacks
+    def test_failed_commit(self):
+        yield self.writer.runScript(
+            "pragma foreign_keys=on; create table parent (id integer primary key);"
+            "create table child (parent integer references parent(id) "
+            "deferrable initially deferred);")
+        # the foreign key is only checked on commit
+        yield self.assertFailure(self.writer.runOperation("insert into child values (1)"),
+                                 sqlite3.IntegrityError)
+        yield self._assert_writes_still_complete()
+
+    @defer.inlineCallbacks
+    def test_failed_savepoint_rollback(self):
+        def interaction(transaction):
+            # ends the transaction, so its savepoint can't be rolled back to
+            transaction.execute("rollback")
+            raise ValueError("interaction failed")
+        yield self.assertFailure(self.writer.runInteraction(interaction), sqlite3.OperationalError)
+        yield self._assert_writes_still_complete()
+
+
 class TestSetup(StorageTest):
     @defer.inlineCallbacks
     def test_setup(self):
@@ -162,6 +222,29 @@ class BlobStorageTests(StorageTest):
         blob_hashes = yield self.storage.get_all_blob_hashes()
         self.assertEqual(blob_hashes, [])
 
+    @defer.inlineCallbacks
+    def test_concurrent_writes_are_batched(self):
+        blob_hashes = [random_lbry_hash() for _ in range(100)]
+        transactions = self.storage.db.writer.transactions
+        yield defer.DeferredList([
+            self.storage.add_completed_blob(blob_hash, 100, 0, False) for blob_hash in blob_hashes
+        ], fireOnOneErrback=True)
+        self.assertLess(self.storage.db.writer.transactions - transactions, 100)
+        finished = yield self.storage.get_all_finished_blobs()
+        self.assertSetEqual(set(finished), set(blob_hashes))
+
+    @defer.inlineCallbacks
+    def test_failed_write_does_not_rollback_batch(self):
+        blob_hash = random_lbry_hash()
+        results = yield defer.DeferredList([
+            self.storage.db.runOperation("insert into missing_table values (1)"),
+            self.storage.add_completed_blob(blob_hash, 100, 0, False)
+        ], consumeErrors=True)
+        self.assertFalse(results[0][0])
+        self.assertTrue(results[1][0])
+        status = yield self.storage.get_blob_status(blob_hash)
+        self.assertEqual(status, "finished")
+
 
 class StreamStorageTests(StorageTest):
     @defer.inlineCallbacks
@@ -214,6 +297,26 @@ class StreamStorageTests(StorageTest):
         blob_hashes = yield self.storage.get_all_blob_hashes()
         self.assertListEqual(blob_hashes, [])
 
+    @defer.inlineCallbacks
+    def test_get_blobs_for_stream(self):
+        stream_hash = random_lbry_hash()
+        sd_hash = random_lbry_hash()
+        blob1 = random_lbry_hash()
+        blob2 = random_lbry_hash()
+        yield self.store_fake_blob(sd_hash)
+        yield self.store_fake_blob(blob1, blob_length=200)
+        yield self.store_fake_blob(blob2, blob_length=100)
+        yield self.store_fake_stream(stream_hash, sd_hash)
+        yield self.store_fake_stream_blob(stream_hash, blob2, 1, iv="BEEF")
+        yield self.store_fake_stream_blob(stream_hash, blob1, 0, iv="DEAD")
+        yield self.store_fake_stream_blob(stream_hash, None, 2, length=0, iv="FEED")
+
+        stream_blobs = yield self.storage.get_blobs_for_stream(stream_hash)
+        self.assertListEqual(
+            [(b.blob_hash, b.blob_num, b.length, b.iv) for b in stream_blobs],
+            [(blob1, 0, 200, "DEAD"), (blob2, 1, 100, "BEEF"), (None, 2, 0, "FEED")]
+        )
+
 
 class FileStorageTests(StorageTest):
     @defer.inlineCallbacks
@@ -267,6 +370,38 @@ class FileStorageTests(StorageTest):
         self.assertEqual(status, ManagedEncryptedFileDownloader.STATUS_RUNNING)
 
 
+    @defer.inlineCallbacks
+    def test_restore_lbry_files(self):
+        session = mock.Mock(storage=self.storage)
+        session.base_payment_rate_manager.min_blob_data_payment_rate = 0
+        manager = EncryptedFileManager(session, StreamDescriptorIdentifier())
+        manager.auto_re_reflect = False
+        statuses = [ManagedEncryptedFileDownloader.STATUS_STOPPED,
+                    ManagedEncryptedFileDownloader.STATUS_FINISHED, "unknown"]
+        stream_hashes = []
+        for status in statuses:
+            stream_hash, sd_hash = random_lbry_hash(), random_lbry_hash()
+            yield self.store_fake_blob(sd_hash)
+            yield self.store_fake_stream(stream_hash, sd_hash, file_name="test file".encode('hex'))
+            yield self.storage.save_published_file(stream_hash, "test file".encode('hex'),
+                                                   self.db_dir.encode('hex'), 0, status)
+            stream_hashes.append(stream_hash)
+
+        yield manager.setup()
+        # the file with the unknown status isn't restored
+        self.assertEqual(2, len(manager.lbry_files))
+        # files are only made when they're used
+        self.assertEqual([], manager.lbry_files.loaded())
+        stopped, finished = manager.lbry_files
+        self.assertEqual([stopped, finished], manager.lbry_files.loaded())
+        self.assertEqual(stream_hashes[:2], [stopped.stream_hash, finished.stream_hash])
+        self.assertTrue(stopped.stopped)
+        self.assertFalse(stopped.completed)
+        self.assertTrue(finished.completed)
+        self.assertIn(finished, manager.lbry_files)
+        yield manager.stop()
+
+
 class ContentClaimStorageTests(StorageTest):
     @defer.inlineCallbacks
     def test_store_content_claim(self):
@@ -330,3 +465,11 @@ class ContentClaimStorageTests(StorageTest):
         current_claim_info = yield self.storage.get_content_claim(stream_hash)
         # this should still be the previous update
         self.assertDictEqual(current_claim_info, update_info)
+
+        # test that the files are loaded along with their content claims
+        files = yield self.storage.get_all_lbry_files()
+        expected_claim_info = deepcopy(update_info)
+        del expected_claim_info['supports']
+        del expected_claim_info['effective_amount']
+        self.assertEqual(1, len(files))
+        self.assertDictEqual(files[0]['claim'], expected_claim_info)
@@ -4,6 +4,9 @@
 # the GNU Lesser General Public License Version 3, or any later version.
 # See the COPYING file included in this archive
 
+import os
+import shutil
+import tempfile
 import unittest
 import time
 
@@ -104,6 +107,53 @@ class DictDataStoreTest(unittest.TestCase):
             'DataStore deleted an unexpired value! Value %s, publish time %s, current time %s' %
             ('val4', str(now), str(now)))
 
+
+class PersistentDataStoreTest(DictDataStoreTest):
+    def setUp(self):
+        DictDataStoreTest.setUp(self)
+        self.tmp_dir = tempfile.mkdtemp()
+        self.ds = lbrynet.dht.datastore.PersistentDataStore(os.path.join(self.tmp_dir, 'peers'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def testReannounceReplacesPeer(self):
+        now = int(time.time())
+        self.ds.addPeerToBlob('key', '\x7f\x00\x00\x01\x0f\xa0node1', now - 10, now - 10, 'node1')
+        self.ds.addPeerToBlob('key', '\x7f\x00\x00\x01\x0f\xa0node1', now, now, 'node1')
+        self.assertEqual(['\x7f\x00\x00\x01\x0f\xa0node1'], self.ds.getPeersForBlob('key'))
+        self.assertEqual([('\x7f\x00\x00\x01\x0f\xa0node1', now, now, 'node1')],
+                         self.ds.getPeerEntriesForBlob('key'))
+        self.ds.removeExpiredPeers(now + lbrynet.dht.constants.dataExpireTimeout - 5)
+        self.assertTrue(self.ds.hasPeersForBlob('key'))
+        self.ds.removeExpiredPeers(now + lbrynet.dht.constants.dataExpireTimeout + 1)
+        self.assertFalse(self.ds.hasPeersForBlob('key'))
+        self.assertEqual([], self.ds.keys())
+
+    def testRemovePeer(self):
+        now = int(time.time())
+        self.ds.addPeerToBlob('key1', '\x7f\x00\x00\x01\x0f\xa0node1', now, now, 'node1')
+        self.ds.addPeerToBlob('key2', '\x7f\x00\x00\x01\x0f\xa0node1', now, now, 'node1')
+        self.ds.addPeerToBlob('key2', '\x7f\x00\x00\x02\x0f\xa0node2', now, now, 'node2')
+        self.ds.removePeer('\x7f\x00\x00\x01\x0f\xa0node1')
+        self.assertEqual(['key2'], self.ds.keys())
+        self.assertEqual(['\x7f\x00\x00\x02\x0f\xa0node2'], self.ds.getPeersForBlob('key2'))
+
+    def testSnapshot(self):
+        now = int(time.time())
+        expired = now - lbrynet.dht.constants.dataExpireTimeout - 1
+        for key, value in self.cases:
+            self.ds.addPeerToBlob(key, value, now, now, 'node1')
+        self.ds.addPeerToBlob('old', 'val1', expired, expired, 'node2')
+        self.ds._writeSnapshot(self.ds._serializeSnapshot())
+
+        restored = lbrynet.dht.datastore.PersistentDataStore(self.ds.snapshot_path)
+        restored.loadSnapshot()
+        self.assertItemsEqual(restored.keys(), set(key for key, _ in self.cases))
+        for key, _ in self.cases:
+            self.assertItemsEqual(restored.getPeerEntriesForBlob(key),
+                                  self.ds.getPeerEntriesForBlob(key))
+
 #        # First write with fake values
 #        for key, value in self.cases:
 #            except Exception:
@@ -135,6 +185,7 @@ class DictDataStoreTest(unittest.TestCase):
 def suite():
     suite = unittest.TestSuite()
     suite.addTest(unittest.makeSuite(DictDataStoreTest))
+    suite.addTest(unittest.makeSuite(PersistentDataStoreTest))
     return suite
 
 
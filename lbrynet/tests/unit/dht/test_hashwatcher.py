@@ -0,0 +1,49 @@
+from twisted.internet import task
+from twisted.trial import unittest
+
+from lbrynet.dht.contact import Contact
+from lbrynet.dht.hashwatcher import HashWatcher
+
+
+class HashWatcherTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = task.Clock()
+        self.watcher = HashWatcher(ttl=600, clock=self.clock)
+        self.contacts = [Contact('node%i' % i, '127.0.0.%i' % i, 4444, None) for i in range(1, 6)]
+
+    def tearDown(self):
+        self.watcher.stop()
+
+    def _request(self, hashsum, *contact_indexes):
+        for i in contact_indexes:
+            self.watcher.add_requested_hash(hashsum, self.contacts[i])
+
+    def test_counts_distinct_ips(self):
+        self._request('a', 0, 1, 2, 0, 0)
+        self._request('b', 3, 3)
+        self.assertEqual([('a', 3), ('b', 1)], self.watcher.most_popular_hashes())
+
+    def test_most_popular_limit(self):
+        self._request('a', 0, 1, 2)
+        self._request('b', 0, 1)
+        self._request('c', 0)
+        self.assertEqual([('a', 3), ('b', 2)], self.watcher.most_popular_hashes(2))
+
+    def test_old_hashes_are_removed(self):
+        self.watcher.tick()
+        self._request('a', 0, 1)
+        self.clock.advance(300)
+        self._request('a', 2)
+        self._request('b', 0)
+        self.assertEqual([('a', 3), ('b', 1)], self.watcher.most_popular_hashes())
+        self.clock.pump([10] * 36)
+        self.assertEqual([('a', 1), ('b', 1)], sorted(self.watcher.most_popular_hashes()))
+        self.clock.pump([10] * 36)
+        self.assertEqual([], self.watcher.most_popular_hashes())
+
+    def test_expired_request_is_counted_again(self):
+        self._request('a', 0)
+        self.clock.advance(700)
+        self.watcher.tick()
+        self._request('a', 0)
+        self.assertEqual([('a', 1)], self.watcher.most_popular_hashes())
@@ -9,10 +9,12 @@ import unittest
 import struct
 
 from twisted.internet import protocol, defer, selectreactor
+from twisted.trial import unittest as trial_unittest
 from lbrynet.dht.msgtypes import ResponseMessage
 import lbrynet.dht.node
 import lbrynet.dht.constants
 import lbrynet.dht.datastore
+import lbrynet.dht.protocol
 
 
 class NodeIDTest(unittest.TestCase):
@@ -271,3 +273,107 @@ class NodeLookupTest(unittest.TestCase):
         self.failUnlessEqual({contact.id for contact in activeContacts}, expectedResult,
                              "Active should only contain the closest possible contacts"
                              " which were used as input for the boostrap")
+
+
+class FakeStoreProtocol(object):
+    """ Fake RPC protocol that hands out tokens and accepts stores """
+    def __init__(self):
+        self.calls = []
+        self.dead = set()  # contacts whose stores time out
+        self.held_stores = None  # if a list, stores are answered when the test fires them
+
+    def sendRPC(self, contact, method, args, rawResponse=False):
+        self.calls.append((contact, method, args))
+        if method == 'findValue':
+            response = {'token': 'token' + contact.id, 'contacts': []}
+            message = ResponseMessage('r' * 20, contact.id, response)
+            return defer.succeed((message, (contact.address, contact.port)))
+        elif method == 'store':
+            if self.held_stores is not None:
+                d = defer.Deferred()
+                self.held_stores.append((contact, d))
+                return d
+            if contact in self.dead:
+                return defer.fail(lbrynet.dht.protocol.TimeoutError(contact.id))
+            return defer.succeed('OK')
+
+
+class NodeAnnounceTest(trial_unittest.TestCase):
+    """ Test case for announcing several blobs with the results of one node lookup """
+    def setUp(self):
+        self._protocol = FakeStoreProtocol()
+        self.node = lbrynet.dht.node.Node(hashlib.sha384('node1').digest(), 4000, None, None,
+                                          self._protocol, peerPort=3333)
+        self.contacts = [
+            lbrynet.dht.contact.Contact(hashlib.sha384('contact%i' % i).digest(), '127.0.0.1',
+                                        4000 + i, self._protocol)
+            for i in range(lbrynet.dht.constants.k * 2)
+        ]
+        self.blob_hashes = [hashlib.sha384('blob%i' % i).digest() for i in range(10)]
+
+    def _calls(self, method):
+        return [call for call in self._protocol.calls if call[1] == method]
+
+    @defer.inlineCallbacks
+    def testAnnounceHaveBlobs(self):
+        stored = yield self.node.announceHaveBlobs(self.blob_hashes, self.contacts)
+        k = lbrynet.dht.constants.k
+        self.failUnlessEqual(stored, [k] * len(self.blob_hashes))
+        # one token request per contact rather than per blob
+        self.failUnlessEqual(len(self._calls('findValue')), len(self.contacts))
+        stores = self._calls('store')
+        self.failUnlessEqual(len(stores), k * len(self.blob_hashes))
+        for contact, _, args in stores:
+            blob_hash, value = args[0], args[1]
+            closest = lbrynet.dht.node.Distance(blob_hash).closest(self.contacts, k)
+            self.failUnless(contact in closest)
+            self.failUnlessEqual(value['token'], 'token' + contact.id)
+            self.failUnlessEqual(value['port'], 3333)
+
+    @defer.inlineCallbacks
+    def testStoreTokensAreReused(self):
+        yield self.node.announceHaveBlobs(self.blob_hashes[:1], self.contacts)
+        yield self.node.announceHaveBlobs(self.blob_hashes[1:], self.contacts)
+        self.failUnlessEqual(len(self._calls('findValue')), len(self.contacts))
+        # expired tokens are requested again
+        for node_id, (token, expiration) in self.node._storeTokens.items():
+            self.node._storeTokens[node_id] = (token, 0)
+        yield self.node.announceHaveBlobs(self.blob_hashes[:1], self.contacts)
+        self.failUnlessEqual(len(self._calls('findValue')), len(self.contacts) * 2)
+
+    @defer.inlineCallbacks
+    def testConcurrentStoresAreLimited(self):
+        self._protocol.held_stores = []
+        d = self.node.announceHaveBlobs(self.blob_hashes, self.contacts)
+        k = lbrynet.dht.constants.k
+        limit = lbrynet.dht.constants.maxConcurrentStores
+        self.failUnlessEqual(limit, len(self._protocol.held_stores))
+        dead = self._protocol.held_stores[0][0]
+        answered = []
+        while self._protocol.held_stores:
+            # no more than the limit of stores are waiting for a response at once
+            self.failUnless(len(self._protocol.held_stores) <= limit)
+            contact, store = self._protocol.held_stores.pop(0)
+            answered.append(contact)
+            if contact is dead:
+                store.errback(lbrynet.dht.protocol.TimeoutError(contact.id))
+            else:
+                store.callback('OK')
+        stored = yield d
+        stores_to_dead = len([c for c in answered if c is dead])
+        self.failUnless(1 <= stores_to_dead < len(self.blob_hashes))
+        self.failUnlessEqual(len(self.blob_hashes) * k - sum(stored),
+                             len([h for h in self.blob_hashes
+                                  if dead in lbrynet.dht.node.Distance(h).closest(self.contacts,
+                                                                                  k)]))
+        self.failIf(dead.id in self.node._storeTokens)
+
+    @defer.inlineCallbacks
+    def testFailedContactIsDroppedFromBatch(self):
+        k = lbrynet.dht.constants.k
+        dead = lbrynet.dht.node.Distance(self.blob_hashes[0]).closest(self.contacts, k)[0]
+        self._protocol.dead.add(dead)
+        stored = yield self.node.announceHaveBlobs(self.blob_hashes, self.contacts)
+        stores_to_dead = [c for c, method, _ in self._calls('store') if c is dead]
+        self.failUnlessEqual(1, len(stores_to_dead))
+        self.failUnlessEqual([k - 1] + [k] * (len(self.blob_hashes) - 1), stored)
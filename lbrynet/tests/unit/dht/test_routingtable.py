@@ -96,6 +96,25 @@ class TreeRoutingTableTest(unittest.TestCase):
         closestNodes = self.routingTable.findCloseNodes(self.nodeID, lbrynet.dht.constants.k)
         self.failIf(contact in closestNodes, 'Node added itself as a contact')
 
+    def testFindCloseNodesSortedByDistance(self):
+        """ Tests that the k closest known contacts are returned, closest first """
+        for i in range(500):
+            contactID = hashlib.sha384('contact%i' % i).digest()
+            self.routingTable.addContact(
+                lbrynet.dht.contact.Contact(contactID, '127.0.0.1', 4444, self.protocol))
+        contacts = [c for bucket in self.routingTable._buckets for c in bucket._contacts]
+        self.failUnless(len(self.routingTable._buckets) > 1)
+        for i in range(50):
+            key = hashlib.sha384('key%i' % i).digest()
+            distance = lbrynet.dht.node.Distance(key)
+            expected = sorted(contacts, key=lambda c: distance(c.id))[:lbrynet.dht.constants.k]
+            closestNodes = self.routingTable.findCloseNodes(key, lbrynet.dht.constants.k)
+            self.failUnlessEqual([c.id for c in expected], [c.id for c in closestNodes])
+        excluded = expected[0].id
+        closestNodes = self.routingTable.findCloseNodes(key, lbrynet.dht.constants.k, excluded)
+        self.failIf(excluded in closestNodes)
+        self.failUnlessEqual(len(closestNodes), lbrynet.dht.constants.k)
+
     def testRemoveContact(self):
         """ Tests contact removal """
         # Create the contact
@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import os
 from Crypto.Cipher import AES
 import mock
 from twisted.trial import unittest
@@ -46,19 +47,19 @@ class CreateEncryptedFileTest(unittest.TestCase):
         rm_db_and_blob_dir(self.tmp_db_dir, self.tmp_blob_dir)
 
     @defer.inlineCallbacks
-    def create_file(self, filename):
+    def create_file(self, filename, lbry_file_creator=None):
         handle = mocks.GenFile(3*MB, '1')
         key = '2'*AES.block_size
         out = yield EncryptedFileCreator.create_lbry_file(self.session, self.file_manager, filename, handle,
-                                                          key, iv_generator())
+                                                          key, iv_generator(), lbry_file_creator)
         defer.returnValue(out)
 
     @defer.inlineCallbacks
     def test_can_create_file(self):
         expected_stream_hash = "41e6b247d923d191b154fb6f1b8529d6ddd6a73d65c35" \
                                "7b1acb742dd83151fb66393a7709e9f346260a4f4db6de10c25"
-        expected_sd_hash = "bc435ae0c4659635e6514e05bb1fcd0d365b234f6f0e78002" \
-                           "d2576ff84a0b8710a9847757a9aa8cbeda5a8e1aeafa48b"
+        expected_sd_hash = "db043b44384c149126685990f6bb6563aa565ae331303d522" \
+                           "c8728fe0534dd06fbcacae92b0891787ad9b68ffc8d20c1"
         filename = 'test.file'
         lbry_file = yield self.create_file(filename)
         sd_hash = yield self.session.storage.get_sd_blob_hash_for_stream(lbry_file.stream_hash)
@@ -79,3 +80,35 @@ class CreateEncryptedFileTest(unittest.TestCase):
         filename = u'☃.file'
         lbry_file = yield self.create_file(filename)
         self.assertEqual(expected_stream_hash, lbry_file.stream_hash)
+
+    @defer.inlineCallbacks
+    def test_create_file_progress(self):
+        creator = EncryptedFileCreator.EncryptedFileStreamCreator(
+            self.blob_manager, self.file_manager, 'test.file', '2'*AES.block_size, iv_generator())
+        creator.workers = 3
+        yield self.create_file('test.file', creator)
+        self.assertEqual({'bytes_read': 3*MB, 'total_bytes': None, 'blobs_created': 2},
+                         creator.get_progress())
+        # the blobs are described in stream order no matter which worker finished first
+        self.assertEqual([0, 1, 2], [blob['blob_num'] for blob in creator.sd_info['blobs']])
+
+    @defer.inlineCallbacks
+    def test_split_file_matches_stream_read_in_order(self):
+        file_path = os.path.join(self.tmp_db_dir, 'test.file')
+        with open(file_path, 'wb') as f:
+            f.write(os.urandom(5*MB))
+        sd_infos = []
+        for split_file in (False, True):
+            creator = EncryptedFileCreator.EncryptedFileStreamCreator(
+                self.blob_manager, self.file_manager, 'test.file', '2'*AES.block_size,
+                iv_generator(), workers=3, split_file=split_file)
+            yield creator.setup()
+            with open(file_path, 'rb') as handle:
+                yield creator.create_stream(handle)
+                # the split file is read from its own handles
+                self.assertEqual(0 if split_file else 5*MB, handle.tell())
+            self.assertEqual({'bytes_read': 5*MB, 'total_bytes': 5*MB, 'blobs_created': 3},
+                             creator.get_progress())
+            sd_infos.append(creator.sd_info)
+        self.assertEqual(sd_infos[0], sd_infos[1])
+        self.assertEqual([0, 1, 2, 3], [blob['blob_num'] for blob in sd_infos[1]['blobs']])
@@ -0,0 +1,84 @@
+from twisted.trial import unittest
+
+from lbrynet.file_manager.EncryptedFileRegistry import EncryptedFileRegistry
+
+
+class FakeLbryFile(object):
+    def __init__(self, rowid, sd_hash, stream_hash, claim=None, file_name='file'):
+        self.rowid = rowid
+        self.sd_hash = sd_hash
+        self.stream_hash = stream_hash
+        self.file_name = file_name
+        self.claim_id = self.outpoint = self.channel_claim_id = self.channel_name = None
+        if claim:
+            self.set_claim_info(claim)
+
+    def set_claim_info(self, claim):
+        self.claim_id = claim['claim_id']
+        self.outpoint = "%s:%i" % (claim['txid'], claim['nout'])
+        self.channel_claim_id = claim['channel_claim_id']
+        self.channel_name = claim['channel_name']
+
+
+def make_claim(claim_id, channel_claim_id=None, channel_name=None):
+    return {'claim_id': claim_id, 'txid': claim_id * 2, 'nout': 0,
+            'channel_claim_id': channel_claim_id, 'channel_name': channel_name}
+
+
+def make_file_info(rowid, claim=None):
+    return {'row_id': rowid, 'sd_hash': 'sd%i' % rowid, 'stream_hash': 'stream%i' % rowid,
+            'claim': claim}
+
+
+class EncryptedFileRegistryTest(unittest.TestCase):
+    def setUp(self):
+        self.made = []
+        self.registry = EncryptedFileRegistry(self._make_lbry_file)
+        self.registry.add_file_info(make_file_info(1, make_claim('aa', 'cc', '@channel')))
+        self.registry.add_file_info(make_file_info(2, make_claim('bb', 'cc', '@channel')))
+        self.registry.add_file_info(make_file_info(3))
+        self.published = FakeLbryFile(4, 'sd4', 'stream4', file_name='published')
+        self.registry.append(self.published)
+
+    def _make_lbry_file(self, file_info):
+        lbry_file = FakeLbryFile(file_info['row_id'], file_info['sd_hash'],
+                                 file_info['stream_hash'], file_info['claim'])
+        self.made.append(lbry_file.rowid)
+        return lbry_file
+
+    def _rowids(self, lbry_files):
+        return [lbry_file.rowid for lbry_file in lbry_files]
+
+    def test_find_by_index(self):
+        self.assertEqual([2], self._rowids(self.registry.find(sd_hash='sd2')))
+        self.assertEqual([2], self._rowids(self.registry.find(outpoint='bbbb:0')))
+        self.assertEqual([1, 2], self._rowids(self.registry.find(channel_name='@channel')))
+        self.assertEqual([1], self._rowids(self.registry.find(channel_claim_id='cc',
+                                                              claim_id='aa')))
+        self.assertEqual([4], self._rowids(self.registry.find(rowid=4)))
+        self.assertEqual([], self.registry.find(stream_hash='stream5'))
+        # only the files that were found are made
+        self.assertEqual([2, 1], self.made)
+
+    def test_find_pages(self):
+        self.assertEqual([2, 3], self._rowids(self.registry.find(1, 3)))
+        self.assertEqual([2, 3], self.made)
+        self.assertEqual([2], self._rowids(self.registry.find(1, channel_claim_id='cc')))
+        self.assertEqual([4], self._rowids(self.registry.find(file_name='published')))
+        self.assertEqual([1, 2, 3, 4], self._rowids(self.registry))
+        self.assertEqual(4, len(self.registry))
+
+    def test_reindex_and_remove(self):
+        lbry_file, = self.registry.find(rowid=3)
+        lbry_file.set_claim_info(make_claim('dd'))
+        self.assertEqual([], self.registry.find(claim_id='dd'))
+        self.registry.reindex(lbry_file)
+        self.assertEqual([lbry_file], self.registry.find(claim_id='dd'))
+
+        self.assertIn(lbry_file, self.registry)
+        self.registry.remove(lbry_file)
+        self.assertNotIn(lbry_file, self.registry)
+        self.assertEqual([], self.registry.find(claim_id='dd'))
+        self.assertEqual([], self.registry.find(sd_hash='sd3'))
+        self.assertRaises(ValueError, self.registry.remove, lbry_file)
+        self.assertEqual([self.published], self.registry.loaded())
@@ -25,6 +25,7 @@ class MocDownloader(object):
         self.num_completed = 0
         self.num_known = 1
         self.running_status = ManagedEncryptedFileDownloader.STATUS_RUNNING
+        self.progress_listeners = []
 
     @defer.inlineCallbacks
     def status(self):
@@ -32,6 +33,17 @@ class MocDownloader(object):
             self.name, self.num_completed, self.num_known, self.running_status)
         defer.returnValue(out)
 
+    def add_progress_listener(self, listener):
+        self.progress_listeners.append(listener)
+
+    def remove_progress_listener(self, listener):
+        self.progress_listeners.remove(listener)
+
+    def blob_downloaded(self):
+        self.num_completed += 1
+        for listener in list(self.progress_listeners):
+            listener(None, self.num_completed)
+
     def start(self):
         return self.finish_deferred
 
@@ -56,6 +68,11 @@ def moc_download(self, sd_blob, name, txid, nout, key_fee, file_name):
     self.downloader.start()
 
 
+def moc_download_with_blob(self, sd_blob, name, txid, nout, key_fee, file_name):
+    moc_download(self, sd_blob, name, txid, nout, key_fee, file_name)
+    self.downloader.num_completed = 1
+
+
 def moc_pay_key_fee(self, key_fee, name):
     self.pay_key_fee_called = True
 
@@ -78,12 +95,11 @@ class GetStreamTests(unittest.TestCase):
         disable_max_key_fee = False
         data_rate = {'currency':"LBC", 'amount':0, 'address':''}
 
+        self.clock = task.Clock()
         getstream = Downloader.GetStream(sd_identifier, session,
-            exchange_rate_manager, max_key_fee, disable_max_key_fee, timeout=3, data_rate=data_rate)
+            exchange_rate_manager, max_key_fee, disable_max_key_fee, timeout=3, data_rate=data_rate,
+            clock=self.clock)
         getstream.pay_key_fee_called = False
-
-        self.clock = task.Clock()
-        getstream.checker.clock = self.clock
         return getstream
 
     @defer.inlineCallbacks
@@ -137,10 +153,12 @@ class GetStreamTests(unittest.TestCase):
         start = getstream.start(stream_info, name, "deadbeef" * 12, 0)
         self.clock.advance(1)
         self.clock.advance(1)
+        self.assertFalse(start.called)
         self.clock.advance(1)
         with self.assertRaises(DownloadDataTimeout):
             yield start
         self.assertTrue(getstream.pay_key_fee_called)
+        self.assertEqual([], getstream.downloader.progress_listeners)
 
     @defer.inlineCallbacks
     def test_finish_one_blob(self):
@@ -157,11 +175,27 @@ class GetStreamTests(unittest.TestCase):
         name = 'test'
         stream_info = None
         start = getstream.start(stream_info, name, "deadbeef" * 12, 0)
-        getstream.downloader.num_completed = 1
-        self.clock.advance(1)
+        self.assertFalse(start.called)
+        getstream.downloader.blob_downloaded()
 
         downloader, f_deferred = yield start
         self.assertTrue(getstream.pay_key_fee_called)
+        self.assertEqual([], getstream.downloader.progress_listeners)
+        self.assertEqual([], self.clock.getDelayedCalls())
+
+    @defer.inlineCallbacks
+    def test_blob_already_downloaded(self):
+        """
+        test that start() returns without waiting if the downloader
+        already has a completed blob
+        """
+        getstream = self.init_getstream_with_mocs()
+        getstream._initialize = types.MethodType(moc_initialize, getstream)
+        getstream._download_sd_blob = types.MethodType(moc_download_sd_blob, getstream)
+        getstream._download = types.MethodType(moc_download_with_blob, getstream)
+        getstream.pay_key_fee = types.MethodType(moc_pay_key_fee, getstream)
+        downloader, f_deferred = yield getstream.start(None, 'test', "deadbeef" * 12, 0)
+        self.assertEqual(1, downloader.num_completed)
 
     # @defer.inlineCallbacks
     # def test_finish_stopped_downloader(self):
@@ -0,0 +1,50 @@
+from twisted.internet import task
+from twisted.trial import unittest
+
+from lbrynet.daemon.ProgressSubscriptions import ProgressSubscriptions
+
+
+def make_event(sd_hash, blob_num):
+    return {'event': 'blob_downloaded', 'sd_hash': sd_hash, 'blob_num': blob_num}
+
+
+class ProgressSubscriptionsTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = task.Clock()
+        self.subscriptions = ProgressSubscriptions(self.clock)
+
+    def _blob_nums(self, d):
+        self.assertTrue(d.called)
+        return [event['blob_num'] for event in d.result]
+
+    def test_get_queued_events(self):
+        all_files = self.subscriptions.subscribe()
+        one_file = self.subscriptions.subscribe('sd1')
+        self.subscriptions.add_event(make_event('sd1', 0))
+        self.subscriptions.add_event(make_event('sd2', 1))
+        self.assertEqual([0, 1], self._blob_nums(self.subscriptions.get_events(all_files, 10)))
+        self.assertEqual([0], self._blob_nums(self.subscriptions.get_events(one_file, 10)))
+
+    def test_wait_for_events(self):
+        subscription_id = self.subscriptions.subscribe('sd1')
+        d = self.subscriptions.get_events(subscription_id, 10)
+        self.subscriptions.add_event(make_event('sd2', 0))
+        self.assertFalse(d.called)
+        self.subscriptions.add_event(make_event('sd1', 1))
+        self.assertEqual([1], self._blob_nums(d))
+        self.assertEqual(0, d.result[0]['time'])
+        d = self.subscriptions.get_events(subscription_id, 10)
+        self.clock.advance(10)
+        self.assertEqual([], self._blob_nums(d))
+
+    def test_expire_and_unsubscribe(self):
+        expiring = self.subscriptions.subscribe()
+        waiting = self.subscriptions.subscribe()
+        d = self.subscriptions.get_events(waiting, ProgressSubscriptions.EXPIRE_AFTER + 10)
+        self.clock.advance(ProgressSubscriptions.EXPIRE_AFTER)
+        self.assertRaises(Exception, self.subscriptions.get_events, expiring, 10)
+        self.assertFalse(d.called)
+        self.subscriptions.unsubscribe(waiting)
+        self.assertEqual([], self._blob_nums(d))
+        self.assertRaises(Exception, self.subscriptions.unsubscribe, waiting)
+        self.assertEqual([], self.clock.getDelayedCalls())
@@ -0,0 +1,177 @@
+import os
+
+import mock
+from twisted.internet import defer, reactor, task
+from twisted.trial import unittest
+from twisted.web import http
+from twisted.web.test.requesthelper import DummyRequest
+
+from lbrynet.core import BlobManager
+from lbrynet.core import Session
+from lbrynet.core.HashAnnouncer import DummyHashAnnouncer
+from lbrynet.daemon.StreamResource import StreamResource, parse_range
+from lbrynet.database.storage import SQLiteStorage
+from lbrynet.file_manager import EncryptedFileCreator
+from lbrynet.file_manager import EncryptedFileManager
+from lbrynet.tests import mocks
+from lbrynet.tests.util import mk_db_and_blob_dir, rm_db_and_blob_dir
+
+MB = 2 ** 20
+
+
+class StreamRequest(DummyRequest):
+    startedWriting = 0
+    _disconnected = False
+
+    def registerProducer(self, producer, streaming):
+        self.producer = producer
+
+    def unregisterProducer(self):
+        self.producer = None
+
+
+class FakeBlobRequester(object):
+    def __init__(self):
+        self.prioritized = []
+
+    def prioritize_blobs(self, blob_hashes):
+        self.prioritized.append(blob_hashes)
+
+
+class ParseRangeTest(unittest.TestCase):
+    def test_parse_range(self):
+        self.assertEqual(None, parse_range(None, 100))
+        self.assertEqual(None, parse_range('items=0-10', 100))
+        self.assertEqual((0, 10), parse_range('bytes=0-10', 100))
+        self.assertEqual((10, 99), parse_range('bytes=10-', 100))
+        self.assertEqual((10, 99), parse_range('bytes=10-1000', 100))
+        self.assertEqual((90, 99), parse_range('bytes=-10', 100))
+        self.assertEqual((0, 99), parse_range('bytes=-1000', 100))
+        self.assertEqual((0, 0), parse_range('bytes=0-0, 5-10', 100))
+        self.assertRaises(ValueError, parse_range, 'bytes=100-', 100)
+        self.assertRaises(ValueError, parse_range, 'bytes=20-10', 100)
+        self.assertRaises(ValueError, parse_range, 'bytes=-0', 100)
+
+
+class StreamResourceTest(unittest.TestCase):
+    timeout = 10
+
+    @defer.inlineCallbacks
+    def setUp(self):
+        mocks.mock_conf_settings(self)
+        self.tmp_db_dir, self.tmp_blob_dir = mk_db_and_blob_dir()
+        self.session = mock.Mock(spec=Session.Session)(None, None)
+        self.session.payment_rate_manager.min_blob_data_payment_rate = 0
+        self.blob_manager = BlobManager.DiskBlobManager(
+            DummyHashAnnouncer(), self.tmp_blob_dir, SQLiteStorage(self.tmp_db_dir))
+        self.session.blob_manager = self.blob_manager
+        self.session.storage = self.blob_manager.storage
+        self.file_manager = EncryptedFileManager.EncryptedFileManager(self.session, object())
+        yield self.session.storage.setup()
+        yield self.blob_manager.setup()
+
+        self.data = os.urandom(5 * MB)
+        file_path = os.path.join(self.tmp_db_dir, 'test.mp4')
+        with open(file_path, 'wb') as f:
+            f.write(self.data)
+        with open(file_path, 'rb') as f:
+            self.lbry_file = yield EncryptedFileCreator.create_lbry_file(
+                self.session, self.file_manager, 'test.mp4', f)
+        self.resource = StreamResource(mock.Mock(lbry_file_manager=self.file_manager))
+
+    @defer.inlineCallbacks
+    def tearDown(self):
+        yield self.blob_manager.stop()
+        yield self.session.storage.stop()
+        rm_db_and_blob_dir(self.tmp_db_dir, self.tmp_blob_dir)
+
+    def _get(self, range_header=None, sd_hash=None, method='GET'):
+        request = StreamRequest([sd_hash or self.lbry_file.sd_hash])
+        request.method = method
+        if range_header is not None:
+            request.requestHeaders.setRawHeaders('range', [range_header])
+        request.render(self.resource)
+        return request
+
+    def _wait_until_finished(self, request):
+        if request.finished:
+            return defer.succeed(request)
+        d = request.notifyFinish()
+        d.addCallback(lambda _: request)
+        return d
+
+    @defer.inlineCallbacks
+    def _wait_for_blob_waiter(self, blob_hash):
+        while blob_hash not in self.blob_manager._blob_waiters:
+            yield task.deferLater(reactor, 0.01, lambda: None)
+
+    def _header(self, request, name):
+        return request.responseHeaders.getRawHeaders(name)[0]
+
+    @defer.inlineCallbacks
+    def test_stream_whole_file(self):
+        request = yield self._wait_until_finished(self._get())
+        self.assertEqual(None, request.responseCode)
+        self.assertEqual(str(len(self.data)), self._header(request, 'content-length'))
+        self.assertEqual('video/mp4', self._header(request, 'content-type'))
+        self.assertEqual('bytes', self._header(request, 'accept-ranges'))
+        self.assertEqual(self.data, ''.join(request.written))
+
+    @defer.inlineCallbacks
+    def test_stream_ranges(self):
+        blob_size = 2 * MB - 1
+        ranges = [(0, 0), (15, 16), (17, 100000), (blob_size - 20, blob_size + 20),
+                  (100, 2 * blob_size + 5), (len(self.data) - 33, len(self.data) - 1)]
+        for start, end in ranges:
+            request = yield self._wait_until_finished(self._get('bytes=%i-%i' % (start, end)))
+            self.assertEqual(http.PARTIAL_CONTENT, request.responseCode)
+            self.assertEqual('bytes %i-%i/%i' % (start, end, len(self.data)),
+                             self._header(request, 'content-range'))
+            self.assertEqual(self.data[start:end + 1], ''.join(request.written))
+
+    @defer.inlineCallbacks
+    def test_head(self):
+        request = yield self._wait_until_finished(self._get('bytes=10-', method='HEAD'))
+        self.assertEqual(http.PARTIAL_CONTENT, request.responseCode)
+        self.assertEqual(str(len(self.data) - 10), self._header(request, 'content-length'))
+        self.assertEqual('bytes', self._header(request, 'accept-ranges'))
+        self.assertEqual('bytes 10-%i/%i' % (len(self.data) - 1, len(self.data)),
+                         self._header(request, 'content-range'))
+        self.assertEqual([], request.written)
+
+    @defer.inlineCallbacks
+    def test_range_not_satisfiable(self):
+        request = yield self._wait_until_finished(self._get('bytes=%i-' % len(self.data)))
+        self.assertEqual(http.REQUESTED_RANGE_NOT_SATISFIABLE, request.responseCode)
+        self.assertEqual('bytes */%i' % len(self.data), self._header(request, 'content-range'))
+
+    @defer.inlineCallbacks
+    def test_unknown_stream(self):
+        request = yield self._wait_until_finished(self._get(sd_hash='00' * 48))
+        self.assertEqual(http.NOT_FOUND, request.responseCode)
+
+    @defer.inlineCallbacks
+    def test_wait_for_blobs(self):
+        blob_infos = yield self.session.storage.get_blobs_for_stream(self.lbry_file.stream_hash)
+        blob_hashes = [blob_info.blob_hash for blob_info in blob_infos if blob_info.blob_hash]
+        # pretend the second and last blobs haven't been downloaded
+        for blob_hash in blob_hashes[1:]:
+            self.blob_manager.verified_blob_hashes.discard(blob_hash)
+        self.lbry_file.stopped = False
+        self.lbry_file.blob_requester = FakeBlobRequester()
+
+        request = self._get('bytes=%i-' % (3 * MB))
+        yield self._wait_for_blob_waiter(blob_hashes[2])
+        # the last blob is needed for the size of the stream
+        self.assertEqual([blob_hashes[1:]], self.lbry_file.blob_requester.prioritized)
+        blob = yield self.blob_manager.get_blob(blob_hashes[2])
+        yield self.blob_manager.blob_completed(blob)
+        # then the blobs of the range that are still missing
+        self.assertEqual([blob_hashes[1:], blob_hashes[1:2]],
+                         self.lbry_file.blob_requester.prioritized)
+        yield self._wait_for_blob_waiter(blob_hashes[1])
+        self.assertFalse(request.written)
+        blob = yield self.blob_manager.get_blob(blob_hashes[1])
+        yield self.blob_manager.blob_completed(blob)
+        yield self._wait_until_finished(request)
+        self.assertEqual(self.data[3 * MB:], ''.join(request.written))
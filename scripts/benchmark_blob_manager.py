@@ -0,0 +1,84 @@
+"""Fill a DiskBlobManager with blob hashes and report lookup speed, memory use and cache stats"""
+import argparse
+import binascii
+import logging
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+from twisted.internet import defer, reactor
+
+from lbrynet import conf
+from lbrynet.core import log_support
+from lbrynet.core.HashAnnouncer import DummyHashAnnouncer
+from lbrynet.core.BlobManager import DiskBlobManager
+from lbrynet.database.storage import SQLiteStorage
+
+
+log = logging.getLogger('benchmark_blob_manager')
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--blobs', type=int, default=500000)
+    parser.add_argument('--cache-size', type=int, default=None)
+    parser.add_argument('--on-disk', type=int, default=1000,
+                        help='number of the blobs to also write to the blob directory')
+    args = parser.parse_args(args)
+    conf.initialize_settings()
+    if args.cache_size is not None:
+        conf.settings.update({'blob_cache_size': args.cache_size})
+    log_support.configure_console(level='INFO')
+
+    run(args)
+    reactor.run()
+
+
+@defer.inlineCallbacks
+def run(args):
+    blob_dir = tempfile.mkdtemp()
+    try:
+        yield benchmark(blob_dir, args.blobs, args.on_disk)
+    except Exception:
+        log.exception('Benchmark failed')
+    finally:
+        shutil.rmtree(blob_dir, ignore_errors=True)
+        reactor.callLater(0, reactor.stop)
+
+
+@defer.inlineCallbacks
+def benchmark(blob_dir, blob_count, on_disk):
+    storage = SQLiteStorage(blob_dir)
+    yield storage.setup()
+    manager = DiskBlobManager(DummyHashAnnouncer(), blob_dir, storage)
+    yield manager.setup()
+    blob_hashes = [binascii.b2a_hex(os.urandom(48)) for _ in range(blob_count)]
+    for blob_hash in blob_hashes[:on_disk]:
+        with open(os.path.join(blob_dir, blob_hash), 'wb') as blob_file:
+            blob_file.write('0')
+
+    start = time.time()
+    for blob_hash in blob_hashes:
+        yield manager.get_blob(blob_hash)
+    fill_time = time.time() - start
+
+    start = time.time()
+    for blob_hash in blob_hashes[-manager.blobs.max_size:]:
+        yield manager.get_blob(blob_hash)
+    hot_time = time.time() - start
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    log.info("filled %i blobs in %.2fs (%.0f blobs/s)", blob_count, fill_time,
+             blob_count / fill_time)
+    log.info("looked up %i cached blobs in %.2fs", manager.blobs.max_size, hot_time)
+    log.info("max rss: %.1f MB", max_rss / 1024.0)
+    log.info("cache stats: %s", manager.get_cache_stats())
+    yield manager.stop()
+    yield storage.stop()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,162 @@
+"""Serve blobs from a single process to many concurrent downloaders and report blobs/sec"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from twisted.internet import defer, reactor
+from twisted.internet.protocol import Protocol, ClientFactory
+
+from lbrynet import conf
+from lbrynet.core import log_support
+from lbrynet.core.cryptoutils import get_lbry_hash_obj
+from lbrynet.core.HashAnnouncer import DummyHashAnnouncer
+from lbrynet.core.BlobManager import DiskBlobManager
+from lbrynet.database.storage import SQLiteStorage
+from lbrynet.core.PaymentRateManager import OnlyFreePaymentsManager
+from lbrynet.core.PeerManager import PeerManager
+from lbrynet.core.RateLimiter import RateLimiter
+from lbrynet.core.server.BlobRequestHandler import BlobRequestHandlerFactory
+from lbrynet.core.server.ServerProtocol import ServerProtocolFactory
+
+
+log = logging.getLogger('benchmark_blob_server')
+
+
+class BenchmarkDownloader(Protocol):
+    """Requests random blobs back to back and discards the data"""
+
+    def connectionMade(self):
+        self.buff = ''
+        self.remaining = None
+        self._request_blob()
+
+    def _request_blob(self):
+        if time.time() > self.factory.stop_time:
+            self.transport.loseConnection()
+            return
+        blob_hashes = self.factory.blob_hashes
+        blob_hash = blob_hashes[self.factory.requested % len(blob_hashes)]
+        self.factory.requested += 1
+        self.transport.write(json.dumps({
+            'blob_data_payment_rate': 0.0,
+            'requested_blob': blob_hash
+        }))
+
+    def dataReceived(self, data):
+        if self.remaining is None:
+            self.buff += data
+            for i, c in enumerate(self.buff):
+                if c == '}':
+                    try:
+                        response = json.loads(self.buff[:i + 1])
+                    except ValueError:
+                        continue
+                    self.remaining = response['incoming_blob']['length']
+                    data, self.buff = self.buff[i + 1:], ''
+                    break
+            else:
+                return
+        self.remaining -= len(data)
+        self.factory.bytes_received += len(data)
+        if self.remaining == 0:
+            self.remaining = None
+            self.factory.blobs_received += 1
+            self._request_blob()
+
+    def connectionLost(self, reason):
+        self.factory.finished.callback(None)
+
+
+class BenchmarkDownloaderFactory(ClientFactory):
+    protocol = BenchmarkDownloader
+
+    def __init__(self, blob_hashes, stop_time):
+        self.blob_hashes = blob_hashes
+        self.stop_time = stop_time
+        self.finished = defer.Deferred()
+        self.requested = 0
+        self.blobs_received = 0
+        self.bytes_received = 0
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--downloaders', type=int, default=200)
+    parser.add_argument('--blobs', type=int, default=20)
+    parser.add_argument('--duration', type=int, default=20)
+    parser.add_argument('--port', type=int, default=5599)
+    args = parser.parse_args(args)
+    conf.initialize_settings()
+    log_support.configure_console(level='INFO')
+
+    run(args)
+    reactor.run()
+
+
+@defer.inlineCallbacks
+def run(args):
+    blob_dir = tempfile.mkdtemp()
+    try:
+        yield benchmark(blob_dir, args)
+    except Exception:
+        log.exception('Benchmark failed')
+    finally:
+        shutil.rmtree(blob_dir, ignore_errors=True)
+        reactor.callLater(0, reactor.stop)
+
+
+def make_blobs(blob_dir, count):
+    blob_hashes = []
+    for _ in range(count):
+        data = os.urandom(2 * 2 ** 20 - 1)
+        hashsum = get_lbry_hash_obj()
+        hashsum.update(data)
+        blob_hash = hashsum.hexdigest()
+        with open(os.path.join(blob_dir, blob_hash), 'wb') as blob_file:
+            blob_file.write(data)
+        blob_hashes.append(blob_hash)
+    return blob_hashes
+
+
+@defer.inlineCallbacks
+def benchmark(blob_dir, args):
+    blob_hashes = make_blobs(blob_dir, args.blobs)
+    storage = SQLiteStorage(blob_dir)
+    yield storage.setup()
+    blob_manager = DiskBlobManager(DummyHashAnnouncer(), blob_dir, storage)
+    yield blob_manager.setup()
+    query_handler_factories = {
+        1: BlobRequestHandlerFactory(blob_manager, None, OnlyFreePaymentsManager(), None)
+    }
+    rate_limiter = RateLimiter()
+    rate_limiter.start()
+    server_factory = ServerProtocolFactory(rate_limiter, query_handler_factories, PeerManager())
+    server_port = reactor.listenTCP(args.port, server_factory, interface='127.0.0.1')
+
+    start = time.time()
+    factories = []
+    for _ in range(args.downloaders):
+        factory = BenchmarkDownloaderFactory(blob_hashes, start + args.duration)
+        reactor.connectTCP('127.0.0.1', args.port, factory)
+        factories.append(factory)
+    yield defer.DeferredList([f.finished for f in factories])
+    elapsed = time.time() - start
+    yield server_port.stopListening()
+    rate_limiter.stop()
+    yield storage.stop()
+
+    blobs_received = sum(f.blobs_received for f in factories)
+    bytes_received = sum(f.bytes_received for f in factories)
+    log.info("%i downloaders received %i blobs (%.1f MB) in %.1fs", args.downloaders,
+             blobs_received, bytes_received / 2.0 ** 20, elapsed)
+    log.info("%.1f blobs/s, %.1f MB/s", blobs_received / elapsed,
+             bytes_received / 2.0 ** 20 / elapsed)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,73 @@
+"""Time sorting contacts by distance to a key and finding the closest ones"""
+import argparse
+import hashlib
+import os
+import sys
+import time
+
+from lbrynet.dht import constants
+from lbrynet.dht.contact import Contact
+from lbrynet.dht.distance import Distance
+from lbrynet.dht.routingtable import TreeRoutingTable
+
+
+class FakeRPCProtocol(object):
+    def sendRPC(self, *args, **kwargs):
+        return FakeDeferred()
+
+
+class FakeDeferred(object):
+    def addErrback(self, *args, **kwargs):
+        pass
+
+
+def sort_by_converting_ids(key, contacts):
+    """The previous approach, which converted every id to a long for each sort"""
+    val_key = long(key.encode('hex'), 16)
+    for contact in contacts:
+        contact.__value = val_key ^ long(contact.id.encode('hex'), 16)
+    contacts.sort(key=lambda c: c.__value)
+    for contact in contacts:
+        del contact.__value
+
+
+def timed(label, f, repeat):
+    start = time.time()
+    for _ in range(repeat):
+        f()
+    elapsed = time.time() - start
+    print "%-50s %8.3f ms" % (label, 1000.0 * elapsed / repeat)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--contacts', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args(args)
+
+    protocol = FakeRPCProtocol()
+    contacts = [
+        Contact(hashlib.sha384(os.urandom(32)).digest(), '127.0.0.1', 4444, protocol)
+        for _ in range(args.contacts)
+    ]
+    key = hashlib.sha384(os.urandom(32)).digest()
+    distance = Distance(key)
+
+    timed("sort %i contacts, converting ids" % len(contacts),
+          lambda: sort_by_converting_ids(key, list(contacts)), args.repeat)
+    timed("sort %i contacts, precomputed ids" % len(contacts),
+          lambda: distance.sort(list(contacts)), args.repeat)
+    timed("closest %i of %i contacts" % (constants.k, len(contacts)),
+          lambda: distance.closest(contacts, constants.k), args.repeat)
+
+    routing_table = TreeRoutingTable(hashlib.sha384(os.urandom(32)).digest())
+    for contact in contacts:
+        routing_table.addContact(contact)
+    keys = [hashlib.sha384(os.urandom(32)).digest() for _ in range(args.repeat)]
+    known = sum(len(bucket) for bucket in routing_table._buckets)
+    timed("findCloseNodes (%i contacts in %i buckets)" % (known, len(routing_table._buckets)),
+          lambda: routing_table.findCloseNodes(keys.pop(), constants.k), args.repeat)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,75 @@
+"""Save blob completions to SQLiteStorage while reading from it and report completions/sec"""
+import argparse
+import binascii
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from twisted.internet import defer, reactor
+
+from lbrynet import conf
+from lbrynet.core import log_support
+from lbrynet.database.storage import SQLiteStorage
+
+
+log = logging.getLogger('benchmark_storage')
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--blobs', type=int, default=10000)
+    parser.add_argument('--concurrency', type=int, default=100,
+                        help='number of completions in flight at once')
+    args = parser.parse_args(args)
+    conf.initialize_settings()
+    log_support.configure_console(level='INFO')
+
+    run(args)
+    reactor.run()
+
+
+@defer.inlineCallbacks
+def run(args):
+    db_dir = tempfile.mkdtemp()
+    try:
+        yield benchmark(db_dir, args.blobs, args.concurrency)
+    except Exception:
+        log.exception('Benchmark failed')
+    finally:
+        shutil.rmtree(db_dir, ignore_errors=True)
+        reactor.callLater(0, reactor.stop)
+
+
+@defer.inlineCallbacks
+def complete_blobs(storage, blob_hashes):
+    while blob_hashes:
+        blob_hash = blob_hashes.pop()
+        yield storage.add_completed_blob(blob_hash, 2 * 2 ** 20, 0, False)
+        yield storage.get_blob_status(blob_hash)
+
+
+@defer.inlineCallbacks
+def benchmark(db_dir, blob_count, concurrency):
+    storage = SQLiteStorage(db_dir)
+    yield storage.setup()
+    blob_hashes = [binascii.b2a_hex(os.urandom(48)) for _ in range(blob_count)]
+
+    start = time.time()
+    yield defer.DeferredList([complete_blobs(storage, blob_hashes) for _ in range(concurrency)])
+    elapsed = time.time() - start
+    finished = yield storage.get_all_finished_blobs()
+
+    log.info("completed %i blobs (%i concurrently) in %.2fs, %.0f completions/s", len(finished),
+             concurrency, elapsed, len(finished) / elapsed)
+    writer = getattr(storage.db, 'writer', None)
+    if writer is not None:
+        log.info("%i write transactions for %i interactions", writer.transactions,
+                 writer.interactions)
+    yield storage.stop()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
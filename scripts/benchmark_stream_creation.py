@@ -0,0 +1,98 @@
+"""
+Compare the throughput of creating a stream from a file with one worker reading the file in
+order against several workers encrypting the blobs of the split file in parallel
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from twisted.internet import defer, reactor
+
+from lbrynet import conf
+from lbrynet.core import log_support
+from lbrynet.core.HashAnnouncer import DummyHashAnnouncer
+from lbrynet.core.BlobManager import DiskBlobManager
+from lbrynet.database.storage import SQLiteStorage
+from lbrynet.file_manager.EncryptedFileCreator import EncryptedFileStreamCreator
+
+
+log = logging.getLogger('benchmark_stream_creation')
+
+CHUNK_SIZE = 2 ** 20
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size', type=int, default=2 * 2 ** 30, help='file size in bytes')
+    parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count(),
+                        help='workers of the parallel run')
+    args = parser.parse_args(args)
+    conf.initialize_settings()
+    log_support.configure_console(level='INFO')
+
+    run(args)
+    reactor.run()
+
+
+@defer.inlineCallbacks
+def run(args):
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        yield benchmark(tmp_dir, args)
+    except Exception:
+        log.exception('Benchmark failed')
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        reactor.callLater(0, reactor.stop)
+
+
+def write_file(file_path, size):
+    with open(file_path, 'wb') as f:
+        while size > 0:
+            chunk = os.urandom(min(size, CHUNK_SIZE))
+            f.write(chunk)
+            size -= len(chunk)
+
+
+@defer.inlineCallbacks
+def create_stream(blob_dir, file_path, workers, split_file):
+    os.mkdir(blob_dir)
+    storage = SQLiteStorage(blob_dir)
+    yield storage.setup()
+    blob_manager = DiskBlobManager(DummyHashAnnouncer(), blob_dir, storage)
+    yield blob_manager.setup()
+    creator = EncryptedFileStreamCreator(blob_manager, None, os.path.basename(file_path),
+                                         workers=workers, split_file=split_file)
+    yield creator.setup()
+    start = time.time()
+    with open(file_path, 'rb') as file_handle:
+        yield creator.create_stream(file_handle)
+    elapsed = time.time() - start
+    yield blob_manager.stop()
+    yield storage.stop()
+    shutil.rmtree(blob_dir)
+    defer.returnValue((elapsed, creator.blobs_created))
+
+
+@defer.inlineCallbacks
+def benchmark(tmp_dir, args):
+    file_path = os.path.join(tmp_dir, 'benchmark.file')
+    log.info("writing %.1f MB of random data", args.size / 2.0 ** 20)
+    write_file(file_path, args.size)
+
+    runs = [('1 worker, file read in order', 1, False),
+            ('%i workers, split file' % args.workers, args.workers, True)]
+    for i, (description, workers, split_file) in enumerate(runs):
+        elapsed, blobs = yield create_stream(os.path.join(tmp_dir, 'blobs%i' % i), file_path,
+                                             workers, split_file)
+        log.info("%s: created %i blobs in %.1fs, %.1f MB/s", description, blobs, elapsed,
+                 args.size / 2.0 ** 20 / elapsed)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,187 @@
+"""
+Download a stream from several local peers and report how many bytes were downloaded twice
+
+Every peer has every blob, and each peer uploads at a different rate so downloads from the
+slow peers are still running when the fast ones finish.
+"""
+import argparse
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from twisted.internet import defer, reactor, task
+
+from lbrynet import conf
+from lbrynet.core import log_support
+from lbrynet.core.cryptoutils import get_lbry_hash_obj
+from lbrynet.core.HashAnnouncer import DummyHashAnnouncer
+from lbrynet.core.BlobManager import DiskBlobManager
+from lbrynet.database.storage import SQLiteStorage
+from lbrynet.core.PaymentRateManager import OnlyFreePaymentsManager
+from lbrynet.core.Peer import Peer
+from lbrynet.core.PeerManager import PeerManager
+from lbrynet.core.RateLimiter import RateLimiter, DummyRateLimiter
+from lbrynet.core.client.BlobRequester import BlobRequester
+from lbrynet.core.client.ConnectionManager import ConnectionManager
+from lbrynet.core.server.BlobRequestHandler import BlobRequestHandlerFactory
+from lbrynet.core.server.ServerProtocol import ServerProtocolFactory
+
+
+log = logging.getLogger('benchmark_swarm_download')
+
+BLOB_SIZE = 2 * 2 ** 20 - 1
+
+
+class FreeWallet(object):
+    def reserve_points(self, peer, amount):
+        return object()
+
+    def send_points(self, reserved_points, amount):
+        pass
+
+    def cancel_point_reservation(self, reserved_points):
+        pass
+
+
+class LocalPeerFinder(object):
+    def __init__(self, peers):
+        self.peers = peers
+
+    def find_peers_for_blob(self, blob_hash, timeout=None, filter_self=False):
+        return defer.succeed(self.peers)
+
+
+class BenchmarkDownloadManager(object):
+    def __init__(self, blobs):
+        self.blobs = blobs
+
+    def needed_blobs(self):
+        return [b for b in self.blobs if not b.get_is_verified()]
+
+    def get_head_blob_hash(self):
+        return self.blobs[0].blob_hash
+
+
+class BenchmarkDownloader(object):
+    def insufficient_funds(self, err):
+        log.error("Insufficient funds: %s", err)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--peers', type=int, default=5)
+    parser.add_argument('--blobs', type=int, default=40)
+    parser.add_argument('--rate', type=int, default=2 * 2 ** 20,
+                        help='upload bytes/sec of the slowest peer, peer i uploads i times faster')
+    parser.add_argument('--port', type=int, default=5600)
+    args = parser.parse_args(args)
+    conf.initialize_settings()
+    log_support.configure_console(level='INFO')
+
+    run(args)
+    reactor.run()
+
+
+@defer.inlineCallbacks
+def run(args):
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        yield benchmark(tmp_dir, args)
+    except Exception:
+        log.exception('Benchmark failed')
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        reactor.callLater(0, reactor.stop)
+
+
+@defer.inlineCallbacks
+def make_blob_manager(blob_dir):
+    os.mkdir(blob_dir)
+    storage = SQLiteStorage(blob_dir)
+    yield storage.setup()
+    blob_manager = DiskBlobManager(DummyHashAnnouncer(), blob_dir, storage)
+    yield blob_manager.setup()
+    defer.returnValue((storage, blob_manager))
+
+
+@defer.inlineCallbacks
+def start_peer(blob_dir, blobs, port, rate):
+    storage, blob_manager = yield make_blob_manager(blob_dir)
+    for blob_hash, data in blobs:
+        with open(os.path.join(blob_dir, blob_hash), 'wb') as blob_file:
+            blob_file.write(data)
+        blob = yield blob_manager.get_blob(blob_hash, len(data))
+        yield blob_manager.blob_completed(blob)
+    query_handler_factories = {
+        1: BlobRequestHandlerFactory(blob_manager, None, OnlyFreePaymentsManager(), None)
+    }
+    rate_limiter = RateLimiter(max_ul_bytes=rate)
+    rate_limiter.start()
+    server_factory = ServerProtocolFactory(rate_limiter, query_handler_factories, PeerManager())
+    server_port = reactor.listenTCP(port, server_factory, interface='127.0.0.1')
+
+    @defer.inlineCallbacks
+    def stop():
+        yield server_port.stopListening()
+        rate_limiter.stop()
+        yield storage.stop()
+
+    defer.returnValue(stop)
+
+
+@defer.inlineCallbacks
+def benchmark(tmp_dir, args):
+    blobs = []
+    for _ in range(args.blobs):
+        data = os.urandom(BLOB_SIZE)
+        hashsum = get_lbry_hash_obj()
+        hashsum.update(data)
+        blobs.append((hashsum.hexdigest(), data))
+
+    stop_calls = []
+    for i in range(args.peers):
+        stop = yield start_peer(os.path.join(tmp_dir, 'peer%i' % i), blobs, args.port + i,
+                                args.rate * (i + 1))
+        stop_calls.append(stop)
+    peers = [Peer('127.0.0.1', args.port + i) for i in range(args.peers)]
+
+    storage, blob_manager = yield make_blob_manager(os.path.join(tmp_dir, 'downloader'))
+    to_download = []
+    for blob_hash, data in blobs:
+        blob = yield blob_manager.get_blob(blob_hash, len(data))
+        to_download.append(blob)
+    download_manager = BenchmarkDownloadManager(to_download)
+    requester = BlobRequester(blob_manager, LocalPeerFinder(peers), OnlyFreePaymentsManager(),
+                              FreeWallet(), download_manager)
+    rate_limiter = DummyRateLimiter()
+    connection_manager = ConnectionManager(BenchmarkDownloader(), rate_limiter, [requester], [])
+    connection_manager.max_connections_per_stream = args.peers
+
+    start = time.time()
+    yield connection_manager.start()
+    while download_manager.needed_blobs():
+        yield task.deferLater(reactor, 0.1, lambda: None)
+    elapsed = time.time() - start
+    yield connection_manager.stop()
+    for stop in stop_calls:
+        yield stop()
+    yield storage.stop()
+
+    stream_bytes = args.blobs * BLOB_SIZE
+    received = rate_limiter.total_dl_bytes
+    written = sum(peer.stats['blob_bytes_downloaded'] for peer in peers)
+    log.info("downloaded %i blobs (%.1f MB) from %i peers in %.1fs, %.1f MB/s", args.blobs,
+             stream_bytes / 2.0 ** 20, args.peers, elapsed, stream_bytes / 2.0 ** 20 / elapsed)
+    log.info("received %.1f MB, %.1f MB (%.1f%%) more than the stream",
+             received / 2.0 ** 20, (received - stream_bytes) / 2.0 ** 20,
+             100.0 * (received - stream_bytes) / stream_bytes)
+    log.info("wrote %.1f MB of blob data, %.1f MB (%.1f%%) of it duplicated",
+             written / 2.0 ** 20, (written - stream_bytes) / 2.0 ** 20,
+             100.0 * (written - stream_bytes) / stream_bytes)
+
+
+if __name__ == '__main__':
+    sys.exit(main())